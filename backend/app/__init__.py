@@ -12,6 +12,11 @@ from app.core.config.settings import Config
 from app.models.models import db
 from app.api.v1 import v1_bp
 from app.tasks.task_manager import task_manager
+from app.tasks.task_queue import task_queue
+from app.tasks.task_registry import task_registry
+from app.tasks.resource_governor import resource_governor
+from app.tasks.backpressure import backpressure
+from app.services.progress.bus import progress_bus
 from app.services.scan.scheduler import PolicyScheduler
 from app.core.middleware import register_error_handlers
 from app.core.error.errors import DatabaseError
@@ -103,6 +108,15 @@ def init_extensions(app):
         redis_client = create_redis_client(app)
         app.extensions['redis'] = redis_client
         
+        # 初始化进度事件总线
+        progress_bus.init_app(app)
+        
+        # 初始化全局资源调度器
+        resource_governor.init_app(app)
+        
+        # 初始化任务提交背压控制
+        backpressure.init_app(app)
+        
         # 初始化任务管理器
         task_manager.init_app(app)
         logger.debug("Task manager initialized successfully")
@@ -124,6 +138,14 @@ def init_extensions(app):
         collector_manager.init_app(app)
         logger.debug("Collector manager initialized successfully")
         
+        # 启动持久化任务队列，接管重试和其他进程遗留的任务
+        task_queue.init_app(app)
+        logger.debug("Durable task queue initialized successfully")
+        
+        # 启动分布式任务注册表，支持跨进程查询和取消任务
+        task_registry.init_app(app)
+        logger.debug("Task registry initialized successfully")
+        
         # 初始化Excel导出器
         excel_exporter.init_app(app)
         logger.debug("Excel exporter initialized successfully")
@@ -189,6 +211,14 @@ def create_app(config_object=None):
         db.create_all()
         logger.debug("Database tables created successfully")
         
+        # create_all 不会修改已存在的表，检查VMware子主机写入依赖的唯一键
+        try:
+            schema_error = collector_manager.check_vm_child_schema()
+            if schema_error:
+                logger.error(schema_error)
+        except Exception as e:
+            logger.warning(f"Failed to check host_infos schema: {str(e)}")
+        
         # 初始化通知模板
         init_notification_templates()
         logger.debug("Notification templates initialized successfully")
@@ -2,7 +2,7 @@
 主机信息管理API
 提供主机信息的查询、采集、绑定凭证等功能
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from sqlalchemy import and_, or_, desc, asc, func
 from sqlalchemy.orm import joinedload
 from datetime import datetime
@@ -10,9 +10,13 @@ import uuid
 import time
 
 from app.models.models import db, HostInfo, HostCredentialBinding, CollectionTask, Credential, IP, CollectionProgress
-from app.core.security.auth import token_required
+from app.core.security.auth import token_required, stream_token_required
 from app.core.utils.logger import app_logger as logger
 from app.services.collection.collector_manager import collector_manager
+from app.tasks.backpressure import backpressure
+from app.core.error.errors import QueueFullError, RequestTooLargeError
+from app.services.progress.bus import progress_bus, collection_topic, collection_task_event
+from app.services.progress.stream import stream_response
 from app.services.export.excel_exporter import excel_exporter
 
 
@@ -515,22 +519,43 @@ def batch_collect_hosts(current_user):
         if not host_ids:
             return jsonify({'error': 'host_ids required'}), 400
         
+        # 采集队列已满时直接拒绝，不修改主机状态
+        backpressure.check('collection', len(host_ids))
+        
         # 立即批量更新所有主机状态为'collecting'，防止重复点击
         hosts = HostInfo.query.filter(HostInfo.id.in_(host_ids), HostInfo.deleted == False).all()
+        previous_status = {}
         for host in hosts:
             # 检查权限
             if current_user.is_admin or (host.ip and host.ip.assigned_user_id == current_user.id):
+                previous_status[host.id] = host.collection_status
                 host.collection_status = 'collecting'
         db.session.commit()
         
         # 创建批量采集任务
-        task_id = collector_manager.collect_batch_hosts(host_ids, current_user.id)
+        try:
+            # quick_refresh 未指定时使用 ANSIBLE_QUICK_REFRESH 配置
+            task_id = collector_manager.collect_batch_hosts(host_ids, current_user.id,
+                                                            quick_refresh=data.get('quick_refresh'))
+        except (QueueFullError, RequestTooLargeError):
+            # 预检后队列被其他请求占满，恢复主机状态
+            for host in hosts:
+                if host.id in previous_status:
+                    host.collection_status = previous_status[host.id]
+            db.session.commit()
+            raise
         
         return jsonify({
             'message': 'Batch collection started',
             'task_id': task_id
         }), 202
         
+    except RequestTooLargeError as e:
+        logger.warning(f"Batch collection rejected: {e.message}")
+        return jsonify({'error': e.message, 'limit': e.details.get('depth')}), 413
+    except QueueFullError as e:
+        logger.warning(f"Batch collection rejected: {e.message}")
+        return jsonify({'error': e.message, 'retry_after': e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         logger.error(f"Error starting batch collection: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -898,7 +923,9 @@ def get_collection_progress(current_user, task_id):
             if task and task.user_id != current_user.id and not current_user.is_admin:
                 return jsonify({'error': 'Permission denied'}), 403
             
-            return jsonify(progress.to_dict()), 200
+            result = progress.to_dict()
+            result['stats'] = collector_manager.get_batch_stats(task_id)
+            return jsonify(result), 200
         
         # 如果没有CollectionProgress记录，尝试从CollectionTask获取基本信息
         task = CollectionTask.query.get(task_id)
@@ -931,6 +958,7 @@ def get_collection_progress(current_user, task_id):
             'current_step': f"Processing hosts ({task.success_count + task.failed_count}/{task.total_hosts})",
             'progress_percent': progress_percent,
             'error_message': error_message,  # 添加错误信息字段
+            'stats': collector_manager.get_batch_stats(task_id),  # 批量采集吞吐量和耗时统计
             'created_at': task.created_at.isoformat() if task.created_at else None,
             'updated_at': task.end_time.isoformat() if task.end_time else None
         }), 200
@@ -940,6 +968,48 @@ def get_collection_progress(current_user, task_id):
         return jsonify({'error': str(e)}), 500
 
 
+@host_bp.route('/host/collection-progress/<task_id>/events', methods=['GET'])
+@stream_token_required
+def stream_collection_progress(current_user, task_id):
+    """
+    以 Server-Sent Events 推送采集任务进度
+    
+    Args:
+        task_id: CollectionTask ID
+    """
+    try:
+        task = CollectionTask.query.get(task_id)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        if task.user_id != current_user.id and not current_user.is_admin:
+            return jsonify({'error': 'Permission denied'}), 403
+        
+        # 先订阅再读取当前状态，避免遗漏两者之间的事件
+        topic = collection_topic(task_id)
+        subscription = progress_bus.subscribe([topic])
+        if subscription is None:
+            return jsonify({'error': 'Too many progress streams'}), 503, {'Retry-After': '10'}
+        
+        db.session.refresh(task)
+        initial = [{'event': 'task', 'data': collection_task_event(task)}]
+        progress = CollectionProgress.query.filter_by(task_id=task_id, host_id=None).first()
+        if progress:
+            initial.append({'event': 'progress', 'data': progress.to_dict()})
+        db.session.remove()
+        
+        return stream_response(
+            subscription,
+            initial,
+            terminal_events=['task'],
+            heartbeat=current_app.config.get('PROGRESS_STREAM_HEARTBEAT', 15),
+            max_seconds=current_app.config.get('PROGRESS_STREAM_MAX_SECONDS', 3600)
+        )
+    except Exception as e:
+        logger.error(f"Error streaming collection progress: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @host_bp.route('/host/collection-tasks', methods=['GET'])
 @token_required
 def get_collection_tasks(current_user):
@@ -1,9 +1,12 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
+from werkzeug.wsgi import get_input_stream
+from werkzeug.exceptions import RequestEntityTooLarge
 from sqlalchemy import desc, asc
 from app.models.models import db, IP, User, HostInfo
 from app.core.security.auth import token_required
 from app.core.utils import helpers
 from app.services.notification.events import NotificationEvent, send_notification
+from app.services.scan.passive import ingest_passive_source, PARSERS
 
 ips_bp = Blueprint('ips', __name__)
 
@@ -211,4 +214,41 @@ def update_ip(current_user, ip_id):
         target=ip.id,
         details=f"Updated fields: {', '.join(data.keys())}"
     )
-    return jsonify(ip.to_dict()), 200
\ No newline at end of file
+    return jsonify(ip.to_dict()), 200
+
+@ips_bp.route('/ip/passive/import', methods=['POST'])
+@token_required
+def import_passive_liveness(current_user):
+    """导入 ARP 表或 DHCP 租约文件，批量更新 IP 存活状态和 MAC 地址"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'You do not have permission to import liveness data'}), 403
+
+    source_format = request.args.get('format')
+    if source_format not in PARSERS:
+        return jsonify({'error': f"format must be one of: {', '.join(PARSERS)}"}), 400
+
+    try:
+        # 请求体逐行读取，不受全局 MAX_CONTENT_LENGTH 限制
+        stream = get_input_stream(
+            request.environ,
+            max_content_length=current_app.config.get('SCAN_IMPORT_MAX_CONTENT_LENGTH')
+        )
+        stats = ingest_passive_source(
+            source_format,
+            stream,
+            current_app.config.get('PASSIVE_LIVENESS_CHUNK_SIZE', 500)
+        )
+
+        helpers.log_action_to_db(
+            user=current_user,
+            action="Import passive liveness",
+            target=source_format,
+            details=f"Observations: {stats['observations']}, updated: {stats['updated']}, created: {stats['created']}"
+        )
+        return jsonify(stats), 200
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return jsonify({'error': 'Upload exceeds size limit'}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
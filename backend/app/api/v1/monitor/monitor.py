@@ -3,6 +3,9 @@ from app.core.security.auth import token_required
 from app.models.models import db, SystemMetrics, NetworkMetrics, DiskMetrics, ProcessMetrics
 from datetime import datetime, timedelta
 from sqlalchemy import func
+from app.tasks.resource_governor import resource_governor
+from app.tasks.backpressure import backpressure
+from app.tasks.task_registry import task_registry
 
 monitor_bp = Blueprint('monitor', __name__)
 
@@ -166,4 +169,37 @@ def get_monitor_data(current_user):
         return jsonify({
             'code': 500,
             'message': f'获取监控数据失败: {str(e)}'
-        }), 500 
\ No newline at end of file
+        }), 500
+
+
+@monitor_bp.route('/monitor/resources', methods=['GET'])
+@token_required
+def get_resource_allocations(current_user):
+    """获取全局并发预算和扫描、采集、VMware 采集的槽位分配"""
+    try:
+        snapshot = resource_governor.snapshot()
+        snapshot['queues'] = backpressure.snapshot()
+        return jsonify(snapshot)
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取资源分配失败: {str(e)}'
+        }), 500
+
+@monitor_bp.route('/monitor/tasks', methods=['GET'])
+@token_required
+def get_running_tasks(current_user):
+    """获取所有进程正在执行的扫描和采集任务（仅管理员）"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Permission denied'}), 403
+    try:
+        kind = request.args.get('kind')
+        return jsonify({
+            'owner': task_registry.owner,
+            'tasks': task_registry.list_tasks(kind)
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取运行中任务失败: {str(e)}'
+        }), 500
@@ -4,12 +4,30 @@ from app.models.models import db, ScanPolicy, ScanSubnet, ScanJob
 from app.core.security.auth import token_required
 from sqlalchemy.exc import IntegrityError
 from app.services.scan.scheduler import scheduler
+from app.tasks.system_metrics import metrics_scheduler
 from app.core.utils.helpers import log_action_to_db
 from app.core.utils.logger import app_logger as logger
 from app.services.notification.events import NotificationEvent, send_notification
 
 policy_bp = Blueprint('policy', __name__)
 
+def _validate_continuous_strategy(strategy):
+    """校验连续扫描策略的周期和间隔，返回错误信息，合法时返回 None
+
+    未指定时由调度器使用 CONTINUOUS_SCAN_PERIOD_MINUTES / CONTINUOUS_SCAN_INTERVAL_SECONDS。
+    """
+    for key in ['period_minutes', 'interval_seconds']:
+        value = strategy.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            return f'{key} must be a positive integer'
+    return None
+
+def _validate_priority(priority):
+    """校验策略优先级（整数，数值越大越优先），返回错误信息，合法时返回 None"""
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        return 'priority must be an integer'
+    return None
+
 @policy_bp.route('/policy', methods=['GET'])
 @token_required
 def get_policies(current_user):
@@ -34,6 +52,7 @@ def get_policies(current_user):
                     "description": policy.description,
                     "strategies": strategies,
                     "threads": policy.threads,
+                    "priority": policy.priority,
                     "status": policy.status,
                     "created_at": policy.created_at.isoformat() if policy.created_at else None,
                     "subnets": [
@@ -105,6 +124,12 @@ def create_policy(current_user):
         for policy_data in data.get('policies', []):
             policy_name = policy_data['name']
             
+            if 'priority' in policy_data:
+                error = _validate_priority(policy_data['priority'])
+                if error:
+                    db.session.rollback()
+                    return jsonify({'error': error}), 400
+            
             # 获取所有子网名称
             subnet_names = [subnet['name'] for subnet in data.get('subnets', [])]
             print(f"Processing policy {policy_name} with subnets: {subnet_names}")
@@ -115,7 +140,21 @@ def create_policy(current_user):
             # 处理策略数据
             strategies = []
             for strategy in policy_data.get('strategies', []):
-                if strategy.get('cron') and strategy.get('start_time'):
+                if strategy.get('type') == 'continuous':
+                    error = _validate_continuous_strategy(strategy)
+                    if error:
+                        db.session.rollback()
+                        return jsonify({'error': error}), 400
+                    # 连续扫描：按固定间隔扫描子网切片，period_minutes 内覆盖整个子网
+                    strategies.append({
+                        'type': 'continuous',
+                        'period_minutes': strategy.get('period_minutes'),
+                        'interval_seconds': strategy.get('interval_seconds'),
+                        'start_time': strategy.get('start_time'),
+                        'subnet_ids': subnet_id_list,
+                        'scan_params': strategy.get('scan_params', {}),
+                    })
+                elif strategy.get('cron') and strategy.get('start_time'):
                     strategies.append({
                         'cron': strategy['cron'],
                         'start_time': strategy['start_time'],
@@ -132,13 +171,15 @@ def create_policy(current_user):
                 policy.description = policy_data['description']
                 policy.strategies = json.dumps(strategies)
                 policy.threads = policy_data.get('threads', 5)
+                policy.priority = policy_data.get('priority', policy.priority)
             else:
                 policy = ScanPolicy(
                     name=policy_name,
                     description=policy_data['description'],
                     threads=policy_data.get('threads', 5),
                     user_id=current_user.id,
-                    strategies=strategies
+                    strategies=strategies,
+                    priority=policy_data.get('priority', 0)
                 )
                 db.session.add(policy)
             
@@ -188,6 +229,7 @@ def create_policy(current_user):
                 'description': policy.description,
                 'strategies': json.loads(policy.strategies),
                 'threads': policy.threads,
+                'priority': policy.priority,
                 'status': policy.status,
                 'created_at': policy.created_at.isoformat() if policy.created_at else None,
                 'subnets': [{
@@ -226,6 +268,11 @@ def update_policy(current_user, policy_id):
             
         data = request.json
         
+        if 'priority' in data:
+            error = _validate_priority(data['priority'])
+            if error:
+                return jsonify({'error': error}), 400
+        
         # 处理子网更新
         if 'subnets' in data:
             # 清空现有的子网关联
@@ -260,13 +307,20 @@ def update_policy(current_user, policy_id):
         policy.name = data.get('name', policy.name)
         policy.description = data.get('description', policy.description)
         policy.threads = data.get('threads', policy.threads)
+        policy.priority = data.get('priority', policy.priority)
         
         # 更新策略配置
         if 'strategies' in data:
             strategies = data['strategies']
             # 验证策略数据
             for strategy in strategies:
-                if not all(key in strategy for key in ['cron', 'start_time', 'scan_params']):
+                if strategy.get('type') == 'continuous':
+                    if 'scan_params' not in strategy:
+                        return jsonify({'error': 'Invalid strategy format'}), 400
+                    error = _validate_continuous_strategy(strategy)
+                    if error:
+                        return jsonify({'error': error}), 400
+                elif not all(key in strategy for key in ['cron', 'start_time', 'scan_params']):
                     return jsonify({'error': 'Invalid strategy format'}), 400
                 
                 # 处理子网ID列表
@@ -485,6 +539,39 @@ def get_scheduler_jobs(current_user):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@policy_bp.route('/policy/scheduler/status', methods=['GET'])
+@token_required
+def get_scheduler_status(current_user):
+    """Get scheduler leader election status"""
+    try:
+        elector = scheduler.elector
+        return jsonify({
+            'running': scheduler.scheduler.running,
+            'is_leader': scheduler.is_leader,
+            'identity': elector.identity if elector else None,
+            'leader': elector.get_leader() if elector else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@policy_bp.route('/policy/scheduler/telemetry', methods=['GET'])
+@token_required
+def get_scheduler_telemetry(current_user):
+    """Get trigger lag, misfire, job call duration and policy scan run duration statistics of the schedulers"""
+    try:
+        if request.args.get('reset', 'false').lower() == 'true':
+            if not current_user.is_admin:
+                return jsonify({'error': 'Permission denied'}), 403
+            scheduler.reset_telemetry()
+            metrics_scheduler.telemetry.reset()
+        return jsonify({
+            'is_leader': scheduler.is_leader,
+            'policy': scheduler.telemetry_snapshot(),
+            'metrics': metrics_scheduler.telemetry.snapshot()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # 更新策略状态
 @policy_bp.route('/policy/<policy_id>/status', methods=['PUT'])
 @token_required
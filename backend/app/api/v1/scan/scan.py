@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
+import os
+import uuid
+
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.wsgi import get_input_stream
+from werkzeug.exceptions import RequestEntityTooLarge
 from sqlalchemy import desc
 from app.models.models import db, ScanResult, ScanJob
 from app.core.security.auth import token_required
+from app.services.scan.importer import create_import_job
+from app.services.scan.ingest import ScanResultIngestor
+from app.tasks.task_manager import task_manager
 from datetime import datetime
 
 scan_bp = Blueprint('scan', __name__)
@@ -72,13 +80,24 @@ def get_result(current_user, result_id):
 @scan_bp.route('/results/batch', methods=['POST'])
 @token_required
 def create_results(current_user):
-    """批量创建扫描结果"""
-    try:
-        data = request.json
-        job_id = data.get('job_id')
-        results = data.get('results', [])
+    """批量创建扫描结果
 
-        if not job_id or not results:
+    Content-Type 为 application/x-ndjson 时按行流式读取请求体，job_id 通过查询参数传递；
+    否则沿用 JSON 格式 {"job_id": ..., "results": [...]}。
+    """
+    ingestor = None
+    try:
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+        if ndjson:
+            job_id = request.args.get('job_id')
+        else:
+            data = request.json or {}
+            job_id = data.get('job_id')
+            results = data.get('results', [])
+            if not results:
+                return jsonify({'error': '缺少必要参数'}), 400
+
+        if not job_id:
             return jsonify({'error': '缺少必要参数'}), 400
 
         # 验证任务是否属于当前用户
@@ -90,31 +109,33 @@ def create_results(current_user):
         if not job:
             return jsonify({'error': '任务不存在或无权访问'}), 404
 
-        # 批量创建结果
-        new_results = []
-        for result_data in results:
-            result = ScanResult(
-                job_id=job_id,
-                ip_address=result_data['ip_address'],
-                port=result_data.get('port'),
-                protocol=result_data.get('protocol'),
-                service=result_data.get('service'),
-                version=result_data.get('version'),
-                os_info=result_data.get('os_info'),
-                status=result_data.get('status'),
-                banner=result_data.get('banner'),
-                raw_data=result_data.get('raw_data')
+        ingestor = ScanResultIngestor(
+            job_id,
+            chunk_size=current_app.config.get('SCAN_IMPORT_CHUNK_SIZE', 500)
+        )
+        if ndjson:
+            # 请求体逐行读取，不受全局 MAX_CONTENT_LENGTH 限制
+            stream = get_input_stream(
+                request.environ,
+                max_content_length=current_app.config.get('SCAN_IMPORT_MAX_CONTENT_LENGTH')
             )
-            new_results.append(result)
-
-        db.session.bulk_save_objects(new_results)
-        db.session.commit()
+            summary = ingestor.ingest_lines(stream)
+        else:
+            summary = ingestor.ingest_rows(results)
 
         return jsonify({
             'message': '扫描结果保存成功',
-            'count': len(new_results)
+            'count': summary['accepted'],
+            **summary
         })
 
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        # 超限前已提交的块保留，返回已处理的统计
+        return jsonify({
+            'error': '上传内容超过大小限制',
+            **(ingestor.summary() if ingestor else {})
+        }), 413
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -141,4 +162,59 @@ def delete_result(current_user, result_id):
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@scan_bp.route('/import/nmap', methods=['POST'])
+@token_required
+def import_nmap_xml(current_user):
+    """导入 nmap XML 扫描结果"""
+    file_path = None
+    try:
+        subnet_id = request.args.get('subnet_id')
+        policy_id = request.args.get('policy_id')
+        if not subnet_id:
+            return jsonify({'error': '缺少必要参数'}), 400
+
+        # 请求体直接流式写入临时文件，不受全局 MAX_CONTENT_LENGTH 限制
+        max_length = current_app.config.get('SCAN_IMPORT_MAX_CONTENT_LENGTH')
+        stream = get_input_stream(request.environ, max_content_length=max_length)
+        import_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'imports')
+        os.makedirs(import_dir, exist_ok=True)
+        file_path = os.path.join(import_dir, f"{uuid.uuid4()}.xml")
+
+        size = 0
+        with open(file_path, 'wb') as f:
+            while True:
+                chunk = stream.read(64 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+                size += len(chunk)
+
+        if size == 0:
+            os.remove(file_path)
+            return jsonify({'error': '导入文件为空'}), 400
+
+        try:
+            job = create_import_job(subnet_id, current_user.id, policy_id, is_admin=current_user.is_admin)
+        except ValueError:
+            os.remove(file_path)
+            return jsonify({'error': '网段或策略不存在或无权访问'}), 404
+
+        task_manager.submit_import_task(job, file_path)
+
+        return jsonify({
+            'message': '导入任务已提交',
+            'job_id': job.id,
+            'size': size
+        }), 202
+
+    except RequestEntityTooLarge:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        return jsonify({'error': '导入文件超过大小限制'}), 413
+    except Exception as e:
+        db.session.rollback()
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        return jsonify({'error': str(e)}), 500
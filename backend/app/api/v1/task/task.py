@@ -1,9 +1,13 @@
 import json
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.models.models import db, ScanJob, ScanPolicy, ScanSubnet, ScanResult
-from app.core.security.auth import token_required
+from app.core.security.auth import token_required, stream_token_required
 from app.tasks.task_manager import task_manager
+from app.tasks.backpressure import backpressure
+from app.core.error.errors import QueueFullError, RequestTooLargeError
+from app.services.progress.bus import progress_bus, scan_topic, scan_job_event
+from app.services.progress.stream import stream_response
 from datetime import datetime
 
 task_bp = Blueprint('task', __name__)
@@ -84,6 +88,9 @@ def create_job(current_user):
                 return jsonify({'error': f'Invalid subnet: {subnet_id}'}), 400
             subnets.append(subnet)
 
+        # 扫描队列剩余位置不足以容纳全部网段时整体拒绝
+        backpressure.check('scan', len(subnets))
+
         # 为每个网段创建扫描任务
         jobs = []
         for subnet in subnets:
@@ -109,6 +116,8 @@ def create_job(current_user):
                 # Submit task to task manager
                 job = task_manager.submit_scan_task(None, policy_id, subnet.id, scan_params)
                 jobs.append(job)
+            except QueueFullError:
+                raise
             except Exception as e:
                 raise f"Submit scan task failed, error: {e}"
             
@@ -116,6 +125,10 @@ def create_job(current_user):
             'message': 'Scan jobs created successfully',
             'jobs': [job.to_dict() for job in jobs]
         }), 201
+    except RequestTooLargeError as e:
+        return jsonify({'error': e.message, 'limit': e.details.get('depth')}), 413
+    except QueueFullError as e:
+        return jsonify({'error': e.message, 'retry_after': e.retry_after}), 429, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
         
@@ -170,6 +183,40 @@ def get_job_status(current_user, job_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@task_bp.route('/task/<job_id>/events', methods=['GET'])
+@stream_token_required
+def stream_job_events(current_user, job_id):
+    """Stream scan job progress as Server-Sent Events"""
+    try:
+        job = ScanJob.query.filter_by(
+            id=job_id,
+            user_id=current_user.id,
+            deleted=False
+        ).first()
+        
+        if not job:
+            return jsonify({'error': 'Job not found or unauthorized'}), 404
+        
+        # 先订阅再读取当前状态，避免遗漏两者之间的事件
+        topic = scan_topic(job_id)
+        subscription = progress_bus.subscribe([topic])
+        if subscription is None:
+            return jsonify({'error': 'Too many progress streams'}), 503, {'Retry-After': '10'}
+        
+        db.session.refresh(job)
+        initial = [{'event': 'job', 'data': scan_job_event(job)}]
+        db.session.remove()
+        
+        return stream_response(
+            subscription,
+            initial,
+            terminal_events=['job'],
+            heartbeat=current_app.config.get('PROGRESS_STREAM_HEARTBEAT', 15),
+            max_seconds=current_app.config.get('PROGRESS_STREAM_MAX_SECONDS', 3600)
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @task_bp.route('/task/<job_id>/cancel', methods=['POST'])
 @token_required
 def cancel_job(current_user, job_id):
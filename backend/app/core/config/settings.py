@@ -22,6 +22,10 @@ class Config:
     UPLOAD_FOLDER = os.getenv('UPLOAD_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'uploads'))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 限制上传文件大小为16MB
 
+    # 扫描结果导入配置
+    SCAN_IMPORT_MAX_CONTENT_LENGTH = int(os.getenv('SCAN_IMPORT_MAX_CONTENT_LENGTH', 2 * 1024 * 1024 * 1024))  # nmap XML 导入大小上限，默认2GB
+    SCAN_IMPORT_CHUNK_SIZE = int(os.getenv('SCAN_IMPORT_CHUNK_SIZE', 500))  # 每批提交的主机数
+
     # 设置日志配置
     LOG_MAX_BYTES =int(os.getenv('LOG_MAX_BYTES', 10*1024*1024))
     LOG_BACKUP_COUNT= int(os.getenv('LOG_BACKUP_COUNT', 5))
@@ -33,16 +37,110 @@ class Config:
     # Ansible配置
     ANSIBLE_HOST_KEY_CHECKING = os.getenv('ANSIBLE_HOST_KEY_CHECKING', 'False')
     ANSIBLE_TIMEOUT = int(os.getenv('ANSIBLE_TIMEOUT', 30))
+    ANSIBLE_BATCH_ENABLED = str(os.getenv('ANSIBLE_BATCH_ENABLED', 'True')).lower() == 'true'  # 批量采集时同类型主机合并为一次 ansible-runner 调用
+    ANSIBLE_BATCH_SIZE = int(os.getenv('ANSIBLE_BATCH_SIZE', 50))  # 每次 ansible-runner 调用的最大主机数
+    ANSIBLE_BATCH_MIN_HOSTS = int(os.getenv('ANSIBLE_BATCH_MIN_HOSTS', 2))  # 同类型主机少于此数时逐台采集
+    ANSIBLE_FORKS = int(os.getenv('ANSIBLE_FORKS', 10))  # 批量调用的 ansible 并发连接数
+    ANSIBLE_SSH_MULTIPLEXING = str(os.getenv('ANSIBLE_SSH_MULTIPLEXING', 'True')).lower() == 'true'  # Linux 采集复用 SSH 连接（ControlMaster）
+    ANSIBLE_SSH_CONTROL_PERSIST = int(os.getenv('ANSIBLE_SSH_CONTROL_PERSIST', 60))  # 空闲 SSH 主连接保持时间（秒）
+    ANSIBLE_SSH_CONTROL_DIR = os.getenv('ANSIBLE_SSH_CONTROL_DIR', '')  # 控制套接字目录，为空时每个进程创建临时目录
+    ANSIBLE_PIPELINING = str(os.getenv('ANSIBLE_PIPELINING', 'True')).lower() == 'true'  # 启用 pipelining，目标主机 sudoers 不能设置 requiretty
+    ANSIBLE_ARTIFACT_DIR = os.getenv('ANSIBLE_ARTIFACT_DIR', '')  # 保存 ansible-runner artifacts 的目录（排查问题用），为空时运行结束即删除
+    ANSIBLE_ARTIFACT_KEEP = int(os.getenv('ANSIBLE_ARTIFACT_KEEP', 10))  # 配置 ANSIBLE_ARTIFACT_DIR 时保留最近多少次运行的 artifacts
+    ANSIBLE_FACT_CACHE = os.getenv('ANSIBLE_FACT_CACHE', 'jsonfile')  # Linux 事实缓存：jsonfile、redis 或 memory（不缓存）
+    ANSIBLE_FACT_CACHE_DIR = os.getenv('ANSIBLE_FACT_CACHE_DIR', '')  # jsonfile 缓存目录，为空时使用系统临时目录下的 ipams-facts
+    ANSIBLE_FACT_CACHE_REDIS_DB = int(os.getenv('ANSIBLE_FACT_CACHE_REDIS_DB', 0))  # redis 缓存使用的数据库
+    ANSIBLE_FACT_CACHE_TIMEOUT = int(os.getenv('ANSIBLE_FACT_CACHE_TIMEOUT', 86400))  # 缓存的静态主机信息有效期（秒）
+    ANSIBLE_QUICK_REFRESH = str(os.getenv('ANSIBLE_QUICK_REFRESH', 'False')).lower() == 'true'  # 批量采集默认快速刷新（静态信息未过期时只采集内存和磁盘）
+    
+    # 原生 SSH 采集配置
+    LINUX_COLLECTION_ENGINE = os.getenv('LINUX_COLLECTION_ENGINE', 'ansible')  # Linux 采集引擎：ansible 或 ssh（asyncssh 直连，不经过 Ansible）
+    SSH_COLLECTOR_CONCURRENCY = int(os.getenv('SSH_COLLECTOR_CONCURRENCY', 200))  # 一次批量采集同时建立的 SSH 连接数
+    SSH_COLLECTOR_BATCH_SIZE = int(os.getenv('SSH_COLLECTOR_BATCH_SIZE', 200))  # 每次批量 SSH 采集的最大主机数
+    SSH_COLLECTOR_CONNECT_TIMEOUT = int(os.getenv('SSH_COLLECTOR_CONNECT_TIMEOUT', 10))  # SSH 连接超时（秒）
+    SSH_COLLECTOR_COMMAND_TIMEOUT = int(os.getenv('SSH_COLLECTOR_COMMAND_TIMEOUT', 60))  # 采集脚本执行超时（秒）
     
     # 采集任务配置
-    COLLECTION_MAX_CONCURRENT = int(os.getenv('COLLECTION_MAX_CONCURRENT', 5))
-    COLLECTION_TIMEOUT = int(os.getenv('COLLECTION_TIMEOUT', 300))
+    COLLECTION_MAX_CONCURRENT = int(os.getenv('COLLECTION_MAX_CONCURRENT', 5))  # 每个批量任务同时采集的主机数（滑动窗口大小）
+    COLLECTION_TIMEOUT = int(os.getenv('COLLECTION_TIMEOUT', 300))  # 批量采集中单台主机的截止时间（秒），0 表示不限制
+    COLLECTION_POOL_SIZE = int(os.getenv('COLLECTION_POOL_SIZE', 20))  # 所有批量任务共用的采集线程池大小
+    
+    # 全局资源调度配置
+    RESOURCE_BUDGET = int(os.getenv('RESOURCE_BUDGET', 0))  # 扫描、采集和 VMware 采集共享的并发槽位数，0 表示 CPU 核数 * 4
+    RESOURCE_SHARES = os.getenv('RESOURCE_SHARES', 'scan:0.4,collection:0.4,vmware:0.2')  # 各类工作的预算份额
+    RESOURCE_MAX_LOAD = float(os.getenv('RESOURCE_MAX_LOAD', 1.5))  # 每核 1 分钟负载超过此值时收缩预算
+    RESOURCE_MAX_MEMORY = float(os.getenv('RESOURCE_MAX_MEMORY', 90))  # 内存使用率超过此值时收缩预算
+    RESOURCE_ADJUST_INTERVAL = int(os.getenv('RESOURCE_ADJUST_INTERVAL', 10))  # 预算调整间隔（秒）
+    VMWARE_SLOT_TIMEOUT = int(os.getenv('VMWARE_SLOT_TIMEOUT', 300))  # VMware 属性检索等待槽位的最长时间（秒），超时后该主机采集失败
+    
+    # 持久化任务队列配置
+    TASK_QUEUE_VISIBILITY_TIMEOUT = int(os.getenv('TASK_QUEUE_VISIBILITY_TIMEOUT', 300))  # 租约有效期（秒），持有进程失联超过此时间后任务被其他进程接管
+    TASK_QUEUE_POLL_INTERVAL = int(os.getenv('TASK_QUEUE_POLL_INTERVAL', 10))  # 领取重试和过期任务的间隔（秒）
+    TASK_QUEUE_POLL_BATCH = int(os.getenv('TASK_QUEUE_POLL_BATCH', 10))  # 每次最多领取的任务数
+    TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv('TASK_QUEUE_MAX_ATTEMPTS', 3))  # 任务最大执行次数
+    TASK_QUEUE_RETRY_BACKOFF = int(os.getenv('TASK_QUEUE_RETRY_BACKOFF', 30))  # 首次重试等待时间（秒），之后每次翻倍
+    TASK_QUEUE_RETRY_BACKOFF_MAX = int(os.getenv('TASK_QUEUE_RETRY_BACKOFF_MAX', 1800))  # 重试等待时间上限（秒）
+    
+    # 任务提交背压配置
+    SCAN_QUEUE_MAX_DEPTH = int(os.getenv('SCAN_QUEUE_MAX_DEPTH', 50))  # 所有进程已接受但未完成的扫描任务上限（通过 Redis 共享，Redis 不可用时按进程计数），超出时返回 429，0 表示不限制
+    COLLECTION_QUEUE_MAX_DEPTH = int(os.getenv('COLLECTION_QUEUE_MAX_DEPTH', 200))  # 所有进程已接受但未完成的批量采集主机数上限，0 表示不限制
+    BACKPRESSURE_RATE_WINDOW = int(os.getenv('BACKPRESSURE_RATE_WINDOW', 300))  # 估算完成速率的时间窗口（秒）
+    BACKPRESSURE_DEFAULT_RETRY_AFTER = int(os.getenv('BACKPRESSURE_DEFAULT_RETRY_AFTER', 30))  # 没有完成记录时建议的重试等待时间（秒）
+    BACKPRESSURE_MAX_RETRY_AFTER = int(os.getenv('BACKPRESSURE_MAX_RETRY_AFTER', 600))  # 建议的重试等待时间上限（秒）
+    BACKPRESSURE_HEARTBEAT_INTERVAL = int(os.getenv('BACKPRESSURE_HEARTBEAT_INTERVAL', 10))  # 进程同步队列占用的心跳间隔（秒），3 个间隔无心跳的进程占用被清除
+    
+    # 分布式任务注册表配置
+    TASK_REGISTRY_HEARTBEAT_INTERVAL = int(os.getenv('TASK_REGISTRY_HEARTBEAT_INTERVAL', 10))  # 任务心跳间隔（秒）
+    TASK_REGISTRY_ORPHAN_TIMEOUT = int(os.getenv('TASK_REGISTRY_ORPHAN_TIMEOUT', 60))  # 心跳超过此时间未更新的任务视为孤儿任务（秒）
+    
+    # 进度推送（SSE）配置
+    PROGRESS_STREAM_HEARTBEAT = int(os.getenv('PROGRESS_STREAM_HEARTBEAT', 15))  # 空闲时发送心跳的间隔（秒）
+    PROGRESS_STREAM_MAX_SECONDS = int(os.getenv('PROGRESS_STREAM_MAX_SECONDS', 3600))  # 单个连接最长保持时间（秒），到期后浏览器自动重连
+    PROGRESS_STREAM_QUEUE_SIZE = int(os.getenv('PROGRESS_STREAM_QUEUE_SIZE', 100))  # 每个连接缓存的事件数，超出时丢弃最旧的事件
+    PROGRESS_STREAM_MAX_SUBSCRIBERS = int(os.getenv('PROGRESS_STREAM_MAX_SUBSCRIBERS', 200))  # 每个进程的最大连接数，0 表示不限制
     
     # VMware采集并发配置
     VMWARE_COLLECTION_MAX_WORKERS = int(os.getenv('VMWARE_COLLECTION_MAX_WORKERS', 10))
+    VMWARE_PROPERTY_PAGE_SIZE = int(os.getenv('VMWARE_PROPERTY_PAGE_SIZE', 500))  # PropertyCollector 每页返回的虚拟机数
+    VMWARE_INCREMENTAL_ENABLED = str(os.getenv('VMWARE_INCREMENTAL_ENABLED', 'True')).lower() == 'true'  # vCenter 采集是否只采集上次采集后变化的虚拟机
+    VMWARE_INCREMENTAL_MAX_AGE = int(os.getenv('VMWARE_INCREMENTAL_MAX_AGE', 604800))  # 变更跟踪状态的最长保留时间（秒），到期后执行一次完整采集
+    VMWARE_SESSION_KEEPALIVE_INTERVAL = int(os.getenv('VMWARE_SESSION_KEEPALIVE_INTERVAL', 300))  # vCenter 会话保活间隔（秒）
+    VMWARE_SESSION_IDLE_TIMEOUT = int(os.getenv('VMWARE_SESSION_IDLE_TIMEOUT', 1800))  # vCenter 会话空闲多久后注销（秒）
+    VMWARE_CHILD_UPSERT_BATCH_SIZE = int(os.getenv('VMWARE_CHILD_UPSERT_BATCH_SIZE', 500))  # VMware 子主机批量写入每条语句的行数
     BATCH_COLLECTION_MAX_WORKERS = int(os.getenv('BATCH_COLLECTION_MAX_WORKERS', 5))
     COLLECTION_TIMEOUT_SECONDS = int(os.getenv('COLLECTION_TIMEOUT_SECONDS', 300))
     
+    # 策略调度器配置
+    SCHEDULER_JOBSTORE = os.getenv('SCHEDULER_JOBSTORE', 'sqlalchemy')  # sqlalchemy: 策略任务持久化到数据库；memory: 仅保存在内存
+    SCHEDULER_JOBSTORE_URL = os.getenv('SCHEDULER_JOBSTORE_URL', '')  # 为空时使用 SQLALCHEMY_DATABASE_URI
+    SCHEDULER_LEADER_KEY = os.getenv('SCHEDULER_LEADER_KEY', 'ipams:scheduler:leader')  # 主节点选举使用的 Redis 键
+    SCHEDULER_LEADER_TTL = int(os.getenv('SCHEDULER_LEADER_TTL', 15))  # 主节点锁过期时间（秒），主节点失联后约在此时间内被接管
+    SCHEDULER_TELEMETRY_MAX_JOBS = int(os.getenv('SCHEDULER_TELEMETRY_MAX_JOBS', 500))  # 调度遥测最多保留的任务分组数
+    SCHEDULER_JITTER_WINDOW = int(os.getenv('SCHEDULER_JITTER_WINDOW', 300))  # cron 触发按策略确定性偏移的最大秒数，0 表示不偏移
+    SCHEDULER_DEFER_SECONDS = int(os.getenv('SCHEDULER_DEFER_SECONDS', 60))  # 未通过准入控制的扫描推迟的秒数
+    SCHEDULER_MAX_DEFERRALS = int(os.getenv('SCHEDULER_MAX_DEFERRALS', 30))  # 最多推迟次数，超过后记录为失败
+    SCAN_MAX_RUNNING = int(os.getenv('SCAN_MAX_RUNNING', 10))  # 同时运行的扫描任务上限，0 表示不限制
+    SCAN_ADMISSION_MAX_CPU = float(os.getenv('SCAN_ADMISSION_MAX_CPU', 85))  # CPU 使用率超过此值时推迟扫描
+    SCAN_ADMISSION_MAX_MEMORY = float(os.getenv('SCAN_ADMISSION_MAX_MEMORY', 90))  # 内存使用率超过此值时推迟扫描
+    SCAN_COALESCE_ENABLED = str(os.getenv('SCAN_COALESCE_ENABLED', 'True')).lower() == 'true'  # 同一子网的兼容扫描合并执行
+    NMAP_KILL_GRACE_SECONDS = int(os.getenv('NMAP_KILL_GRACE_SECONDS', 5))  # 取消扫描时 nmap 收到 SIGTERM 后等待退出的秒数，超时发送 SIGKILL
+
+    # 端口优先探测配置
+    PORT_PRIORITY_TOP_N = int(os.getenv('PORT_PRIORITY_TOP_N', 10))  # 优先探测历史开放率最高的端口数，0 表示关闭
+    PORT_PRIORITY_BATCH_HOSTS = int(os.getenv('PORT_PRIORITY_BATCH_HOSTS', 256))  # 优先探测时每次 nmap 调用的主机数
+    PORT_STATS_HISTORY_JOBS = int(os.getenv('PORT_STATS_HISTORY_JOBS', 20))  # 统计开放率使用的最近扫描任务数
+    PORT_STATS_CACHE_TTL = int(os.getenv('PORT_STATS_CACHE_TTL', 3600))  # 开放率缓存时间（秒）
+
+    # 被动存活数据配置
+    PASSIVE_LIVENESS_SOURCES = os.getenv('PASSIVE_LIVENESS_SOURCES', '')  # 定时读取的数据源，如 "arp:/var/lib/arp.txt,isc:/var/lib/dhcp/dhcpd.leases,kea:/var/lib/kea/kea-leases4.csv"
+    PASSIVE_LIVENESS_INTERVAL = int(os.getenv('PASSIVE_LIVENESS_INTERVAL', 300))  # 数据源读取间隔（秒）
+    PASSIVE_LIVENESS_CHUNK_SIZE = int(os.getenv('PASSIVE_LIVENESS_CHUNK_SIZE', 500))  # 每批提交的 IP 数
+    PASSIVE_FRESHNESS_SECONDS = int(os.getenv('PASSIVE_FRESHNESS_SECONDS', 900))  # 此时间内被动观测到的主机跳过存活探测，0 表示关闭
+
+    # 连续扫描配置
+    CONTINUOUS_SCAN_PERIOD_MINUTES = int(os.getenv('CONTINUOUS_SCAN_PERIOD_MINUTES', 1440))  # 覆盖整个子网的目标周期
+    CONTINUOUS_SCAN_INTERVAL_SECONDS = int(os.getenv('CONTINUOUS_SCAN_INTERVAL_SECONDS', 300))  # 切片扫描间隔
+
     # 导出文件配置
     EXPORT_FILE_DIR = os.getenv('EXPORT_FILE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'exports'))
     EXPORT_FILE_EXPIRY = int(os.getenv('EXPORT_FILE_EXPIRY', 3600))  # 导出文件保留时间（秒）
@@ -109,4 +109,34 @@ class BusinessError(AppError):
             status_code=400,
             error_code="BUSINESS_ERROR",
             details=details
-        ) 
\ No newline at end of file
+        )
+
+class RequestTooLargeError(AppError):
+    """单次提交的工作量超过队列深度上限，重试也无法被接受"""
+    def __init__(
+        self,
+        message: str = "提交的工作量超过队列上限",
+        details: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__(
+            message=message,
+            status_code=413,
+            error_code="REQUEST_TOO_LARGE",
+            details=details
+        )
+
+class QueueFullError(AppError):
+    """任务队列已满错误"""
+    def __init__(
+        self,
+        message: str = "任务队列已满，请稍后重试",
+        retry_after: int = 30,
+        details: Optional[Dict[str, Any]] = None
+    ):
+        self.retry_after = retry_after
+        super().__init__(
+            message=message,
+            status_code=429,
+            error_code="QUEUE_FULL",
+            details=details
+        )
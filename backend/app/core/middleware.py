@@ -17,7 +17,10 @@ def register_error_handlers(app):
                 'details': error.details
             }
         }
-        return jsonify(response), error.status_code
+        headers = {}
+        if getattr(error, 'retry_after', None):
+            headers['Retry-After'] = str(error.retry_after)
+        return jsonify(response), error.status_code, headers
 
     @app.errorhandler(OperationalError)
     def handle_database_error(error):
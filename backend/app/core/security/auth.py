@@ -12,6 +12,13 @@ def generate_token(user_id):
     return jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
 
 def token_required(f):
+    return _token_required(f, allow_query_token=False)
+
+def stream_token_required(f):
+    """用于 SSE 接口的认证，EventSource 无法设置请求头，允许通过 ?token= 传递令牌"""
+    return _token_required(f, allow_query_token=True)
+
+def _token_required(f, allow_query_token=False):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -19,6 +26,8 @@ def token_required(f):
         
         if auth_header and auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
+        elif allow_query_token:
+            token = request.args.get('token')
             
         if not token:
             return jsonify({'message': 'Token is missing'}), 401
@@ -65,6 +65,8 @@ class IP(db.Model):
     purpose = db.Column(db.Text)
     location = db.Column(db.String(255))
     last_scanned = db.Column(db.DateTime, default=datetime.utcnow)
+    mac_address = db.Column(db.String(17), nullable=True)  # 来自 ARP/DHCP 的 MAC 地址
+    last_seen_passive = db.Column(db.DateTime, nullable=True, index=True)  # 最近一次被 ARP/DHCP 被动观测到的时间
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted = db.Column(db.Boolean, default=False)
 
@@ -85,6 +87,8 @@ class IP(db.Model):
             'purpose': self.purpose or '',
             'location': self.location or '',
             'last_scanned': self.last_scanned.isoformat() if self.last_scanned else None,
+            'mac_address': self.mac_address or '',
+            'last_seen_passive': self.last_seen_passive.isoformat() if self.last_seen_passive else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'assigned_user': self.assigned_user.to_dict() if self.assigned_user else None
         }
@@ -396,6 +400,7 @@ class ScanPolicy(db.Model):
     description = db.Column(db.Text)
     strategies = db.Column(db.Text)  # JSON string of strategies
     threads = db.Column(db.Integer, default=5)
+    priority = db.Column(db.Integer, default=0, nullable=False)  # 调度优先级，扫描队列已满时数值大的定时任务先执行
     status = db.Column(db.String(20), default='active')  # active, running, completed, failed
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -413,12 +418,13 @@ class ScanPolicy(db.Model):
     def __repr__(self):
         return f"<ScanPolicy {self.name}>"
 
-    def __init__(self, name, user_id, description, threads, strategies):
+    def __init__(self, name, user_id, description, threads, strategies, priority=0):
         self.id = str(uuid.uuid4())
         self.name = name
         self.user_id = user_id
         self.description = description
         self.threads = threads
+        self.priority = priority
         self.strategies = json.dumps(strategies)  # 存储为 JSON 字符串
         self.status = 'active'
     
@@ -429,6 +435,7 @@ class ScanPolicy(db.Model):
             "user_id": self.user_id,
             "description": self.description,
             "threads": self.threads,
+            "priority": self.priority,
             "strategies": json.loads(self.strategies),  # 解析 JSON 字符串
             "status": self.status,
             "deleted": self.deleted,
@@ -718,6 +725,7 @@ class HostInfo(db.Model):
     os_bit = db.Column(db.String(10))  # 操作系统位数（32-bit, 64-bit）
     boot_method = db.Column(db.String(20))  # 启动方式（BIOS, UEFI）
     vmware_info = db.Column(db.JSON)
+    vm_uuid = db.Column(db.String(64), nullable=True, index=True)  # VMware子主机的虚拟机UUID（同 vmware_info.vm_uuid）
     collection_status = db.Column(db.String(20), default='pending')  # pending, collecting, success, failed
     collection_error = db.Column(db.Text)
     last_collected_at = db.Column(db.DateTime)
@@ -732,6 +740,11 @@ class HostInfo(db.Model):
     credential_bindings = db.relationship('HostCredentialBinding', back_populates='host', cascade='all, delete-orphan')
     parent_host = db.relationship('HostInfo', remote_side=[id], backref='child_hosts')
     
+    # 唯一约束：同一父主机下一个虚拟机只有一条子主机记录（子主机批量写入的冲突键）
+    __table_args__ = (
+        db.UniqueConstraint('parent_host_id', 'vm_uuid', name='unique_parent_vm_uuid'),
+    )
+    
     def to_dict(self, include_children=False):
         """转换为字典"""
         result = {
@@ -756,6 +769,7 @@ class HostInfo(db.Model):
             'os_bit': self.os_bit,
             'boot_method': self.boot_method,
             'vmware_info': self.vmware_info,
+            'vm_uuid': self.vm_uuid,
             'collection_status': self.collection_status,
             'collection_error': self.collection_error,
             'last_collected_at': self.last_collected_at.isoformat() if self.last_collected_at else None,
@@ -900,4 +914,43 @@ class CollectionProgress(db.Model):
             self.error_message = error_message
         self.updated_at = datetime.utcnow()
         if commit:
-            db.session.commit() 
\ No newline at end of file
+            db.session.commit() 
+
+class TaskQueueItem(db.Model):
+    """持久化任务队列模型
+
+    扫描和采集任务提交时写入队列，执行进程持有带过期时间的租约并定期续期；
+    进程退出或崩溃后租约过期，其他进程（或重启后的进程）重新领取并执行。
+    """
+    __tablename__ = 'task_queue'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(20), nullable=False, index=True)  # scan, collection
+    ref_id = db.Column(db.String(36), nullable=False, index=True)  # 关联的 ScanJob / CollectionTask ID
+    payload = db.Column(db.JSON)  # 重新执行任务所需的参数
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, leased, done, failed, cancelled
+    attempts = db.Column(db.Integer, default=0, nullable=False)  # 已领取执行的次数
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    lease_owner = db.Column(db.String(128), nullable=True)  # 持有租约的进程标识
+    lease_expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)  # 重试退避后可再次领取的时间
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'ref_id': self.ref_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
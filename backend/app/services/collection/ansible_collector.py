@@ -4,22 +4,133 @@ Ansible 主机信息采集器
 """
 import os
 import json
+import atexit
+import shutil
 import tempfile
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional
 from flask import current_app
 from app.core.utils.logger import app_logger as logger
 from app.core.security.encryption import decrypt_credential
+from app.tasks.cancellation import current_token
+
+
+class _EventRecorder:
+    """
+    ansible-runner 事件处理器
+    
+    运行过程中只保留解析需要的结果（set_fact 保存的 host_info、失败和不可达任务的错误），
+    返回 False 使事件不写入 artifacts 目录。
+    """
+    
+    def __init__(self, keep_artifacts: bool = False):
+        self.events = []
+        self.hosts = set()
+        self.keep_artifacts = keep_artifacts
+    
+    def __call__(self, event: Dict[str, Any]) -> bool:
+        event_type = event.get('event')
+        event_data = event.get('event_data', {})
+        host = event_data.get('host')
+        if host:
+            self.hosts.add(host)
+        res = event_data.get('res') or {}
+        if event_type == 'runner_on_ok':
+            facts = res.get('ansible_facts') or {}
+            if 'host_info' in facts:
+                self.events.append({
+                    'event': event_type,
+                    'event_data': {'host': host, 'res': {'ansible_facts': {'host_info': facts['host_info']}}}
+                })
+        elif event_type in ('runner_on_failed', 'runner_on_unreachable'):
+            self.events.append({
+                'event': event_type,
+                'event_data': {'host': host, 'res': {'msg': res.get('msg', ''), 'stderr': res.get('stderr', '')}}
+            })
+        return self.keep_artifacts
 
 
 class AnsibleCollector:
     """Ansible 主机信息采集器"""
     
+    _control_dir = None
+    _control_dir_lock = threading.Lock()
+    
     def __init__(self):
         self.base_dir = os.path.join(os.path.dirname(__file__), 'playbooks')
         self.ansible_timeout = current_app.config.get('ANSIBLE_TIMEOUT', 30) if current_app else 30
     
+    @classmethod
+    def _control_path_dir(cls) -> str:
+        """
+        获取 SSH ControlMaster 套接字目录
+        
+        ansible-runner 默认把控制套接字放在每次调用的私有目录下，调用结束即失效。
+        这里为本进程创建一个固定目录，使 ControlPersist 期间内的后续采集复用已建立的连接；
+        进程退出时删除。配置 ANSIBLE_SSH_CONTROL_DIR 时使用指定目录。
+        """
+        with cls._control_dir_lock:
+            if cls._control_dir is None:
+                configured = current_app.config.get('ANSIBLE_SSH_CONTROL_DIR') if current_app else None
+                if configured:
+                    os.makedirs(configured, mode=0o700, exist_ok=True)
+                    cls._control_dir = configured
+                else:
+                    # 套接字路径长度有限（108 字节），目录名保持简短
+                    cls._control_dir = tempfile.mkdtemp(prefix='ipams-cp-')
+                    atexit.register(shutil.rmtree, cls._control_dir, True)
+            return cls._control_dir
+    
+    def _ssh_connection_vars(self) -> str:
+        """
+        Linux 主机的 SSH 连接复用和 pipelining 参数（inventory 主机变量）
+        
+        每台主机只在第一个任务建立一次 SSH 连接，后续任务和 ControlPersist 期间内的
+        重新采集通过控制套接字复用；pipelining 通过已有会话的标准输入传输模块，
+        省去每个任务的临时文件上传。
+        """
+        config = current_app.config if current_app else {}
+        options = ''
+        if config.get('ANSIBLE_SSH_MULTIPLEXING', True):
+            persist = config.get('ANSIBLE_SSH_CONTROL_PERSIST', 60)
+            options += (f' ansible_ssh_args="-C -o ControlMaster=auto -o ControlPersist={persist}s"'
+                        f' ansible_control_path_dir={self._control_path_dir()}')
+        if config.get('ANSIBLE_PIPELINING', True):
+            options += ' ansible_ssh_pipelining=true'
+        return options
+    
+    def _fact_cache_envvars(self, quick_refresh: bool = False) -> Dict[str, str]:
+        """
+        Linux 采集的事实缓存配置（ansible-runner 环境变量）
+        
+        事实按 inventory 主机名缓存（jsonfile 或 Redis），playbook 把静态主机信息以
+        cacheable 方式写入缓存。完整采集总是重新收集事实并刷新缓存；快速刷新使用 smart
+        收集方式，缓存未过期时跳过事实收集和静态信息采集，只重新采集内存和磁盘使用情况。
+        """
+        config = current_app.config if current_app else {}
+        envvars = {'ANSIBLE_GATHERING': 'smart' if quick_refresh else 'implicit'}
+        backend = str(config.get('ANSIBLE_FACT_CACHE', 'jsonfile')).lower()
+        if backend == 'jsonfile':
+            cache_dir = config.get('ANSIBLE_FACT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'ipams-facts')
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            envvars['ANSIBLE_CACHE_PLUGIN'] = 'jsonfile'
+            envvars['ANSIBLE_CACHE_PLUGIN_CONNECTION'] = cache_dir
+        elif backend == 'redis':
+            # 连接格式 host:port:db[:password]
+            connection = f"{config.get('REDIS_HOST', 'localhost')}:{config.get('REDIS_PORT', 6379)}:{config.get('ANSIBLE_FACT_CACHE_REDIS_DB', 0)}"
+            if config.get('REDIS_PASSWORD'):
+                connection += f":{config.get('REDIS_PASSWORD')}"
+            envvars['ANSIBLE_CACHE_PLUGIN'] = 'community.general.redis'
+            envvars['ANSIBLE_CACHE_PLUGIN_CONNECTION'] = connection
+            envvars['ANSIBLE_CACHE_PLUGIN_PREFIX'] = 'ipams_facts_'
+        else:
+            return envvars
+        envvars['ANSIBLE_CACHE_PLUGIN_TIMEOUT'] = str(config.get('ANSIBLE_FACT_CACHE_TIMEOUT', 86400))
+        return envvars
+    
     def collect_linux_info(self, host_ip: str, username: str, password: Optional[str] = None, 
-                          private_key: Optional[str] = None, port: int = 22) -> Dict[str, Any]:
+                          private_key: Optional[str] = None, port: int = 22,
+                          quick_refresh: bool = False) -> Dict[str, Any]:
         """
         采集Linux主机信息
         
@@ -29,6 +140,7 @@ class AnsibleCollector:
             password: 密码（可选）
             private_key: SSH私钥（可选）
             port: SSH端口号
+            quick_refresh: 快速刷新，缓存的静态信息未过期时只采集内存和磁盘使用情况
             
         Returns:
             采集的主机信息字典
@@ -46,18 +158,19 @@ class AnsibleCollector:
             
             playbook_path = os.path.join(self.base_dir, 'linux_info.yml')
             
-            # 准备inventory文件
-            inventory_content = self._prepare_inventory(host_ip, username, password, private_key, 'linux', port)
-            
-            # 创建临时目录
+            # 创建临时目录，作为本次运行的 private_data_dir，结束后连同 artifacts 一起删除
             with tempfile.TemporaryDirectory() as tmp_dir:
+                # 准备inventory文件
+                inventory_content = self._prepare_inventory(host_ip, username, password, private_key, 'linux', port, tmp_dir)
+                
                 # 写入inventory文件
                 inventory_file = os.path.join(tmp_dir, 'inventory.ini')
                 with open(inventory_file, 'w') as f:
                     f.write(inventory_content)
                 
                 # 执行ansible playbook
-                result = self._run_playbook(playbook_path, inventory_file, tmp_dir)
+                result = self._run_playbook(playbook_path, inventory_file, tmp_dir,
+                                            **self._linux_runner_kwargs(quick_refresh))
                 
                 if result.get('success'):
                     host_info = self._parse_linux_result(result)
@@ -135,11 +248,11 @@ class AnsibleCollector:
             
             playbook_path = os.path.join(self.base_dir, 'windows_info.yml')
             
-            # 准备inventory文件
-            inventory_content = self._prepare_inventory(host_ip, username, password, None, 'windows', port)
-            
-            # 创建临时目录
+            # 创建临时目录，作为本次运行的 private_data_dir，结束后连同 artifacts 一起删除
             with tempfile.TemporaryDirectory() as tmp_dir:
+                # 准备inventory文件
+                inventory_content = self._prepare_inventory(host_ip, username, password, None, 'windows', port, tmp_dir)
+                
                 # 写入inventory文件
                 inventory_file = os.path.join(tmp_dir, 'inventory.ini')
                 with open(inventory_file, 'w') as f:
@@ -198,8 +311,116 @@ class AnsibleCollector:
             # 返回包含错误信息的字典，而不是空字典
             return {'success': False, 'error': error_msg}
     
+    def collect_batch_info(self, targets: List[Dict[str, Any]], os_type: str, forks: int = 10,
+                           timeout: Optional[int] = None, quick_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        一次 ansible-runner 调用采集多台同类型主机
+        
+        所有主机写入同一个inventory，playbook 只执行一次，由 forks 控制并发；
+        执行结束后按事件中的主机名拆分出每台主机的结果。
+        
+        Args:
+            targets: 主机列表，每项包含 id, host_ip, username, password, private_key, port
+            os_type: 操作系统类型 linux/windows
+            forks: ansible 并发连接数
+            timeout: 整个 playbook 的超时时间（秒）
+            quick_refresh: 快速刷新（仅 Linux），见 collect_linux_info
+            
+        Returns:
+            {id: 结果}，结果格式与 collect_linux_info/collect_windows_info 的返回值相同
+        """
+        if not targets:
+            return {}
+        
+        playbook_path = os.path.join(self.base_dir, 'windows_info.yml' if os_type == 'windows' else 'linux_info.yml')
+        # inventory 主机名同时是事实缓存的键，使用IP；同一IP可能对应多条主机记录，重复时追加序号
+        aliases = {}
+        for index, target in enumerate(targets):
+            alias = target['host_ip']
+            if alias in aliases:
+                alias = f"{target['host_ip']}_{index}"
+            aliases[alias] = target
+        
+        logger.info(
+            f"{os_type.capitalize()} batch collection started for {len(targets)} hosts",
+            extra={
+                'host_count': len(targets),
+                'forks': forks,
+                'operation': f'{os_type}_batch_collect'
+            }
+        )
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                lines = ['[all]']
+                for alias, target in aliases.items():
+                    lines.append(self._inventory_host_line(
+                        alias, target['host_ip'], target['username'], target.get('password'),
+                        target.get('private_key') if os_type != 'windows' else None,
+                        os_type, target['port'], tmp_dir
+                    ))
+                inventory_file = os.path.join(tmp_dir, 'inventory.ini')
+                with open(inventory_file, 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+                
+                runner_kwargs = {'forks': max(min(forks, len(targets)), 1)}
+                if os_type != 'windows':
+                    runner_kwargs.update(self._linux_runner_kwargs(quick_refresh))
+                if timeout:
+                    runner_kwargs['timeout'] = timeout
+                result = self._run_playbook(playbook_path, inventory_file, tmp_dir, **runner_kwargs)
+        except Exception as e:
+            logger.error(f"Error running {os_type} batch collection: {str(e)}")
+            return {target['id']: {'success': False, 'error': str(e)} for target in targets}
+        
+        runner = result.get('runner')
+        if not runner:
+            error_msg = result.get('error', 'Unknown error')
+            return {target['id']: {'success': False, 'error': error_msg} for target in targets}
+        
+        # 按主机拆分事件
+        host_events = {alias: [] for alias in aliases}
+        for event in result['events']:
+            host = event.get('event_data', {}).get('host')
+            if host in host_events:
+                host_events[host].append(event)
+        
+        results = {}
+        for alias, target in aliases.items():
+            events = host_events[alias]
+            host_info = self._host_info_from_events(events)
+            error_msg = self._errors_from_events(events).replace(f'[{alias}]', f"[{target['host_ip']}]")
+            # playbook 中的采集任务设置了 ignore_errors，拿到 host_info 即视为成功
+            if host_info:
+                results[target['id']] = host_info
+            elif error_msg:
+                results[target['id']] = {'success': False, 'error': error_msg}
+            elif alias not in result['hosts'] or runner.status in ('timeout', 'canceled'):
+                # 主机没有任何事件，或 playbook 超时、被取消时尚未完成
+                results[target['id']] = {'success': False, 'error': result.get('error') or f"Playbook {runner.status}"}
+            else:
+                results[target['id']] = {'success': False, 'error': 'Failed to parse collection result or no data collected'}
+        
+        failed = sum(1 for r in results.values() if r.get('success') is False)
+        logger.info(
+            f"{os_type.capitalize()} batch collection completed: {len(targets) - failed} succeeded, {failed} failed",
+            extra={
+                'host_count': len(targets),
+                'failed_count': failed,
+                'operation': f'{os_type}_batch_collect'
+            }
+        )
+        return results
+    
+    def _linux_runner_kwargs(self, quick_refresh: bool) -> Dict[str, Any]:
+        """Linux playbook 的事实缓存环境变量和快速刷新参数"""
+        return {
+            'envvars': self._fact_cache_envvars(quick_refresh),
+            'extravars': {'ipams_quick_refresh': quick_refresh}
+        }
+    
     def _prepare_inventory(self, host_ip: str, username: str, password: Optional[str], 
-                          private_key: Optional[str], os_type: str, port: int) -> str:
+                          private_key: Optional[str], os_type: str, port: int, key_dir: str) -> str:
         """
         准备Ansible inventory内容
         
@@ -210,35 +431,61 @@ class AnsibleCollector:
             private_key: SSH私钥
             os_type: 操作系统类型
             port: 端口号
+            key_dir: 私钥文件保存目录（本次运行的临时目录）
             
         Returns:
             inventory文件内容
         """
+        host_line = self._inventory_host_line(host_ip, host_ip, username, password, private_key,
+                                              os_type, port, key_dir)
+        return f"""[all]
+{host_line}
+"""
+    
+    def _inventory_host_line(self, name: str, host_ip: str, username: str, password: Optional[str],
+                             private_key: Optional[str], os_type: str, port: int, key_dir: str) -> str:
+        """
+        生成一台主机的inventory行
+        
+        Args:
+            name: inventory中的主机名，与IP不同时通过ansible_host指定地址
+            key_dir: 私钥文件保存目录
+        """
+        address = f' ansible_host={host_ip}' if name != host_ip else ''
         if os_type == 'windows':
             # Windows主机使用winrm
-            return f"""[all]
-{host_ip} ansible_user={username} ansible_password={password} ansible_connection=winrm ansible_winrm_transport=basic ansible_winrm_port={port}
-"""
-        else:
-            # Linux主机使用SSH
-            auth_method = ''
-            if private_key:
-                # 保存私钥到临时文件
-                key_file = os.path.join(tempfile.gettempdir(), f'ansible_key_{host_ip}.pem')
-                with open(key_file, 'w') as f:
-                    f.write(private_key)
-                os.chmod(key_file, 0o600)
-                auth_method = f' ansible_ssh_private_key_file={key_file}'
-                if password:
-                    auth_method += f' ansible_ssh_pass={password}'
-            elif password:
-                auth_method = f' ansible_ssh_pass={password}'
-            
-            return f"""[all]
-{host_ip} ansible_user={username}{auth_method} ansible_connection=ssh ansible_port={port}
-"""
+            return f"{name}{address} ansible_user={username} ansible_password={password} ansible_connection=winrm ansible_winrm_transport=basic ansible_winrm_port={port}"
+        
+        # Linux主机使用SSH
+        auth_method = ''
+        if private_key:
+            # 保存私钥到临时文件
+            key_file = os.path.join(key_dir, f'ansible_key_{name}.pem')
+            with open(key_file, 'w') as f:
+                f.write(private_key)
+            os.chmod(key_file, 0o600)
+            auth_method = f' ansible_ssh_private_key_file={key_file}'
+            if password:
+                auth_method += f' ansible_ssh_pass={password}'
+        elif password:
+            auth_method = f' ansible_ssh_pass={password}'
+        
+        return f"{name}{address} ansible_user={username}{auth_method} ansible_connection=ssh ansible_port={port}{self._ssh_connection_vars()}"
+    
+    def _artifact_kwargs(self) -> Dict[str, Any]:
+        """
+        artifacts 保存参数
+        
+        默认 artifacts 写在本次运行的临时目录中，随临时目录删除；配置 ANSIBLE_ARTIFACT_DIR 时
+        保存到该目录用于排查问题，只保留最近 ANSIBLE_ARTIFACT_KEEP 次运行。
+        """
+        config = current_app.config if current_app else {}
+        artifact_dir = config.get('ANSIBLE_ARTIFACT_DIR')
+        if artifact_dir:
+            return {'artifact_dir': artifact_dir, 'rotate_artifacts': max(config.get('ANSIBLE_ARTIFACT_KEEP', 10), 1)}
+        return {'rotate_artifacts': 1}
     
-    def _run_playbook(self, playbook_path: str, inventory_file: str, project_dir: str) -> Dict[str, Any]:
+    def _run_playbook(self, playbook_path: str, inventory_file: str, work_dir: str, **runner_kwargs) -> Dict[str, Any]:
         """
         执行Ansible playbook
         使用ansible-runner库执行playbook
@@ -246,34 +493,48 @@ class AnsibleCollector:
         Args:
             playbook_path: playbook路径
             inventory_file: inventory文件路径
-            project_dir: 项目目录
+            work_dir: 本次运行的私有目录（private_data_dir），由调用方创建和删除
+            runner_kwargs: 传给 ansible_runner.run 的其他参数，如 forks、timeout、envvars；
+                extravars 与默认的 extravars 合并
             
         Returns:
-            执行结果
+            执行结果，events 为运行过程中保留的事件，hosts 为产生过事件的主机
         """
         try:
             import ansible_runner
-            import json
             
             # 使用ansible-runner执行playbook
+            # 批量采集任务取消时，runner 轮询 cancel_callback 并终止 ansible 进程
+            token = current_token()
+            extravars = {'ansible_host_key_checking': False}
+            extravars.update(runner_kwargs.pop('extravars', {}))
+            artifact_kwargs = self._artifact_kwargs()
+            recorder = _EventRecorder(keep_artifacts='artifact_dir' in artifact_kwargs)
             r = ansible_runner.run(
+                private_data_dir=work_dir,
                 playbook=os.path.basename(playbook_path),
                 inventory=inventory_file,
                 project_dir=os.path.dirname(playbook_path),
-                quiet=False,
-                extravars={'ansible_host_key_checking': False}
+                quiet=True,
+                extravars=extravars,
+                event_handler=recorder,
+                cancel_callback=(lambda: token.cancelled) if token else None,
+                **artifact_kwargs,
+                **runner_kwargs
             )
             
-            if r.status == 'successful':
-                # ansible-runner不直接返回任务数据，需要通过事件流解析
-                # 先返回成功状态，后续可以从fact_cache或文件中读取
-                return {'success': True, 'runner': r}
+            result = {'runner': r, 'events': recorder.events, 'hosts': recorder.hosts}
+            if r.status == 'canceled':
+                result.update(success=False, error='任务已取消')
+            elif r.status == 'successful':
+                result['success'] = True
             else:
                 # 从事件中提取详细的错误信息
-                error_msg = self._extract_error_from_events(r)
+                error_msg = self._errors_from_events(recorder.events)
                 if not error_msg:
                     error_msg = f"Playbook failed with status: {r.status}"
-                return {'success': False, 'error': error_msg, 'runner': r}
+                result.update(success=False, error=error_msg)
+            return result
                 
         except Exception as e:
             logger.error(f"Error running ansible playbook: {str(e)}")
@@ -282,7 +543,7 @@ class AnsibleCollector:
     def _parse_linux_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """
         解析Linux采集结果
-        从ansible-runner的事件流中提取host_info数据
+        从运行过程中保留的事件中提取host_info数据
         
         Args:
             result: ansible执行结果
@@ -291,45 +552,47 @@ class AnsibleCollector:
             标准化后的主机信息
         """
         try:
-            host_info = {}
-            
-            # 从runner对象的事件中提取数据
-            runner = result.get('runner')
-            if runner and hasattr(runner, 'events'):
-                for event in runner.events:
-                    event_type = event.get('event')
-                    event_data = event.get('event_data', {})
-                    
-                    # 查找set_fact事件，这是存储host_info的地方
-                    if event_type in ['runner_on_ok', 'ansible_facts']:
-                        # ansible_facts包含收集的事实
-                        facts = event_data.get('fact', {})
-                        if 'host_info' in facts:
-                            host_info.update(facts['host_info'])
-                        
-                        # 或者从res中查找set_fact
-                        res = event_data.get('res', {})
-                        if 'ansible_facts' in res and 'host_info' in res['ansible_facts']:
-                            host_info.update(res['ansible_facts']['host_info'])
-                    
-                    # 查找set_fact任务的结果
-                    if event_type == 'runner_on_ok':
-                        res = event_data.get('res', {})
-                        if res.get('ansible_facts', {}).get('host_info'):
-                            host_info.update(res['ansible_facts']['host_info'])
-            
-            return host_info
+            return self._host_info_from_events(result.get('events') or [])
             
         except Exception as e:
             logger.error(f"Error parsing Linux result: {str(e)}")
             return {}
     
-    def _extract_error_from_events(self, runner) -> str:
+    def _host_info_from_events(self, events) -> Dict[str, Any]:
         """
-        从 ansible-runner 的事件中提取详细的错误信息
+        从 ansible-runner 的事件中提取 playbook 通过 set_fact 保存的 host_info
         
         Args:
-            runner: ansible-runner 的 runner 对象
+            events: 事件列表（单台主机或整个 playbook 的事件）
+            
+        Returns:
+            host_info 字典，没有数据时为空字典
+        """
+        host_info = {}
+        for event in events:
+            event_type = event.get('event')
+            event_data = event.get('event_data', {})
+            
+            # 查找set_fact事件，这是存储host_info的地方
+            if event_type in ['runner_on_ok', 'ansible_facts']:
+                # ansible_facts包含收集的事实
+                facts = event_data.get('fact', {})
+                if 'host_info' in facts:
+                    host_info.update(facts['host_info'])
+                
+                # 或者从res中查找set_fact
+                res = event_data.get('res', {})
+                if 'ansible_facts' in res and 'host_info' in res['ansible_facts']:
+                    host_info.update(res['ansible_facts']['host_info'])
+        
+        return host_info
+    
+    def _errors_from_events(self, events) -> str:
+        """
+        从事件列表中提取失败和不可达事件的错误信息
+        
+        Args:
+            events: 事件列表
             
         Returns:
             错误信息字符串
@@ -338,8 +601,8 @@ class AnsibleCollector:
             error_messages = []
             processed_hosts = set()  # 避免重复处理同一主机
             
-            if runner and hasattr(runner, 'events'):
-                for event in runner.events:
+            if events:
+                for event in events:
                     event_type = event.get('event')
                     event_data = event.get('event_data', {})
                     host = event_data.get('host', '')
@@ -408,7 +671,7 @@ class AnsibleCollector:
     def _parse_windows_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """
         解析Windows采集结果
-        从ansible-runner的事件流中提取host_info数据
+        从运行过程中保留的事件中提取host_info数据
         
         Args:
             result: ansible执行结果
@@ -417,34 +680,7 @@ class AnsibleCollector:
             标准化后的主机信息
         """
         try:
-            host_info = {}
-            
-            # 从runner对象的事件中提取数据
-            runner = result.get('runner')
-            if runner and hasattr(runner, 'events'):
-                for event in runner.events:
-                    event_type = event.get('event')
-                    event_data = event.get('event_data', {})
-                    
-                    # 查找set_fact事件，这是存储host_info的地方
-                    if event_type in ['runner_on_ok', 'ansible_facts']:
-                        # ansible_facts包含收集的事实
-                        facts = event_data.get('fact', {})
-                        if 'host_info' in facts:
-                            host_info.update(facts['host_info'])
-                        
-                        # 或者从res中查找set_fact
-                        res = event_data.get('res', {})
-                        if 'ansible_facts' in res and 'host_info' in res['ansible_facts']:
-                            host_info.update(res['ansible_facts']['host_info'])
-                    
-                    # 查找set_fact任务的结果
-                    if event_type == 'runner_on_ok':
-                        res = event_data.get('res', {})
-                        if res.get('ansible_facts', {}).get('host_info'):
-                            host_info.update(res['ansible_facts']['host_info'])
-            
-            return host_info
+            return self._host_info_from_events(result.get('events') or [])
             
         except Exception as e:
             logger.error(f"Error parsing Windows result: {str(e)}")
@@ -0,0 +1,74 @@
+"""
+批量采集统计
+记录批量采集任务中每台主机的采集耗时，计算吞吐量和耗时分布
+"""
+import threading
+import time
+
+from typing import Dict, List
+
+
+class BatchStats:
+    """单个批量采集任务的吞吐量和耗时统计"""
+
+    def __init__(self, total_hosts: int, window: int, host_timeout: int):
+        self.total_hosts = total_hosts
+        self.window = window
+        self.host_timeout = host_timeout
+        self.started_at = time.time()
+        self.finished_at = None
+        self._started = time.monotonic()
+        self._durations: List[float] = []
+        self._timeouts = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def host_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def host_finished(self, duration: float, timed_out: bool = False):
+        """记录一台主机采集结束"""
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            self._durations.append(duration)
+            if timed_out:
+                self._timeouts += 1
+
+    def finish(self):
+        with self._lock:
+            if self.finished_at is None:
+                self.finished_at = time.time()
+
+    @staticmethod
+    def _percentile(values: List[float], percent: float) -> float:
+        index = min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)
+        return values[index]
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            durations = sorted(self._durations)
+            in_flight = self._in_flight
+            timeouts = self._timeouts
+            finished_at = self.finished_at
+        elapsed = (finished_at - self.started_at) if finished_at else (time.monotonic() - self._started)
+        completed = len(durations)
+        stats = {
+            'total_hosts': self.total_hosts,
+            'completed_hosts': completed,
+            'in_flight': in_flight,
+            'window': self.window,
+            'host_timeout': self.host_timeout,
+            'timeouts': timeouts,
+            'elapsed_seconds': round(elapsed, 2),
+            'throughput_per_minute': round(completed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            'latency': None
+        }
+        if durations:
+            stats['latency'] = {
+                'avg': round(sum(durations) / completed, 2),
+                'p50': round(self._percentile(durations, 50), 2),
+                'p95': round(self._percentile(durations, 95), 2),
+                'max': round(durations[-1], 2)
+            }
+        return stats
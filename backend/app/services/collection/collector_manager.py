@@ -3,22 +3,38 @@
 统一管理采集任务，支持批量采集和单个主机采集
 实现采集任务队列和并发控制
 """
+import math
 import threading
-from typing import List, Dict, Any, Optional, Callable
+import time
+import uuid
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from datetime import datetime
 from flask import current_app
-from app.models.models import db, HostInfo, CollectionTask, Credential, CollectionProgress
+from sqlalchemy import func, inspect, null
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from app.models.models import db, HostInfo, CollectionTask, Credential, CollectionProgress, TaskQueueItem
 from app.core.utils.logger import app_logger as logger
 from app.core.security.encryption import decrypt_credential
+from app.tasks.task_queue import task_queue
+from app.tasks.resource_governor import resource_governor
+from app.tasks.cancellation import CancellationToken, current_token
+from app.tasks.task_registry import task_registry
+from app.tasks.backpressure import backpressure
 from .ansible_collector import AnsibleCollector
+from .ssh_collector import NativeSSHCollector
 from .vmware_collector import VMwareCollector
+from .batch_stats import BatchStats
 
 
 class CollectorManager:
     """采集管理器单例"""
     
     _instance = None
-    _running_tasks = {}  # 存储正在运行的任务信息 {task_id: {'threads': [...], 'host_ids': [...], 'cancelled': False}}
+    _running_tasks = {}  # 存储正在运行的任务信息 {task_id: {'host_ids': [...], 'token': CancellationToken, 'reservation': {...}, 'stats': BatchStats}}
+    _finished_stats = OrderedDict()  # 最近结束的批量任务统计 {task_id: dict}
+    _finished_stats_limit = 100
     _task_lock = threading.Lock()  # 保护_running_tasks的锁
     _lock = threading.Lock()  # 保护单例创建的锁
     
@@ -36,20 +52,39 @@ class CollectorManager:
         
         self._initialized = True
         self.ansible_collector = AnsibleCollector()
+        self.ssh_collector = NativeSSHCollector()
         self.vmware_collector = VMwareCollector()
         self.max_concurrent = 5
         self.timeout = 300
+        self.ansible_forks = 10
+        self.linux_engine = 'ansible'
+        self.ssh_concurrency = 200
+        self._pool = None
         self._active_tasks = {}
         # 注意：_task_lock 已在类级别定义
     
     def init_app(self, app):
         """初始化应用配置"""
         with app.app_context():
-            self.max_concurrent = app.config.get('COLLECTION_MAX_CONCURRENT', 5)
+            self.max_concurrent = max(app.config.get('COLLECTION_MAX_CONCURRENT', 5), 1)
             self.timeout = app.config.get('COLLECTION_TIMEOUT', 300)
+            self.ansible_forks = app.config.get('ANSIBLE_FORKS', 10)
+            self.linux_engine = str(app.config.get('LINUX_COLLECTION_ENGINE', 'ansible')).lower()
+            self.ssh_concurrency = max(app.config.get('SSH_COLLECTOR_CONCURRENCY', 200), 1)
+            # 所有批量任务共用的常驻线程池，每个任务在池中最多同时占用 max_concurrent 个线程
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=max(app.config.get('COLLECTION_POOL_SIZE', 20), self.max_concurrent),
+                    thread_name_prefix='collection'
+                )
+        task_queue.register('collection', self._resume_batch_collection)
+        task_registry.on_cancel('collection', self._cancel_local_task)
+        task_registry.on_orphan('collection', self._handle_orphaned_collection)
     
     def collect_single_host(self, host_info_id: str, credential_id: Optional[str] = None, 
-                           custom_credential: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                           custom_credential: Optional[Dict[str, Any]] = None,
+                           prefetched_result: Optional[Dict[str, Any]] = None,
+                           quick_refresh: bool = False) -> Dict[str, Any]:
         """
         采集单个主机信息
         
@@ -57,6 +92,8 @@ class CollectorManager:
             host_info_id: 主机信息ID
             credential_id: 凭证ID（可选，如果不提供则使用绑定默认凭证）
             custom_credential: 自定义凭证字典，包含username, password, private_key, port等
+            prefetched_result: 批量 ansible 采集已取得的结果（_normalize_result 格式），提供时不再执行采集
+            quick_refresh: Linux 快速刷新，缓存的静态信息未过期时只采集内存和磁盘使用情况
             
         Returns:
             采集结果
@@ -94,7 +131,11 @@ class CollectorManager:
                 use_custom = False
             
             # 执行采集（collect_single_host不支持progress_callback）
-            result = self._execute_collection(host_info, credential, custom_port=custom_credential.get('port') if custom_credential else None, progress_callback=None)
+            if prefetched_result is not None:
+                result = prefetched_result
+            else:
+                result = self._execute_collection(host_info, credential, custom_port=custom_credential.get('port') if custom_credential else None, progress_callback=None,
+                                                  quick_refresh=quick_refresh)
             
             # 更新结果
             host_ip = host_info.ip.ip_address if host_info.ip else 'Unknown'
@@ -107,11 +148,8 @@ class CollectorManager:
                 collection_data = result.get('data', {})
                 self._update_host_info(host_info, collection_data)
                 
-                # 如果是VMware批量采集，需要创建子主机记录
-                vm_count = 0
-                if isinstance(collection_data, dict) and 'vms' in collection_data:
-                    vm_count = len(collection_data['vms'])
-                    self._create_vm_child_records(host_info, collection_data['vms'])
+                # 如果是VMware批量采集，需要创建、更新和删除子主机记录
+                vm_count = self._apply_vm_results(host_info, collection_data)
                 
                 if vm_count > 0:
                     logger.info(
@@ -246,11 +284,8 @@ class CollectorManager:
                 collection_data = result.get('data', {})
                 self._update_host_info(host_info, collection_data)
                 
-                # 如果是VMware批量采集，需要创建子主机记录
-                vm_count = 0
-                if isinstance(collection_data, dict) and 'vms' in collection_data:
-                    vm_count = len(collection_data['vms'])
-                    self._create_vm_child_records(host_info, collection_data['vms'])
+                # 如果是VMware批量采集，需要创建、更新和删除子主机记录
+                vm_count = self._apply_vm_results(host_info, collection_data)
                 
                 if vm_count > 0:
                     logger.info(
@@ -351,7 +386,10 @@ class CollectorManager:
                             'vms': vm_data.get('vms', []),
                             'total': vm_data.get('total', 0),
                             'completed': vm_data.get('completed', 0),
-                            'failed': vm_data.get('failed', 0)
+                            'failed': vm_data.get('failed', 0),
+                            'cancelled': vm_data.get('cancelled', False),
+                            'incremental': vm_data.get('incremental', False),
+                            'removed_vm_uuids': vm_data.get('removed_vm_uuids', [])
                         }
                     }
                 # 其他情况，返回数据（可能是单个VM的信息）
@@ -546,19 +584,28 @@ class CollectorManager:
             )
             return {'success': False, 'error': str(e)}
     
-    def collect_batch_hosts(self, host_ids: List[str], user_id: str) -> str:
+    def collect_batch_hosts(self, host_ids: List[str], user_id: str, quick_refresh: Optional[bool] = None) -> str:
         """
         批量采集主机信息
         
         Args:
             host_ids: 主机信息ID列表
             user_id: 用户ID
+            quick_refresh: Linux 主机是否快速刷新，为 None 时使用 ANSIBLE_QUICK_REFRESH 配置
             
         Returns:
             采集任务ID
+            
+        Raises:
+            QueueFullError: 待采集的主机数超过 COLLECTION_QUEUE_MAX_DEPTH
         """
         from flask import current_app
+        if quick_refresh is None:
+            quick_refresh = current_app.config.get('ANSIBLE_QUICK_REFRESH', False)
         
+        # 按主机数占用采集队列位置，队列已满时在创建任务记录前拒绝
+        backpressure.acquire('collection', len(host_ids))
+        reserved = True
         try:
             # 创建采集任务
             task = CollectionTask(
@@ -581,19 +628,55 @@ class CollectorManager:
             if not app:
                 raise RuntimeError("Cannot get Flask application instance")
             
+            # 写入持久化队列，进程退出后由其他进程重新领取执行
+            queue_item_id = task_queue.enqueue('collection', task_id, {
+                'host_ids': host_ids,
+                'user_id': user_id,
+                'quick_refresh': quick_refresh
+            })
+            
+            # 队列位置交给批量采集线程释放
+            reserved = False
+            self._start_batch_thread(app, task_id, host_ids, queue_item_id, quick_refresh)
+            return task_id
+            
+        except Exception as e:
+            if reserved:
+                backpressure.release('collection', len(host_ids))
+            logger.error(f"Error creating batch collection task: {str(e)}")
+            raise
+    
+    def _start_batch_thread(self, app, task_id: str, host_ids: List[str], queue_item_id: Optional[str] = None,
+                            quick_refresh: bool = False):
+        """在后台线程中执行批量采集，调用方已按主机数占用采集队列位置"""
+        # 尚未释放的队列位置，每台主机采集结束释放一个，任务结束时释放剩余部分
+        reservation = {'remaining': len(host_ids)}
+        stats = BatchStats(len(host_ids), self.max_concurrent, self.timeout)
+        try:
             # 记录任务信息
             with self._task_lock:
                 self._running_tasks[task_id] = {
-                    'threads': [],
                     'host_ids': host_ids.copy(),
-                    'cancelled': False,
+                    'token': CancellationToken(),
+                    'reservation': reservation,
+                    'stats': stats,
+                    'quick_refresh': quick_refresh,
                     'app': app
                 }
+            task_registry.register('collection', task_id, status='running', total_hosts=len(host_ids),
+                                   success_count=0, failed_count=0)
             
             # 包装执行函数，确保应用上下文正确传递，并传递app实例
             def execute_with_context():
                 with app.app_context():
-                    self._execute_batch_collection(task_id, host_ids, app)
+                    try:
+                        self._execute_batch_collection(task_id, host_ids, app)
+                    finally:
+                        task_registry.unregister('collection', task_id)
+                        self._release_hosts(reservation, len(host_ids))
+                        self._remember_stats(task_id, stats)
+                        if queue_item_id:
+                            self._ack_queue_item(task_id, queue_item_id)
             
             # 在后台线程中执行采集
             thread = threading.Thread(
@@ -607,12 +690,104 @@ class CollectorManager:
                 if task_id in self._running_tasks:
                     self._running_tasks[task_id]['main_thread'] = thread
             
-            return task_id
-            
         except Exception as e:
-            logger.error(f"Error creating batch collection task: {str(e)}")
+            logger.error(f"Error starting batch collection task {task_id}: {str(e)}")
+            self._release_hosts(reservation, len(host_ids))
+            if queue_item_id:
+                task_queue.fail(queue_item_id, str(e))
             raise
     
+    def _remember_stats(self, task_id: str, stats: BatchStats):
+        """保存已结束批量任务的统计，只保留最近的若干条"""
+        stats.finish()
+        with self._task_lock:
+            self._finished_stats[task_id] = stats.to_dict()
+            while len(self._finished_stats) > self._finished_stats_limit:
+                self._finished_stats.popitem(last=False)
+    
+    def get_batch_stats(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取批量采集任务的吞吐量和耗时统计，任务在其他进程执行时从任务注册表读取"""
+        with self._task_lock:
+            task_info = self._running_tasks.get(task_id)
+            if task_info:
+                return task_info['stats'].to_dict()
+            if task_id in self._finished_stats:
+                return self._finished_stats[task_id]
+        record = task_registry.get('collection', task_id)
+        return record.get('stats') if record else None
+    
+    def _release_hosts(self, reservation: Dict[str, int], count: int = 1):
+        """释放批量采集占用的队列位置，不超过剩余数量"""
+        with self._task_lock:
+            count = min(count, reservation['remaining'])
+            reservation['remaining'] -= count
+        backpressure.release('collection', count)
+    
+    def _ack_queue_item(self, task_id: str, queue_item_id: str):
+        """根据批量采集任务的最终状态确认队列项，失败时按退避策略重新排队"""
+        try:
+            db.session.rollback()
+            task = CollectionTask.query.get(task_id)
+            if not task or task.status == 'completed':
+                task_queue.complete(queue_item_id)
+            elif task.status == 'cancelled':
+                task_queue.cancel(task_id)
+            elif task_queue.fail(queue_item_id, f"Collection task ended with status {task.status}"):
+                task.status = 'pending'
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error acknowledging queue item for collection task {task_id}: {str(e)}")
+    
+    def _cancel_local_task(self, task_id: str):
+        """取消本进程执行的批量采集任务，由任务注册表转发的取消请求调用"""
+        with self._task_lock:
+            task_info = self._running_tasks.get(task_id)
+        if task_info:
+            task_info['token'].cancel('Collection task cancelled')
+            logger.info(f"Collection task {task_id} cancelled by remote request")
+    
+    def _handle_orphaned_collection(self, task_id: str, record: Dict[str, Any]):
+        """处理所属进程失联的批量采集任务，有未结束队列项时交给持久化队列重新执行"""
+        active = TaskQueueItem.query.filter(
+            TaskQueueItem.ref_id == task_id,
+            TaskQueueItem.status.in_(['queued', 'leased'])
+        ).count()
+        if active:
+            logger.info(f"Orphaned collection task {task_id} will be resumed by the durable queue")
+            return
+        task = CollectionTask.query.get(task_id)
+        if task and task.status in ('pending', 'running'):
+            task.status = 'failed'
+            task.end_time = datetime.utcnow()
+            progress = CollectionProgress.query.filter_by(task_id=task_id, host_id=None).first()
+            if progress:
+                progress.status = 'failed'
+                progress.error_message = f"Task owner {record.get('owner')} stopped heartbeating"
+                progress.updated_at = datetime.utcnow()
+            db.session.commit()
+            logger.warning(f"Orphaned collection task {task_id} marked as failed")
+    
+    def _resume_batch_collection(self, queue_item_id: str, task_id: str, payload: Dict[str, Any], attempt: int):
+        """从持久化队列恢复批量采集任务：失败后的重试，或接管退出进程遗留的任务"""
+        task = CollectionTask.query.get(task_id)
+        if not task or task.status in ('completed', 'cancelled'):
+            task_queue.complete(queue_item_id)
+            return
+        
+        host_ids = payload.get('host_ids') or []
+        task.status = 'pending'
+        task.success_count = 0
+        task.failed_count = 0
+        task.end_time = None
+        db.session.commit()
+        
+        # 队列中的任务已被接受过，恢复时不受队列深度限制
+        backpressure.acquire('collection', len(host_ids), force=True)
+        self._start_batch_thread(current_app._get_current_object(), task_id, host_ids, queue_item_id,
+                                 payload.get('quick_refresh', False))
+        logger.info(f"Resumed batch collection task {task_id} from durable queue (attempt {attempt})")
+    
     def _execute_batch_collection(self, task_id: str, host_ids: List[str], app=None):
         """
         执行批量采集
@@ -694,53 +869,16 @@ class CollectorManager:
                 from flask import current_app
                 app = current_app._get_current_object()
             
-            # 限制并发数
-            for i in range(0, len(host_ids), self.max_concurrent):
-                batch = host_ids[i:i + self.max_concurrent]
-                
-                threads = []
-                for host_id in batch:
-                    # 检查任务是否已取消
-                    with self._task_lock:
-                        task_info = self._running_tasks.get(task_id)
-                        if task_info and task_info.get('cancelled', False):
-                            logger.info(f"Task {task_id} cancelled, stopping batch collection")
-                            break
-                    
-                    def collect_with_context(host_id, task_id, app_instance):
-                        # 再次检查是否已取消
-                        with self._task_lock:
-                            task_info = self._running_tasks.get(task_id)
-                            if task_info and task_info.get('cancelled', False):
-                                logger.info(f"Task {task_id} cancelled before starting host {host_id}")
-                                return
-                        
-                        with app_instance.app_context():
-                            self._collect_in_batch(host_id, task_id, app_instance)
-                    
-                    thread = threading.Thread(
-                        target=collect_with_context,
-                        args=(host_id, task_id, app),
-                        daemon=True
-                    )
-                    
-                    thread.start()
-                    threads.append(thread)
-                    
-                    # 记录线程
-                    with self._task_lock:
-                        if task_id in self._running_tasks:
-                            self._running_tasks[task_id]['threads'].append(thread)
-                
-                # 等待批次完成
-                for thread in threads:
-                    thread.join()
+            # 在常驻线程池中以滑动窗口采集所有主机
+            with self._task_lock:
+                task_info = self._running_tasks.get(task_id)
+            self._run_sliding_window(task_id, self._plan_batch_items(host_ids), app, task_info)
             
             # 检查任务是否被取消
             cancelled = False
             with self._task_lock:
                 task_info = self._running_tasks.get(task_id)
-                if task_info and task_info.get('cancelled', False):
+                if task_info and task_info['token'].cancelled:
                     cancelled = True
                     task.status = 'cancelled'
                     if progress:
@@ -784,6 +922,7 @@ class CollectorManager:
                     'success_count': task.success_count,
                     'failed_count': task.failed_count,
                     'total_hosts': task.total_hosts,
+                    'batch_stats': task_info['stats'].to_dict() if task_info else None,
                     'operation': 'batch_collect_completed'
                 }
             )
@@ -800,7 +939,7 @@ class CollectorManager:
                 cancelled = False
                 with self._task_lock:
                     task_info = self._running_tasks.get(task_id)
-                    if task_info and task_info.get('cancelled', False):
+                    if task_info and task_info['token'].cancelled:
                         cancelled = True
                 
                 if task:
@@ -829,6 +968,204 @@ class CollectorManager:
                 if task_id in self._running_tasks:
                     del self._running_tasks[task_id]
     
+    def _plan_batch_items(self, host_ids: List[str]) -> List[Tuple[List[str], Optional[str]]]:
+        """
+        将批量任务的主机划分为执行单元
+        
+        使用 Linux/Windows 凭证的主机按凭证类型分组，每 ANSIBLE_BATCH_SIZE 台合并为一次
+        ansible-runner 调用；Linux 采集引擎为 ssh 时，每 SSH_COLLECTOR_BATCH_SIZE 台合并为
+        一次原生 SSH 并发采集。VMware 主机、VMware 子虚拟机和无法批量的主机逐台采集。
+        
+        Returns:
+            [(主机ID列表, 凭证类型)]，凭证类型为 None 表示逐台采集
+        """
+        from flask import current_app
+        ansible_batch = current_app.config.get('ANSIBLE_BATCH_ENABLED', True)
+        ansible_batch_size = max(current_app.config.get('ANSIBLE_BATCH_SIZE', 50), 1)
+        batch_sizes = {}
+        if self.linux_engine == 'ssh':
+            batch_sizes['linux'] = max(current_app.config.get('SSH_COLLECTOR_BATCH_SIZE', 200), 1)
+        elif ansible_batch:
+            batch_sizes['linux'] = ansible_batch_size
+        if ansible_batch:
+            batch_sizes['windows'] = ansible_batch_size
+        if not batch_sizes:
+            return [([host_id], None) for host_id in host_ids]
+        min_hosts = max(current_app.config.get('ANSIBLE_BATCH_MIN_HOSTS', 2), 1)
+        
+        items = []
+        groups = {credential_type: [] for credential_type in batch_sizes}
+        for host_id in host_ids:
+            host_info = HostInfo.query.get(host_id)
+            credential = None
+            if host_info and not host_info.parent_host_id and host_info.host_type != 'vmware':
+                credential = self._get_credential(host_info)
+            if credential and credential.credential_type in groups:
+                groups[credential.credential_type].append(host_id)
+            else:
+                items.append(([host_id], None))
+        
+        for credential_type, grouped in groups.items():
+            if len(grouped) < min_hosts:
+                items.extend(([host_id], None) for host_id in grouped)
+                continue
+            batch_size = batch_sizes[credential_type]
+            for i in range(0, len(grouped), batch_size):
+                items.append((grouped[i:i + batch_size], credential_type))
+        return items
+    
+    def _run_sliding_window(self, task_id: str, items: List[Tuple[List[str], Optional[str]]], app,
+                            task_info: Dict[str, Any]):
+        """
+        以滑动窗口在常驻线程池中执行采集单元
+        
+        同一任务最多同时执行 max_concurrent 个单元（单台主机或一次批量 ansible 调用），
+        任一单元结束后立即开始下一个，单台主机卡住不会阻塞其他主机。每个单元从开始采集起
+        有独立的截止时间（COLLECTION_TIMEOUT，批量调用按并发轮数放大），
+        超时后取消该单元的令牌，采集器据此终止正在执行的操作。
+        """
+        batch_token = task_info['token']
+        stats = task_info['stats']
+        pending_items = deque(items)
+        in_flight = {}  # {future: (host_ids, item_token, item_state, unlink)}
+        
+        while pending_items or in_flight:
+            # 补满窗口
+            while pending_items and len(in_flight) < self.max_concurrent and not batch_token.cancelled:
+                item_host_ids, credential_type = pending_items.popleft()
+                item_token = CancellationToken()
+                # 任务取消时同时取消所有单元令牌
+                unlink = batch_token.register(
+                    lambda t=item_token: t.cancel(batch_token.reason or 'Collection task cancelled')
+                )
+                item_state = {'deadline': None}
+                future = self._pool.submit(
+                    self._collect_batch_item, item_host_ids, credential_type, task_id, app,
+                    item_token, item_state, task_info
+                )
+                in_flight[future] = (item_host_ids, item_token, item_state, unlink)
+            
+            if batch_token.cancelled and pending_items:
+                logger.info(f"Task {task_id} cancelled, skipping {len(pending_items)} remaining items")
+                pending_items.clear()
+            if not in_flight:
+                break
+            
+            done, _ = wait(list(in_flight), timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                item_host_ids, _, _, unlink = in_flight.pop(future)
+                unlink()
+                if future.exception():
+                    logger.error(f"Error collecting hosts {item_host_ids} in batch {task_id}: {str(future.exception())}")
+            
+            # 检查截止时间
+            now = time.monotonic()
+            for item_host_ids, item_token, item_state, _ in in_flight.values():
+                deadline = item_state['deadline']
+                if deadline and now > deadline and not item_token.cancelled:
+                    logger.warning(f"Hosts {item_host_ids} in task {task_id} exceeded deadline, cancelling")
+                    item_token.cancel(f'采集超时（超过 {item_state["timeout"]} 秒）')
+            
+            if done:
+                task_registry.update('collection', task_id, stats=stats.to_dict())
+    
+    def _collect_batch_item(self, host_ids: List[str], credential_type: Optional[str], task_id: str, app,
+                            token: CancellationToken, item_state: Dict[str, Any], task_info: Dict[str, Any]):
+        """线程池中执行批量任务的一个采集单元"""
+        stats = task_info['stats']
+        try:
+            if token.cancelled:
+                logger.info(f"Task {task_id} cancelled before starting hosts {host_ids}")
+                return
+            
+            # 领取全局采集槽位，任务取消时放弃等待；VMware 主机只占用 vmware 类别的槽位
+            slot_kind = self._slot_kind(host_ids, credential_type, app)
+            with resource_governor.slot(slot_kind, should_abort=lambda: token.cancelled) as acquired:
+                if not acquired:
+                    logger.info(f"Task {task_id} cancelled while waiting to collect hosts {host_ids}")
+                    return
+                # 截止时间从实际开始采集时计算，不包含排队等待槽位的时间
+                started = time.monotonic()
+                timeout = self.timeout
+                if credential_type:
+                    # 批量调用按并发数分轮执行
+                    timeout = self.timeout * math.ceil(len(host_ids) / self._batch_parallelism(credential_type))
+                item_state['timeout'] = timeout
+                item_state['deadline'] = started + timeout if timeout > 0 else None
+                for _ in host_ids:
+                    stats.host_started()
+                try:
+                    # 激活令牌，采集器内部通过 current_token() 响应取消和超时
+                    with token.activate(), app.app_context():
+                        if credential_type:
+                            self._collect_grouped_batch(host_ids, credential_type, task_id, app, timeout,
+                                                        task_info.get('quick_refresh', False))
+                        else:
+                            self._collect_in_batch(host_ids[0], task_id, app)
+                finally:
+                    timed_out = token.cancelled and not task_info['token'].cancelled
+                    for _ in host_ids:
+                        stats.host_finished(time.monotonic() - started, timed_out)
+        finally:
+            self._release_hosts(task_info['reservation'], len(host_ids))
+    
+    def _slot_kind(self, host_ids: List[str], credential_type: Optional[str], app) -> str:
+        """采集单元占用的资源类别：VMware 主机（vCenter 和子虚拟机）为 vmware，其余为 collection"""
+        if credential_type:
+            return 'collection'
+        with app.app_context():
+            host_info = HostInfo.query.get(host_ids[0])
+            return 'vmware' if host_info and host_info.host_type == 'vmware' else 'collection'
+    
+    def _uses_ssh_engine(self, credential_type: str) -> bool:
+        return credential_type == 'linux' and self.linux_engine == 'ssh'
+    
+    def _batch_parallelism(self, credential_type: str) -> int:
+        """批量调用中同时采集的主机数"""
+        if self._uses_ssh_engine(credential_type):
+            return self.ssh_concurrency
+        return max(self.ansible_forks, 1)
+    
+    def _collect_grouped_batch(self, host_ids: List[str], credential_type: str, task_id: str, app, timeout: int,
+                               quick_refresh: bool = False):
+        """
+        一次 ansible-runner 调用（或一次原生 SSH 并发采集）采集多台主机，再逐台保存结果
+        
+        注意：此方法应该在应用上下文中调用
+        """
+        targets = []
+        results = {}
+        for host_id in host_ids:
+            host_info = HostInfo.query.get(host_id)
+            credential = self._get_credential(host_info) if host_info else None
+            if not host_info or not host_info.ip or not credential:
+                results[host_id] = {'success': False, 'error': 'No credential available'}
+                continue
+            targets.append({
+                'id': host_id,
+                'host_ip': host_info.ip.ip_address,
+                'username': decrypt_credential(credential.username) if credential.username else None,
+                'password': decrypt_credential(credential.password) if credential.password else None,
+                'private_key': decrypt_credential(credential.private_key) if credential.private_key else None,
+                'port': 5985 if credential_type == 'windows' else 22
+            })
+        
+        if targets:
+            if self._uses_ssh_engine(credential_type):
+                raw_results = self.ssh_collector.collect_many(targets, concurrency=self.ssh_concurrency)
+            else:
+                raw_results = self.ansible_collector.collect_batch_info(
+                    targets, credential_type, forks=self.ansible_forks, timeout=timeout or None,
+                    quick_refresh=quick_refresh
+                )
+            for host_id, raw in raw_results.items():
+                results[host_id] = self._normalize_result(raw)
+        
+        # 会话在长时间的批量采集期间可能持有过期数据
+        db.session.rollback()
+        for host_id in host_ids:
+            self._collect_in_batch(host_id, task_id, app, prefetched_result=results[host_id])
+    
     def cancel_collection_task(self, task_id: str, user_id: str) -> bool:
         """
         取消采集任务
@@ -860,10 +1197,17 @@ class CollectorManager:
                     logger.warning(f"Cannot cancel task {task_id} with status {task.status}")
                     return False
                 
-                # 标记任务为已取消
+                # 标记任务为已取消，正在执行的采集在检查点退出，ansible 进程被终止
                 with self._task_lock:
-                    if task_id in self._running_tasks:
-                        self._running_tasks[task_id]['cancelled'] = True
+                    task_info = self._running_tasks.get(task_id)
+                if task_info:
+                    task_info['token'].cancel('Collection task cancelled')
+                elif task_registry.request_cancel('collection', task_id):
+                    # 任务在其他进程执行，由所属进程终止采集
+                    logger.info(f"Cancel request for collection task {task_id} forwarded to its owner")
+                
+                # 取消队列项，避免任务被重试或被其他进程接管
+                task_queue.cancel(task_id)
                 
                 # 更新任务状态
                 task.status = 'cancelled'
@@ -944,7 +1288,8 @@ class CollectorManager:
                     db.session.rollback()
             return False
     
-    def _collect_in_batch(self, host_id: str, task_id: str, app=None):
+    def _collect_in_batch(self, host_id: str, task_id: str, app=None,
+                          prefetched_result: Optional[Dict[str, Any]] = None):
         """
         在批次中采集单个主机
         
@@ -952,6 +1297,7 @@ class CollectorManager:
             host_id: 主机ID
             task_id: 任务ID
             app: Flask应用实例（用于传递到回调函数）
+            prefetched_result: 批量 ansible 采集已取得的该主机结果，提供时只保存结果
         
         注意：此方法应该在应用上下文中调用
         """
@@ -959,7 +1305,7 @@ class CollectorManager:
             # 检查任务是否已取消
             with self._task_lock:
                 task_info = self._running_tasks.get(task_id)
-                if task_info and task_info.get('cancelled', False):
+                if task_info and task_info['token'].cancelled:
                     logger.info(f"Task {task_id} cancelled, skipping host {host_id}")
                     # 更新主机状态
                     host_info = HostInfo.query.get(host_id)
@@ -1089,8 +1435,11 @@ class CollectorManager:
                             exc_info=True
                         )
             
+            if prefetched_result is not None:
+                # 已由批量 ansible 采集取得结果，只更新主机信息
+                result = self.collect_single_host(host_id, prefetched_result=prefetched_result)
             # 检查是否是VMware子主机（有parent_host_id）
-            if host_info.parent_host_id:
+            elif host_info.parent_host_id:
                 # 这是VMware子VM，需要从父主机获取凭证并只采集这一台VM
                 # 注意：子VM采集不应该使用progress_callback，因为它是为批量VM采集设计的
                 # 子VM采集应该直接更新进度，而不是通过回调
@@ -1114,7 +1463,8 @@ class CollectorManager:
                         logger.error(f"progress_callback is None for VMware host! host_id={host_id}, task_id={task_id}")
                     result = self._collect_single_host_with_progress(host_id, progress_callback)
                 else:
-                    result = self.collect_single_host(host_id)
+                    quick_refresh = task_info.get('quick_refresh', False) if task_info else False
+                    result = self.collect_single_host(host_id, quick_refresh=quick_refresh)
             
             # 更新任务计数和进度
             task = CollectionTask.query.get(task_id)
@@ -1124,7 +1474,7 @@ class CollectorManager:
             cancelled = False
             with self._task_lock:
                 task_info = self._running_tasks.get(task_id)
-                if task_info and task_info.get('cancelled', False):
+                if task_info and task_info['token'].cancelled:
                     cancelled = True
             
             if cancelled:
@@ -1173,6 +1523,10 @@ class CollectorManager:
                 # 更新主机状态为失败
                 host_info.collection_status = 'failed'
                 error_msg = result.get('error', 'Collection returned no data')
+                # 主机超过截止时间被取消时使用超时原因
+                host_token = current_token()
+                if host_token and host_token.cancelled and host_token.reason:
+                    error_msg = host_token.reason
                 host_info.collection_error = error_msg
                 
                 task.failed_count += 1
@@ -1214,6 +1568,9 @@ class CollectorManager:
                     progress_percent = min(100.0, (total_completed / progress.total_count) * 100)
                     progress.current_step = f'已完成 {total_completed}/{progress.total_count} ({progress_percent:.1f}%)'
             
+            if task:
+                task_registry.update('collection', task_id, success_count=task.success_count,
+                                     failed_count=task.failed_count)
             db.session.commit()
             
         except Exception as e:
@@ -1291,7 +1648,8 @@ class CollectorManager:
         
         return default_credential
     
-    def _execute_collection(self, host_info: HostInfo, credential: Any, custom_port: Optional[int] = None, progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+    def _execute_collection(self, host_info: HostInfo, credential: Any, custom_port: Optional[int] = None, progress_callback: Optional[Callable] = None,
+                            quick_refresh: bool = False) -> Dict[str, Any]:
         """
         执行采集
         
@@ -1300,6 +1658,7 @@ class CollectorManager:
             credential: 凭证对象或字典
             custom_port: 自定义端口号
             progress_callback: 进度回调函数（用于VMware采集）
+            quick_refresh: Linux 快速刷新（仅 Ansible 采集引擎）
             
         Returns:
             采集结果
@@ -1344,14 +1703,24 @@ class CollectorManager:
                     max_workers=max_workers
                 )
             elif credential_type == 'linux':
-                # Linux采集
-                result = self.ansible_collector.collect_linux_info(
-                    host_ip=host_info.ip.ip_address,
-                    username=username,
-                    password=password,
-                    private_key=private_key,
-                    port=custom_port or 22
-                )
+                # Linux采集，LINUX_COLLECTION_ENGINE=ssh 时绕过 Ansible 直接通过 SSH 采集
+                if self.linux_engine == 'ssh':
+                    result = self.ssh_collector.collect_linux_info(
+                        host_ip=host_info.ip.ip_address,
+                        username=username,
+                        password=password,
+                        private_key=private_key,
+                        port=custom_port or 22
+                    )
+                else:
+                    result = self.ansible_collector.collect_linux_info(
+                        host_ip=host_info.ip.ip_address,
+                        username=username,
+                        password=password,
+                        private_key=private_key,
+                        port=custom_port or 22,
+                        quick_refresh=quick_refresh
+                    )
             elif credential_type == 'windows':
                 # Windows采集
                 result = self.ansible_collector.collect_windows_info(
@@ -1363,26 +1732,31 @@ class CollectorManager:
             else:
                 return {'success': False, 'error': 'Unsupported credential type'}
             
-            # 检查返回结果格式
-            if isinstance(result, dict):
-                # 如果结果已经是标准格式（包含 success 字段），直接返回
-                if 'success' in result:
-                    if result.get('success'):
-                        return {'success': True, 'data': result.get('data', result)}
-                    else:
-                        # 失败情况，返回错误信息
-                        return {'success': False, 'error': result.get('error', 'Collection failed')}
-                # 如果结果是非空字典但没有 success 字段，认为是成功的数据
-                elif result:
-                    return {'success': True, 'data': result}
-            
-            # 空结果或非字典类型
-            return {'success': False, 'error': 'Collection returned no data'}
+            return self._normalize_result(result)
                 
         except Exception as e:
             logger.error(f"Error executing collection: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def _normalize_result(result: Any) -> Dict[str, Any]:
+        """将采集器返回值转换为 {'success': bool, 'data'/'error': ...} 格式"""
+        # 检查返回结果格式
+        if isinstance(result, dict):
+            # 如果结果已经是标准格式（包含 success 字段），直接返回
+            if 'success' in result:
+                if result.get('success'):
+                    return {'success': True, 'data': result.get('data', result)}
+                else:
+                    # 失败情况，返回错误信息
+                    return {'success': False, 'error': result.get('error', 'Collection failed')}
+            # 如果结果是非空字典但没有 success 字段，认为是成功的数据
+            elif result:
+                return {'success': True, 'data': result}
+        
+        # 空结果或非字典类型
+        return {'success': False, 'error': 'Collection returned no data'}
+    
     def _update_host_info(self, host_info: HostInfo, data: Dict[str, Any]):
         """
         更新主机信息
@@ -1455,6 +1829,8 @@ class CollectorManager:
             # VMware信息单独处理
             if 'vmware_info' in data:
                 host_info.vmware_info = data['vmware_info']
+                if isinstance(data['vmware_info'], dict):
+                    host_info.vm_uuid = data['vmware_info'].get('vm_uuid') or host_info.vm_uuid
             
             # 保存原始数据
             host_info.raw_data = data
@@ -1544,131 +1920,225 @@ class CollectorManager:
             logger.warning(f"Error calculating total disk size: {str(e)}")
             return None
     
-    def _create_vm_child_records(self, parent_host: HostInfo, vm_list: List[Dict[str, Any]]):
+    # 子主机批量写入时，采集值为空则保留原值的列（与 _update_host_info 的合并规则一致）
+    VM_CHILD_MERGED_COLUMNS = (
+        'hostname', 'os_name', 'os_version', 'kernel_version', 'cpu_model', 'cpu_cores', 'memory_total',
+        'memory_free_mb', 'os_bit', 'boot_method', 'disk_info', 'disk_count', 'disk_total_gb',
+        'network_interfaces', 'network_count'
+    )
+    # 子主机批量写入时总是覆盖的列
+    VM_CHILD_REPLACED_COLUMNS = (
+        'ip_id', 'host_type', 'vmware_info', 'raw_data', 'collection_status', 'collection_error',
+        'last_collected_at', 'updated_at', 'deleted'
+    )
+    
+    # 子主机批量写入依赖的唯一键；db.create_all 不会为已存在的 host_infos 表添加
+    VM_CHILD_UNIQUE_COLUMNS = ('parent_host_id', 'vm_uuid')
+    VM_CHILD_COLUMN_DDL = "ADD COLUMN vm_uuid VARCHAR(64) NULL, ADD INDEX ix_host_infos_vm_uuid (vm_uuid)"
+    VM_CHILD_UNIQUE_DDL = "ADD UNIQUE KEY unique_parent_vm_uuid (parent_host_id, vm_uuid)"
+    _vm_child_schema_ok = False
+    
+    def check_vm_child_schema(self) -> Optional[str]:
+        """
+        检查 host_infos 表是否已有 vm_uuid 列和 (parent_host_id, vm_uuid) 唯一键
+        
+        Returns:
+            缺失时返回错误信息，否则返回 None
         """
-        为VMware采集结果创建子主机记录（批量优化版本）
+        if self._vm_child_schema_ok:
+            return None
+        inspector = inspect(db.engine)
+        table = HostInfo.__tablename__
+        if 'vm_uuid' not in {column['name'] for column in inspector.get_columns(table)}:
+            missing = 'vm_uuid 列'
+            ddl = f"{self.VM_CHILD_COLUMN_DDL}, {self.VM_CHILD_UNIQUE_DDL}"
+        else:
+            unique_keys = [tuple(item['column_names']) for item in inspector.get_unique_constraints(table)]
+            unique_keys += [tuple(item['column_names']) for item in inspector.get_indexes(table) if item.get('unique')]
+            if self.VM_CHILD_UNIQUE_COLUMNS in unique_keys:
+                CollectorManager._vm_child_schema_ok = True
+                return None
+            missing = '(parent_host_id, vm_uuid) 唯一键'
+            ddl = self.VM_CHILD_UNIQUE_DDL
+        return f"host_infos 表缺少{missing}，VMware子主机无法按 vm_uuid 写入，请执行: ALTER TABLE {table} {ddl}"
+    
+    def _apply_vm_results(self, parent_host: HostInfo, collection_data: Dict[str, Any]) -> int:
+        """
+        根据VMware批量采集结果维护子主机记录
+        
+        增量采集时 vms 只包含变化的虚拟机，removed_vm_uuids 为已在 vCenter 中删除的虚拟机；
+        完整采集且没有被取消、没有虚拟机采集失败时，vms 即 vCenter 的完整清单。
+        
+        Returns:
+            本次采集返回的VM数量
+        """
+        if not isinstance(collection_data, dict) or 'vms' not in collection_data:
+            return 0
+        vm_list = collection_data['vms']
+        full_inventory = not (collection_data.get('incremental') or collection_data.get('cancelled')
+                              or collection_data.get('failed'))
+        self._reconcile_vm_child_records(
+            parent_host, vm_list,
+            removed_vm_uuids=collection_data.get('removed_vm_uuids') or [],
+            full_inventory=full_inventory
+        )
+        return len(vm_list)
+    
+    def _reconcile_vm_child_records(self, parent_host: HostInfo, vm_list: List[Dict[str, Any]],
+                                    removed_vm_uuids: Optional[List[str]] = None, full_inventory: bool = False):
+        """
+        按 (parent_host_id, vm_uuid) 批量写入VMware子主机记录
+        
+        新虚拟机插入、已有虚拟机（包括之前被软删除的）更新，每 VMWARE_CHILD_UPSERT_BATCH_SIZE 台一条
+        INSERT ... ON DUPLICATE KEY UPDATE；removed_vm_uuids 中的虚拟机，以及 full_inventory 为 True 时
+        本次清单中没有的虚拟机被软删除。所有语句在同一个事务中提交。
+        表中缺少唯一键时 ON DUPLICATE KEY UPDATE 不会命中，每次采集都会重复插入，因此直接报错。
         
         Args:
             parent_host: 父主机（vCenter）
             vm_list: 虚拟机列表
+            removed_vm_uuids: 已在 vCenter 中删除的虚拟机UUID
+            full_inventory: vm_list 是否为完整清单
         """
+        batch_size = max(current_app.config.get('VMWARE_CHILD_UPSERT_BATCH_SIZE', 500), 1) if current_app else 500
+        now = datetime.utcnow()
+        rows = {}
+        skipped_count = 0
+        for vm_info in vm_list:
+            vmware_info = vm_info.get('vmware_info', {})
+            vm_uuid = vmware_info.get('vm_uuid')
+            vm_name = vmware_info.get('vm_name') or vm_info.get('hostname') or 'Unknown'
+            if not vm_uuid:
+                skipped_count += 1
+                logger.warning(
+                    f"VM信息缺少vm_uuid，已跳过: VM名称={vm_name}",
+                    extra={
+                        'parent_host_id': parent_host.id,
+                        'vm_name': vm_name,
+                        'vm_info_keys': list(vm_info.keys()),
+                        'operation': 'vm_uuid_missing'
+                    }
+                )
+                continue
+            rows[vm_uuid] = self._vm_child_row(parent_host, vm_info, now)
+        
+        removed = set(removed_vm_uuids or []) - set(rows)
+        removed_count = 0
         try:
-            if not vm_list:
-                logger.warning(f"No VM list provided for parent host {parent_host.id}")
-                return
-            
-            # 一次性查询所有现有子记录，避免N+1查询问题
-            existing_children = HostInfo.query.filter_by(
-                parent_host_id=parent_host.id,
-                deleted=False
-            ).all()
-            
-            # 构建UUID到子主机的映射，提高查找效率
-            uuid_to_child_map = {}
-            for child in existing_children:
-                if child.vmware_info and isinstance(child.vmware_info, dict):
-                    vm_uuid = child.vmware_info.get('vm_uuid')
-                    if vm_uuid:
-                        uuid_to_child_map[vm_uuid] = child
-            
-            # 分离需要创建和更新的记录
-            new_children = []
-            update_children = []
-            skipped_count = 0
-            
-            for vm_info in vm_list:
-                vmware_info = vm_info.get('vmware_info', {})
-                vm_uuid = vmware_info.get('vm_uuid')
-                vm_name = vmware_info.get('vm_name') or vm_info.get('hostname') or 'Unknown'
-                if not vm_uuid:
-                    skipped_count += 1
-                    logger.warning(
-                        f"VM信息缺少vm_uuid，已跳过: VM名称={vm_name}",
-                        extra={
-                            'parent_host_id': parent_host.id,
-                            'vm_name': vm_name,
-                            'vm_info_keys': list(vm_info.keys()),
-                            'operation': 'vm_uuid_missing'
-                        }
-                    )
-                    continue
-                
-                if vm_uuid in uuid_to_child_map:
-                    # 已存在，准备更新
-                    existing_child = uuid_to_child_map[vm_uuid]
-                    update_children.append((existing_child, vm_info))
-                else:
-                    # 新记录，准备创建
-                    child_host = HostInfo(
-                        ip_id=parent_host.ip_id,  # 子主机共享父主机的IP
-                        parent_host_id=parent_host.id,
-                        host_type='vmware',  # 子主机也是VMware类型
-                        collection_status='success',
-                        last_collected_at=datetime.utcnow()
-                    )
-                    # 先更新基本信息，使计算字段能正确计算
-                    self._update_host_info(child_host, vm_info)
-                    new_children.append(child_host)
-            
-            # 批量插入新记录
-            if new_children:
-                try:
-                    db.session.bulk_save_objects(new_children, return_defaults=True)
-                    db.session.flush()  # 刷新以获取ID
-                    logger.info(
-                        f"Bulk created {len(new_children)} VM child records",
-                        extra={
-                            'parent_host_id': parent_host.id,
-                            'new_count': len(new_children),
-                            'operation': 'bulk_create_vm_children'
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Error bulk inserting VM child records: {str(e)}")
-                    db.session.rollback()
-                    raise
-            
-            # 批量更新已有记录
-            for existing_child, vm_info in update_children:
-                try:
-                    self._update_host_info(existing_child, vm_info)
-                except Exception as e:
-                    logger.error(
-                        f"Error updating VM child record {existing_child.id}: {str(e)}",
-                        extra={
-                            'child_host_id': existing_child.id,
-                            'vm_uuid': vm_info.get('vmware_info', {}).get('vm_uuid'),
-                            'operation': 'update_vm_child'
-                        }
-                    )
+            schema_error = self.check_vm_child_schema()
+            if schema_error:
+                raise RuntimeError(schema_error)
+            
+            self._backfill_vm_uuids(parent_host)
+            
+            table = HostInfo.__table__
+            row_list = list(rows.values())
+            for start in range(0, len(row_list), batch_size):
+                stmt = mysql_insert(table).values(row_list[start:start + batch_size])
+                updates = {column: func.coalesce(stmt.inserted[column], table.c[column])
+                           for column in self.VM_CHILD_MERGED_COLUMNS}
+                updates.update({column: stmt.inserted[column] for column in self.VM_CHILD_REPLACED_COLUMNS})
+                db.session.execute(stmt.on_duplicate_key_update(updates))
+            
+            children = HostInfo.query.filter(
+                HostInfo.parent_host_id == parent_host.id,
+                HostInfo.deleted == False,
+                HostInfo.vm_uuid.isnot(None)
+            )
+            if full_inventory:
+                # 按本次清单中的 vm_uuid 判断，不依赖可能被单台刷新同时写入的 last_collected_at
+                missing_ids = [
+                    child_id for child_id, vm_uuid in children.with_entities(HostInfo.id, HostInfo.vm_uuid)
+                    if vm_uuid not in rows
+                ]
+                for start in range(0, len(missing_ids), batch_size):
+                    removed_count += HostInfo.query.filter(
+                        HostInfo.id.in_(missing_ids[start:start + batch_size])
+                    ).update({'deleted': True, 'updated_at': now}, synchronize_session=False)
+            elif removed:
+                removed_list = list(removed)
+                for start in range(0, len(removed_list), batch_size):
+                    removed_count += children.filter(
+                        HostInfo.vm_uuid.in_(removed_list[start:start + batch_size])
+                    ).update({'deleted': True, 'updated_at': now}, synchronize_session=False)
             
-                        # 提交所有更改
             db.session.commit()
-            
-            logger.info(
-                f"VM child records processed: {len(new_children)} created, {len(update_children)} updated, {skipped_count} skipped",
-                extra={
-                    'parent_host_id': parent_host.id,
-                    'created_count': len(new_children),
-                    'updated_count': len(update_children),
-                    'skipped_count': skipped_count,
-                    'total_vms': len(vm_list),
-                    'operation': 'create_vm_child_records'
-                }
-            )
-                
         except Exception as e:
             db.session.rollback()
             logger.error(
-                f"Error creating VM child records: {str(e)}",
+                f"Error reconciling VM child records: {str(e)}",
                 extra={
                     'parent_host_id': parent_host.id,
                     'vm_count': len(vm_list) if vm_list else 0,
                     'error': str(e),
-                    'operation': 'create_vm_child_records'
+                    'operation': 'reconcile_vm_child_records'
                 }
             )
             raise
+        
+        logger.info(
+            f"VM child records reconciled: {len(rows)} upserted, {removed_count} removed, {skipped_count} skipped",
+            extra={
+                'parent_host_id': parent_host.id,
+                'upserted_count': len(rows),
+                'removed_count': removed_count,
+                'skipped_count': skipped_count,
+                'total_vms': len(vm_list),
+                'full_inventory': full_inventory,
+                'operation': 'reconcile_vm_child_records'
+            }
+        )
+    
+    def _vm_child_row(self, parent_host: HostInfo, vm_info: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """生成一台虚拟机的子主机记录列值，计算字段与 _update_host_info 一致"""
+        child_host = HostInfo()
+        self._update_host_info(child_host, vm_info)
+        row = {
+            'id': str(uuid.uuid4()),
+            'ip_id': parent_host.ip_id,  # 子主机共享父主机的IP
+            'parent_host_id': parent_host.id,
+            'host_type': 'vmware',  # 子主机也是VMware类型
+            'vm_uuid': vm_info['vmware_info']['vm_uuid'],
+            'vmware_info': child_host.vmware_info,
+            'raw_data': child_host.raw_data,
+            'collection_status': 'success',
+            'collection_error': None,
+            'last_collected_at': now,
+            'created_at': now,
+            'updated_at': now,
+            'deleted': False
+        }
+        for column in self.VM_CHILD_MERGED_COLUMNS:
+            value = getattr(child_host, column)
+            # 空值写为 SQL NULL（JSON 列的 None 默认写为 JSON null），使 COALESCE 保留原值
+            row[column] = null() if value is None else value
+        return row
+    
+    def _backfill_vm_uuids(self, parent_host: HostInfo):
+        """为 vm_uuid 列加入之前创建的子主机填写 vm_uuid，重复的虚拟机只保留一条"""
+        legacy_children = HostInfo.query.filter(
+            HostInfo.parent_host_id == parent_host.id,
+            HostInfo.vm_uuid.is_(None)
+        ).order_by(HostInfo.deleted, HostInfo.updated_at.desc()).all()
+        if not legacy_children:
+            return
+        
+        taken = {
+            vm_uuid for (vm_uuid,) in db.session.query(HostInfo.vm_uuid).filter(
+                HostInfo.parent_host_id == parent_host.id,
+                HostInfo.vm_uuid.isnot(None)
+            )
+        }
+        for child in legacy_children:
+            vm_uuid = child.vmware_info.get('vm_uuid') if isinstance(child.vmware_info, dict) else None
+            if not vm_uuid:
+                continue
+            if vm_uuid in taken:
+                child.deleted = True
+            else:
+                child.vm_uuid = vm_uuid
+                taken.add(vm_uuid)
+        db.session.flush()
 
 
 # 创建全局实例
@@ -0,0 +1,326 @@
+"""
+原生 SSH 主机信息采集器
+不经过 Ansible，通过 asyncssh 在一个 SSH 会话中执行一段组合脚本采集 Linux 主机信息，
+多台主机在同一个事件循环中并发采集
+"""
+import asyncio
+import re
+from typing import Dict, Any, List, Optional
+from flask import current_app
+from app.core.utils.logger import app_logger as logger
+from app.tasks.cancellation import current_token
+
+# 组合采集脚本，每段输出以 @@<段名> 开头，通过 sh -s 从标准输入执行
+COLLECT_SCRIPT = r"""
+echo "@@hostname"; hostname 2>/dev/null || cat /proc/sys/kernel/hostname
+echo "@@os_release"; cat /etc/os-release 2>/dev/null
+echo "@@kernel"; uname -r
+echo "@@arch"; uname -m
+echo "@@cpu_model"
+lscpu 2>/dev/null | awk -F: '/^Model name/ {print $2; exit}'
+grep -m1 '^model name' /proc/cpuinfo 2>/dev/null | cut -d: -f2
+echo "@@cpu_cores"; nproc 2>/dev/null || grep -c '^processor' /proc/cpuinfo
+echo "@@meminfo"; grep -E '^(MemTotal|MemAvailable|MemFree):' /proc/meminfo
+echo "@@boot"; if [ -d /sys/firmware/efi ]; then echo UEFI; else echo BIOS; fi
+echo "@@df"; df -hP 2>/dev/null
+echo "@@interfaces"
+for path in /sys/class/net/*; do
+  name=${path##*/}
+  [ "$name" = "lo" ] && continue
+  printf '%s|%s|%s|%s|%s\n' "$name" \
+    "$(cat "$path/address" 2>/dev/null)" \
+    "$(cat "$path/operstate" 2>/dev/null || echo unknown)" \
+    "$(cat "$path/speed" 2>/dev/null || echo 0)" \
+    "$(cat "$path/mtu" 2>/dev/null || echo 1500)"
+done
+echo "@@ipv4"; ip -o -4 addr show 2>/dev/null
+echo "@@ipv6"; ip -o -6 addr show 2>/dev/null
+echo "@@routes"; ip route 2>/dev/null
+"""
+
+# /etc/os-release 的 ID 与 ansible_distribution 的对应关系
+DISTRIBUTION_NAMES = {
+    'ubuntu': 'Ubuntu',
+    'debian': 'Debian',
+    'centos': 'CentOS',
+    'rhel': 'RedHat',
+    'fedora': 'Fedora',
+    'rocky': 'Rocky',
+    'almalinux': 'AlmaLinux',
+    'ol': 'OracleLinux',
+    'amzn': 'Amazon',
+    'sles': 'SLES',
+    'opensuse-leap': 'openSUSE Leap',
+    'kylin': 'Kylin',
+    'openEuler': 'openEuler',
+    'anolis': 'Anolis'
+}
+
+
+def _split_sections(output: str) -> Dict[str, List[str]]:
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith('@@'):
+            current = line[2:].strip()
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    return sections
+
+
+def _first(lines: List[str], default: str = '') -> str:
+    for line in lines:
+        if line.strip():
+            return line.strip()
+    return default
+
+
+def _parse_os_release(lines: List[str]) -> Dict[str, str]:
+    values = {}
+    for line in lines:
+        if '=' in line:
+            key, value = line.split('=', 1)
+            values[key.strip()] = value.strip().strip('"\'')
+    return values
+
+
+def _parse_addresses(lines: List[str], family: str) -> Dict[str, str]:
+    """解析 ip -o addr show 输出，返回每个网卡的第一个地址（带前缀长度）"""
+    addresses = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 4 and parts[2] == family:
+            addresses.setdefault(parts[1].split('@')[0], parts[3])
+    return addresses
+
+
+def parse_collect_output(output: str) -> Dict[str, Any]:
+    """
+    解析组合采集脚本的输出
+
+    Returns:
+        与 AnsibleCollector._parse_linux_result 相同结构的主机信息，输出无效时为空字典
+    """
+    sections = _split_sections(output)
+    if 'hostname' not in sections:
+        return {}
+
+    os_release = _parse_os_release(sections.get('os_release', []))
+    distribution_id = os_release.get('ID', '')
+    arch = _first(sections.get('arch', []), 'Unknown')
+    if arch == 'x86_64':
+        os_bit = '64-bit'
+    elif arch in ('i386', 'i686'):
+        os_bit = '32-bit'
+    else:
+        os_bit = arch
+
+    meminfo = {}
+    for line in sections.get('meminfo', []):
+        match = re.match(r'^(\w+):\s+(\d+)', line)
+        if match:
+            meminfo[match.group(1)] = int(match.group(2)) // 1024
+    cpu_cores = _first(sections.get('cpu_cores', []), '0')
+
+    disk_info = []
+    for line in sections.get('df', [])[1:]:
+        if not line.strip() or not line.startswith('/dev/'):
+            continue
+        parts = line.split()
+        if len(parts) >= 6:
+            disk_info.append({
+                'device': parts[0],
+                'size': parts[1],
+                'used': parts[2],
+                'avail': parts[3],
+                'use_percent': parts[4],
+                'mount': parts[5],
+                'fstype': parts[6] if len(parts) > 6 else ''
+            })
+
+    ipv4 = _parse_addresses(sections.get('ipv4', []), 'inet')
+    ipv6 = _parse_addresses(sections.get('ipv6', []), 'inet6')
+    routes = sections.get('routes', [])
+    network_interfaces = []
+    for line in sections.get('interfaces', []):
+        parts = line.split('|')
+        if len(parts) != 5:
+            continue
+        name, mac, state, speed, mtu = parts
+        gateway = ''
+        for route in routes:
+            if 'default' in route and name in route:
+                route_parts = route.split()
+                gateway = route_parts[2] if len(route_parts) > 2 else ''
+                break
+        network_interfaces.append({
+            'name': name,
+            'mac_address': mac,
+            'state': state,
+            'speed': speed,
+            'mtu': mtu,
+            'ipv4': ipv4.get(name, ''),
+            'ipv6': ipv6.get(name, ''),
+            'gateway': gateway
+        })
+
+    return {
+        'hostname': _first(sections['hostname']).split('.')[0],
+        'os_name': DISTRIBUTION_NAMES.get(distribution_id, os_release.get('NAME', 'Unknown')),
+        'os_version': os_release.get('VERSION_ID', ''),
+        'kernel_version': _first(sections.get('kernel', [])),
+        'cpu_model': _first(sections.get('cpu_model', []), 'Unknown'),
+        'cpu_cores': int(cpu_cores) if cpu_cores.isdigit() else 0,
+        'memory_total': meminfo.get('MemTotal', 0),
+        'memory_free_mb': meminfo.get('MemAvailable', meminfo.get('MemFree', 0)),
+        'os_bit': os_bit,
+        'boot_method': _first(sections.get('boot', []), 'Unknown'),
+        'disk_info': disk_info,
+        'network_interfaces': network_interfaces
+    }
+
+
+class NativeSSHCollector:
+    """原生 SSH 主机信息采集器（仅 Linux）"""
+
+    def __init__(self):
+        self.connect_timeout = 10
+        self.command_timeout = 60
+        self.concurrency = 200
+
+    def _load_config(self):
+        if current_app:
+            self.connect_timeout = current_app.config.get('SSH_COLLECTOR_CONNECT_TIMEOUT', 10)
+            self.command_timeout = current_app.config.get('SSH_COLLECTOR_COMMAND_TIMEOUT', 60)
+            self.concurrency = max(current_app.config.get('SSH_COLLECTOR_CONCURRENCY', 200), 1)
+
+    def collect_linux_info(self, host_ip: str, username: str, password: Optional[str] = None,
+                           private_key: Optional[str] = None, port: int = 22) -> Dict[str, Any]:
+        """
+        采集Linux主机信息，参数和返回值与 AnsibleCollector.collect_linux_info 相同
+
+        Args:
+            host_ip: 主机IP地址
+            username: 用户名
+            password: 密码（可选）
+            private_key: SSH私钥（可选）
+            port: SSH端口号
+
+        Returns:
+            采集的主机信息字典，失败时为 {'success': False, 'error': ...}
+        """
+        target = {
+            'id': host_ip,
+            'host_ip': host_ip,
+            'username': username,
+            'password': password,
+            'private_key': private_key,
+            'port': port
+        }
+        return self.collect_many([target])[host_ip]
+
+    def collect_many(self, targets: List[Dict[str, Any]], concurrency: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        在一个事件循环中并发采集多台Linux主机
+
+        Args:
+            targets: 主机列表，每项包含 id, host_ip, username, password, private_key, port
+            concurrency: 同时建立的 SSH 连接数，默认 SSH_COLLECTOR_CONCURRENCY
+
+        Returns:
+            {id: 结果}，结果格式与 collect_linux_info 相同
+        """
+        if not targets:
+            return {}
+        self._load_config()
+        try:
+            import asyncssh  # noqa: F401
+        except ImportError:
+            return {target['id']: {'success': False, 'error': 'asyncssh library not installed'} for target in targets}
+
+        logger.info(
+            f"Native SSH collection started for {len(targets)} hosts",
+            extra={
+                'host_count': len(targets),
+                'operation': 'ssh_collect'
+            }
+        )
+        results = asyncio.run(self._collect_all(targets, concurrency or self.concurrency, current_token()))
+        failed = sum(1 for result in results.values() if result.get('success') is False)
+        logger.info(
+            f"Native SSH collection completed: {len(targets) - failed} succeeded, {failed} failed",
+            extra={
+                'host_count': len(targets),
+                'failed_count': failed,
+                'operation': 'ssh_collect'
+            }
+        )
+        return results
+
+    async def _collect_all(self, targets: List[Dict[str, Any]], concurrency: int, token) -> Dict[str, Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [asyncio.ensure_future(self._collect_one(target, semaphore)) for target in targets]
+
+        def cancel_all():
+            for task in tasks:
+                task.cancel()
+
+        # 任务取消或超时时取消所有未完成的连接
+        unregister = token.register(lambda: loop.call_soon_threadsafe(cancel_all)) if token else None
+        try:
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if unregister:
+                unregister()
+
+        results = {}
+        for target, outcome in zip(targets, outcomes):
+            if isinstance(outcome, asyncio.CancelledError):
+                reason = token.reason if token and token.reason else '任务已取消'
+                results[target['id']] = {'success': False, 'error': reason}
+            elif isinstance(outcome, BaseException):
+                results[target['id']] = {'success': False, 'error': f"[{target['host_ip']}] {str(outcome)}"}
+            else:
+                results[target['id']] = outcome
+        return results
+
+    async def _collect_one(self, target: Dict[str, Any], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """在一个 SSH 会话中执行采集脚本并解析结果"""
+        import asyncssh
+
+        host_ip = target['host_ip']
+        options = {
+            'host': host_ip,
+            'port': target.get('port') or 22,
+            'username': target['username'],
+            'known_hosts': None,  # 与 Ansible 采集一致，不校验主机密钥
+            'connect_timeout': self.connect_timeout
+        }
+        if target.get('private_key'):
+            options['client_keys'] = [asyncssh.import_private_key(target['private_key'])]
+        else:
+            options['client_keys'] = None
+        if target.get('password'):
+            options['password'] = target['password']
+
+        async with semaphore:
+            try:
+                async with asyncssh.connect(**options) as conn:
+                    result = await asyncio.wait_for(
+                        conn.run('sh -s', input=COLLECT_SCRIPT, check=False),
+                        timeout=self.command_timeout
+                    )
+            except asyncssh.PermissionDenied:
+                return {'success': False, 'error': f"[{host_ip}] SSH认证失败: Permission denied"}
+            except asyncio.TimeoutError:
+                return {'success': False, 'error': f"[{host_ip}] 采集超时"}
+            except (OSError, asyncssh.Error) as e:
+                return {'success': False, 'error': f"[{host_ip}] 主机不可达: {str(e)}"}
+
+        host_info = parse_collect_output(result.stdout or '')
+        if not host_info:
+            error_msg = (result.stderr or '').strip() or 'Failed to parse collection result or no data collected'
+            return {'success': False, 'error': f"[{host_ip}] {error_msg}"}
+        return host_info
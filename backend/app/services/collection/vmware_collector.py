@@ -2,24 +2,89 @@
 VMware 主机信息采集器
 使用 pyvmomi 库连接 VMware vCenter/ESXi 并采集虚拟机信息
 """
-from typing import Dict, Any, Optional, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+
+from typing import Dict, Any, Optional, Callable, Iterator, List, Tuple
 from flask import current_app
 from app.core.utils.logger import app_logger as logger
 from app.core.security.encryption import decrypt_credential
+from app.tasks.resource_governor import resource_governor
+from app.tasks.cancellation import current_token, OperationCancelled
+from .vmware_session_pool import vcenter_session_pool
+
+# 采集一台虚拟机需要的属性路径，批量采集时由 PropertyCollector 一次返回
+VM_PROPERTIES = [
+    'name',
+    'summary.config.name',
+    'summary.config.uuid',
+    'summary.config.numCpu',
+    'summary.config.memorySizeMB',
+    'summary.config.guestFullName',
+    'summary.guest.hostName',
+    'summary.guest.toolsStatus',
+    'summary.quickStats.guestMemoryUsage',
+    'runtime.powerState',
+    'runtime.host',
+    'config.hardware.numCPU',
+    'config.hardware.device',
+    'config.firmware',
+    'guest.net',
+    'guest.disk'
+]
+
+# 随时间持续变化的统计属性，不参与变更跟踪（否则每台开机的虚拟机每次都会被视为已修改），
+# 只在完整采集时检索
+VOLATILE_PROPERTIES = [
+    'summary.quickStats.guestMemoryUsage',
+    'guest.disk'
+]
+
+# 变更跟踪过滤器监视的属性
+TRACKED_PROPERTIES = [path for path in VM_PROPERTIES if path not in VOLATILE_PROPERTIES]
+
+
+class _ChangeTracker:
+    """
+    一个 vCenter 的虚拟机变更跟踪状态
+    
+    持有会话池中的会话租约（跟踪期间会话保持登录）和独立的 PropertyCollector，过滤器监视
+    ContainerView 中所有虚拟机的 TRACKED_PROPERTIES，version 为最近一次已处理的
+    WaitForUpdatesEx 版本。会话重新登录后 PropertyCollector 失效，由调用方改为完整采集。
+    """
+    
+    def __init__(self, lease, collector, property_filter, view):
+        self.lease = lease
+        self.service_instance = lease.service_instance
+        self.collector = collector
+        self.property_filter = property_filter
+        self.view = view
+        self.version = ''
+        self.vm_uuids: Dict[str, str] = {}  # {moId: vm_uuid}，用于识别已删除的虚拟机
+        self.created_at = time.monotonic()
+    
+    def close(self):
+        for release in (self.property_filter.Destroy, self.view.Destroy,
+                        self.collector.DestroyPropertyCollector, self.lease.release):
+            try:
+                release()
+            except Exception:
+                pass
 
 
 class VMwareCollector:
     """VMware 主机信息采集器"""
     
     def __init__(self):
-        pass
+        self._sessions = vcenter_session_pool
+        self._trackers: Dict[Tuple[str, str], _ChangeTracker] = {}
+        self._trackers_lock = threading.Lock()
     
     def collect_vm_info(self, vcenter_host: str, username: str, password: str, 
                        vm_name: Optional[str] = None, vm_uuid: Optional[str] = None,
                        collect_all_vms: bool = False, 
                        progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
-                       max_workers: Optional[int] = None) -> Dict[str, Any]:
+                       max_workers: Optional[int] = None, incremental: Optional[bool] = None) -> Dict[str, Any]:
         """
         采集VMware虚拟机信息
         
@@ -31,179 +96,77 @@ class VMwareCollector:
             vm_uuid: 虚拟机UUID（可选）
             collect_all_vms: 是否采集所有虚拟机（用于vCenter）
             progress_callback: 进度回调函数，参数为(completed, total, vm_info)
-            max_workers: 最大并发工作线程数（默认从配置读取）
+            max_workers: 保留参数，批量采集改为 PropertyCollector 分页检索后不再使用线程池
+            incremental: 采集所有虚拟机时是否只采集上次采集后变化的虚拟机，为 None 时使用
+                VMWARE_INCREMENTAL_ENABLED 配置
             
         Returns:
             采集的虚拟机信息字典或列表
         """
+        if incremental is None:
+            incremental = current_app.config.get('VMWARE_INCREMENTAL_ENABLED', True) if current_app else False
+        if collect_all_vms and incremental:
+            try:
+                return self._collect_all_vms_tracked(vcenter_host, username, password, progress_callback)
+            except Exception as e:
+                error_msg = str(e)
+                logger.error(f"Error collecting VMware VM info: {error_msg}")
+                return {'error': error_msg, 'success': False}
+        
         try:
-            # 导入pyvmomi相关模块
-            from pyVim import connect
-            from pyVmomi import vim
-            import ssl
-            
-            # 忽略SSL证书验证
-            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS)
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            # 连接到vCenter/ESXi
-            service_instance = connect.SmartConnect(
-                host=vcenter_host,
-                user=username,
-                pwd=password,
-                sslContext=ssl_context,
-                port=443
+            # 使用会话池中的会话，会话已失效时重新登录
+            return self._sessions.run(
+                vcenter_host, username, password,
+                lambda service_instance: self._collect_with_session(
+                    service_instance, vcenter_host, vm_name, vm_uuid, collect_all_vms, progress_callback
+                )
             )
-            
-            try:
-                content = service_instance.RetrieveContent()
-                
-                # 如果采集所有虚拟机，使用并发采集
-                if collect_all_vms:
-                    # 获取最大工作线程数
-                    if max_workers is None:
-                        max_workers = current_app.config.get('VMWARE_COLLECTION_MAX_WORKERS', 10) if current_app else 10
-                    
-                    vms = self._get_all_vms(content)
-                    total = len(vms)
-                    
-                    logger.info(
-                        f"开始VMware采集: vCenter={vcenter_host}, VM数量={total}, 并发线程数={max_workers}",
-                        extra={
-                            'host_ip': vcenter_host,
-                            'vm_count': total,
-                            'max_workers': max_workers,
-                            'operation': 'vmware_collect_all_start'
-                        }
-                    )
-                    
-                    # 使用线程池并发采集
-                    vm_list = []
-                    completed_count = 0
-                    failed_count = 0
-                    
-                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                        # 提交所有任务
-                        future_to_vm = {
-                            executor.submit(self._collect_vm_details, vm, content): vm 
-                            for vm in vms
-                        }
-                        
-                        # 处理完成的任务
-                        for future in as_completed(future_to_vm):
-                            vm = future_to_vm[future]
-                            try:
-                                vm_info = future.result()
-                                if vm_info:
-                                    vm_list.append(vm_info)
-                                    completed_count += 1
-                                    # 调用进度回调
-                                    if progress_callback:
-                                        try:
-                                            progress_callback(completed_count, total, vm_info)
-                                        except Exception as e:
-                                            logger.error(f"Error in progress callback: {str(e)}", exc_info=True)
-                                else:
-                                    failed_count += 1
-                                    logger.warning(
-                                        f"Failed to collect VM: {vm.name if hasattr(vm, 'name') else 'Unknown'}"
-                                    )
-                            except Exception as e:
-                                failed_count += 1
-                                vm_name = vm.name if hasattr(vm, 'name') else 'Unknown'
-                                logger.error(
-                                    f"Error collecting VM {vm_name}: {str(e)}",
-                                    extra={
-                                        'vm_name': vm_name,
-                                        'error': str(e),
-                                        'operation': 'vmware_collect_single'
-                                    }
-                                )
-                    
-                    logger.info(
-                        f"VMware采集完成: vCenter={vcenter_host}, 成功={completed_count}, 失败={failed_count}, 总计={total}",
-                        extra={
-                            'host_ip': vcenter_host,
-                            'total_vms': total,
-                            'completed': completed_count,
-                            'failed': failed_count,
-                            'operation': 'vmware_collect_all_complete'
-                        }
-                    )
-                    
-                    return {'vms': vm_list, 'total': total, 'completed': completed_count, 'failed': failed_count}
-                
-                # 查找单个虚拟机
-                # 优先使用UUID查找（更可靠），如果UUID不存在或失败，再使用名称查找
-                vm = None
-                if vm_uuid:
-                    logger.info(f"Attempting to find VM by UUID: {vm_uuid}")
-                    vm = self._get_vm_by_uuid(content, vm_uuid)
-                    if vm:
-                        logger.info(f"VM found by UUID: {vm_uuid}")
-                    else:
-                        logger.warning(f"VM not found by UUID: {vm_uuid}, trying name: {vm_name}")
-                        # UUID查找失败，尝试使用名称
-                        if vm_name:
-                            vm = self._get_vm_by_name(content, vm_name)
-                elif vm_name:
-                    logger.info(f"Attempting to find VM by name: {vm_name}")
-                    vm = self._get_vm_by_name(content, vm_name)
-                else:
-                    error_msg = "Either vm_name or vm_uuid must be provided"
-                    logger.error(error_msg)
-                    return {'error': error_msg, 'success': False}
-                
-                if not vm:
-                    error_msg = f"VM not found: name={vm_name}, uuid={vm_uuid}"
-                    logger.error(error_msg)
-                    return {'error': error_msg, 'success': False}
-                
-                # 采集虚拟机信息
-                vm_info = self._collect_vm_details(vm, content)
-                
-                return vm_info
-                
-            finally:
-                # 断开连接
-                connect.Disconnect(service_instance)
-                
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Error collecting VMware VM info: {error_msg}")
             # 返回包含错误信息的字典，而不是空字典
             return {'error': error_msg, 'success': False}
     
-    def _get_all_vms(self, content):
-        """
-        获取所有虚拟机
+    def _collect_with_session(self, service_instance, vcenter_host: str, vm_name: Optional[str],
+                              vm_uuid: Optional[str], collect_all_vms: bool,
+                              progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """使用已登录的会话采集虚拟机信息"""
+        content = service_instance.RetrieveContent()
         
-        Args:
-            content: ServiceContent
-            
-        Returns:
-            虚拟机对象列表
-        """
-        try:
-            from pyVmomi import vim
-            
-            container = content.rootFolder
-            view_type = [vim.VirtualMachine]
-            recursive = True
-            
-            container_view = content.viewManager.CreateContainerView(
-                container=container,
-                type=view_type,
-                recursive=recursive
-            )
-            
-            vms = list(container_view.view)
-            container_view.Destroy()
-            return vms
-            
-        except Exception as e:
-            logger.error(f"Error getting all VMs: {str(e)}")
-            return []
+        # 采集所有虚拟机：通过 ContainerView 和 PropertyCollector 分页批量检索所需属性
+        if collect_all_vms:
+            return self._collect_all_vms(vcenter_host, content, progress_callback)
+        
+        # 查找单个虚拟机
+        # 优先使用UUID查找（更可靠），如果UUID不存在或失败，再使用名称查找
+        vm = None
+        if vm_uuid:
+            logger.info(f"Attempting to find VM by UUID: {vm_uuid}")
+            vm = self._get_vm_by_uuid(content, vm_uuid)
+            if vm:
+                logger.info(f"VM found by UUID: {vm_uuid}")
+            else:
+                logger.warning(f"VM not found by UUID: {vm_uuid}, trying name: {vm_name}")
+                # UUID查找失败，尝试使用名称
+                if vm_name:
+                    vm = self._get_vm_by_name(content, vm_name)
+        elif vm_name:
+            logger.info(f"Attempting to find VM by name: {vm_name}")
+            vm = self._get_vm_by_name(content, vm_name)
+        else:
+            error_msg = "Either vm_name or vm_uuid must be provided"
+            logger.error(error_msg)
+            return {'error': error_msg, 'success': False}
+        
+        if not vm:
+            error_msg = f"VM not found: name={vm_name}, uuid={vm_uuid}"
+            logger.error(error_msg)
+            return {'error': error_msg, 'success': False}
+        
+        # 采集虚拟机信息
+        vm_info = self._collect_vm_details(vm, content)
+        
+        return vm_info
     
     def _get_vm_by_name(self, content, vm_name: str):
         """
@@ -219,30 +182,33 @@ class VMwareCollector:
         try:
             from pyVmomi import vim
             
-            container = content.rootFolder
-            view_type = [vim.VirtualMachine]  # 修复：应该使用vim.VirtualMachine而不是type(vm_name)
-            recursive = True
-            
             container_view = content.viewManager.CreateContainerView(
-                container=container,
-                type=view_type,
-                recursive=recursive
+                container=content.rootFolder,
+                type=[vim.VirtualMachine],
+                recursive=True
             )
+            try:
+                # 一次检索所有虚拟机的名称
+                names = [
+                    (managed_object, props.get('name'))
+                    for managed_object, props in self._iter_properties(
+                        content, container_view, [(vim.VirtualMachine, ['name'])]
+                    )
+                ]
+            finally:
+                container_view.Destroy()
             
             # 尝试精确匹配
-            for managed_object in container_view.view:
-                if hasattr(managed_object, 'name') and managed_object.name == vm_name:
-                    container_view.Destroy()
+            for managed_object, name in names:
+                if name == vm_name:
                     return managed_object
             
             # 如果精确匹配失败，尝试不区分大小写的匹配
-            for managed_object in container_view.view:
-                if hasattr(managed_object, 'name') and managed_object.name and managed_object.name.lower() == vm_name.lower():
-                    container_view.Destroy()
+            for managed_object, name in names:
+                if name and name.lower() == vm_name.lower():
                     return managed_object
-                    
-            container_view.Destroy()
-            logger.warning(f"VM not found by exact name '{vm_name}', trying case-insensitive match...")
+            
+            logger.warning(f"VM not found by name '{vm_name}' (case-insensitive match also failed)")
             return None
             
         except Exception as e:
@@ -283,189 +249,599 @@ class VMwareCollector:
             logger.error(f"Error finding VM by UUID: {str(e)}", exc_info=True)
             return None
     
-    def _collect_vm_details(self, vm, content) -> Dict[str, Any]:
+    def _collect_all_vms(self, vcenter_host: str, content,
+                         progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
-        采集虚拟机详细信息
+        批量采集 vCenter 上的所有虚拟机
+        
+        所有虚拟机的属性通过 PropertyCollector 分页批量返回，宿主机、网络、数据存储的名称
+        预先一次性检索，不再逐台、逐属性访问虚拟机对象。
         
         Args:
-            vm: 虚拟机对象
+            vcenter_host: vCenter/ESXi主机地址
             content: ServiceContent
+            progress_callback: 进度回调函数，参数为(completed, total, vm_info)
             
         Returns:
-            虚拟机信息字典
+            {'vms': 虚拟机信息列表, 'total', 'completed', 'failed', 'cancelled'}
         """
+        from pyVmomi import vim
+        
+        token = current_token()
+        view = content.viewManager.CreateContainerView(
+            container=content.rootFolder,
+            type=[vim.VirtualMachine],
+            recursive=True
+        )
         try:
-            # 等待VM信息更新
-            import pyVmomi
-            while vm.runtime.powerState not in ['poweredOn', 'poweredOff']:
-                pass
-            
-            # 获取摘要信息
-            summary = vm.summary
-            
-            # CPU信息
-            cpu_cores = vm.config.hardware.numCPU if hasattr(vm.config, 'hardware') else summary.config.numCpu
-            cpu_model = None  # vCenter可能不直接提供CPU型号
-            
-            # 内存信息
-            memory_total = summary.config.memorySizeMB if hasattr(summary.config, 'memorySizeMB') else 0
-            
-            # Guest OS信息
-            guest = summary.guest if hasattr(summary, 'guest') else None
-            hostname = guest.hostName if guest and hasattr(guest, 'hostName') else None
-            os_name = summary.config.guestFullName if hasattr(summary.config, 'guestFullName') else None
-            
-            # Guest内存使用情况
-            memory_free_mb = None
-            if guest and hasattr(guest, 'memoryUsageMB'):
-                # 计算空闲内存 = 总内存 - 已使用内存
-                memory_used_mb = guest.memoryUsageMB if hasattr(guest, 'memoryUsageMB') else 0
-                memory_free_mb = max(0, memory_total - memory_used_mb) if memory_total > 0 else None
-            
-            # 启动固件类型（BIOS/UEFI）
-            boot_method = None
-            if hasattr(vm, 'config') and hasattr(vm.config, 'firmware'):
-                firmware_type = str(vm.config.firmware) if vm.config.firmware else None
-                if firmware_type:
-                    if 'efi' in firmware_type.lower() or 'uefi' in firmware_type.lower():
-                        boot_method = 'UEFI'
-                    elif 'bios' in firmware_type.lower():
-                        boot_method = 'BIOS'
-                    else:
-                        boot_method = firmware_type
-            
-            # 操作系统位数（从Guest OS信息推断）
-            os_bit = None
-            if os_name:
-                if '64-bit' in os_name or 'x64' in os_name.lower() or 'amd64' in os_name.lower():
-                    os_bit = '64-bit'
-                elif '32-bit' in os_name or 'x86' in os_name.lower():
-                    os_bit = '32-bit'
-            
-            # 网络接口信息 - 增强：从配置和Guest状态获取详细信息
-            network_interfaces = []
-            # 从vm.config.hardware.device获取网络适配器配置
-            if hasattr(vm, 'config') and hasattr(vm.config, 'hardware') and hasattr(vm.config.hardware, 'device'):
-                from pyVmomi import vim
-                for device in vm.config.hardware.device:
-                    if isinstance(device, vim.vm.device.VirtualEthernetCard):
-                        # 获取网络适配器配置信息
-                        net_adapter = {
-                            'label': device.deviceInfo.label if hasattr(device, 'deviceInfo') else None,
-                            'mac_address': device.macAddress if hasattr(device, 'macAddress') else None,
-                            'address_type': device.addressType if hasattr(device, 'addressType') else None,
-                            'wake_on_lan_enabled': device.wakeOnLanEnabled if hasattr(device, 'wakeOnLanEnabled') else None
-                        }
-                        
-                        # 获取连接的网络名称
-                        if hasattr(device, 'backing'):
-                            if isinstance(device.backing, vim.vm.device.VirtualEthernetCard.NetworkBackingInfo):
-                                net_adapter['network_name'] = device.backing.network.name if device.backing.network else None
-                            elif isinstance(device.backing, vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo):
-                                net_adapter['portgroup_key'] = device.backing.port.portgroupKey if device.backing.port else None
-                        
-                        # 从Guest状态获取IP地址信息
-                        if guest and hasattr(guest, 'net'):
-                            for net in guest.net:
-                                if hasattr(net, 'deviceConfigId') and net.deviceConfigId == device.key:
-                                    net_adapter['ip_addresses'] = list(net.ipAddress) if hasattr(net, 'ipAddress') and net.ipAddress else []
-                                    net_adapter['connected'] = net.connected if hasattr(net, 'connected') else None
-                                    net_adapter['network'] = net.network if hasattr(net, 'network') else None
-                                    break
-                        
-                        network_interfaces.append(net_adapter)
-            
-            # 如果没有从配置获取到网络信息，从Guest状态获取
-            if not network_interfaces and guest and hasattr(guest, 'net'):
-                for net in guest.net:
-                    network_interfaces.append({
-                        'device': net.deviceConfigId if hasattr(net, 'deviceConfigId') else None,
-                        'ip_addresses': list(net.ipAddress) if hasattr(net, 'ipAddress') and net.ipAddress else [],
-                        'mac_address': net.macAddress if hasattr(net, 'macAddress') else None,
-                        'connected': net.connected if hasattr(net, 'connected') else None,
-                        'network': net.network if hasattr(net, 'network') else None
-                    })
-            
-            # 磁盘信息 - 增强：从配置和Guest状态获取详细信息
-            disk_info = []
-            # 从vm.config.hardware.device获取虚拟磁盘配置
-            if hasattr(vm, 'config') and hasattr(vm.config, 'hardware') and hasattr(vm.config.hardware, 'device'):
-                from pyVmomi import vim
-                for device in vm.config.hardware.device:
-                    if isinstance(device, vim.vm.device.VirtualDisk):
-                        disk_detail = {
-                            'label': device.deviceInfo.label if hasattr(device, 'deviceInfo') else None,
-                            'capacity_bytes': device.capacityInBytes if hasattr(device, 'capacityInBytes') else None,
-                            'capacity_kb': device.capacityInKB if hasattr(device, 'capacityInKB') else None,
-                            'disk_mode': str(device.backing.diskMode) if hasattr(device, 'backing') and hasattr(device.backing, 'diskMode') else None,
-                            'eagerly_scrub': device.backing.eagerlyScrub if hasattr(device, 'backing') and hasattr(device.backing, 'eagerlyScrub') else None,
-                            'thin_provisioned': device.backing.thinProvisioned if hasattr(device, 'backing') and hasattr(device.backing, 'thinProvisioned') else None,
-                            'uuid': device.backing.uuid if hasattr(device, 'backing') and hasattr(device.backing, 'uuid') else None
+            items = self._iter_properties(content, view, [(vim.VirtualMachine, VM_PROPERTIES)], token=token)
+            return self._build_vm_list(vcenter_host, content, items, len(view.view), progress_callback, token)
+        finally:
+            view.Destroy()
+    
+    def _build_vm_list(self, vcenter_host: str, content, items: Iterator[Tuple[Any, Dict[str, Any]]], total: int,
+                       progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+                       token=None, vm_uuids: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        根据检索到的虚拟机属性逐台生成虚拟机信息并回调进度
+        
+        Args:
+            items: (虚拟机引用, {属性路径: 值}) 迭代器
+            total: 虚拟机总数（用于进度）
+            vm_uuids: 不为 None 时记录 {moId: vm_uuid}
+        """
+        vm_list = []
+        completed_count = 0
+        failed_count = 0
+        cancelled = False
+        
+        logger.info(
+            f"开始VMware采集: vCenter={vcenter_host}, VM数量={total}, 分页大小={self._page_size()}",
+            extra={
+                'host_ip': vcenter_host,
+                'vm_count': total,
+                'operation': 'vmware_collect_all_start'
+            }
+        )
+        
+        try:
+            names = self._managed_object_names(content, token)
+            name_of = lambda ref: names.get(ref._moId) or ref.name
+            for vm, props in items:
+                if token and token.cancelled:
+                    cancelled = True
+                    break
+                try:
+                    vm_info = self._build_vm_info(props, name_of)
+                except Exception as e:
+                    vm_info = None
+                    logger.error(
+                        f"Error collecting VM {props.get('name', 'Unknown')}: {str(e)}",
+                        extra={
+                            'vm_name': props.get('name'),
+                            'error': str(e),
+                            'operation': 'vmware_collect_single'
                         }
-                        
-                        # 获取存储路径
-                        if hasattr(device, 'backing'):
-                            if isinstance(device.backing, vim.vm.device.VirtualDisk.FlatVer2BackingInfo):
-                                disk_detail['file_name'] = device.backing.fileName if hasattr(device.backing, 'fileName') else None
-                                disk_detail['datastore'] = device.backing.datastore.name if device.backing.datastore else None
-                            elif isinstance(device.backing, vim.vm.device.VirtualDisk.SeSparseBackingInfo):
-                                disk_detail['file_name'] = device.backing.fileName if hasattr(device.backing, 'fileName') else None
-                                disk_detail['datastore'] = device.backing.datastore.name if device.backing.datastore else None
-                        
-                        # 从Guest状态获取使用情况
-                        if hasattr(vm, 'guest') and hasattr(vm.guest, 'disk'):
-                            for disk in vm.guest.disk:
-                                if hasattr(disk, 'diskPath') and disk.diskPath:
-                                    # 尝试匹配磁盘路径
-                                    disk_detail['disk_path'] = disk.diskPath
-                                    disk_detail['capacity_guest'] = disk.capacity if hasattr(disk, 'capacity') else None
-                                    disk_detail['free_space'] = disk.freeSpace if hasattr(disk, 'freeSpace') else None
-                                    break
-                        
-                        disk_info.append(disk_detail)
-            
-            # 如果没有从配置获取到磁盘信息，从Guest状态获取
-            if not disk_info and hasattr(vm, 'guest') and hasattr(vm.guest, 'disk'):
-                for disk in vm.guest.disk:
-                    disk_info.append({
-                        'disk_path': disk.diskPath if hasattr(disk, 'diskPath') else None,
-                        'capacity': disk.capacity if hasattr(disk, 'capacity') else None,
-                        'free_space': disk.freeSpace if hasattr(disk, 'freeSpace') else None
-                    })
-            
-            # 宿主机信息
-            host_info = {}
-            if summary.runtime.host:
-                host_system = summary.runtime.host
-                host_info = {
-                    'host_name': host_system.name if hasattr(host_system, 'name') else None,
-                    'host_type': 'VMware ESXi'
-                }
-            
-            # 编译信息
-            vmware_info = {
-                'vm_name': summary.config.name if hasattr(summary.config, 'name') else None,
-                'vm_uuid': summary.config.uuid if hasattr(summary.config, 'uuid') else None,
-                'power_state': summary.runtime.powerState if hasattr(summary.runtime, 'powerState') else None,
-                'tools_status': guest.toolsStatus if guest and hasattr(guest, 'toolsStatus') else None,
-                'host': host_info
+                    )
+                if vm_info:
+                    vm_list.append(vm_info)
+                    completed_count += 1
+                    if vm_uuids is not None and vm_info['vmware_info'].get('vm_uuid'):
+                        vm_uuids[vm._moId] = vm_info['vmware_info']['vm_uuid']
+                    # 调用进度回调
+                    if progress_callback:
+                        try:
+                            progress_callback(completed_count, total, vm_info)
+                        except Exception as e:
+                            logger.error(f"Error in progress callback: {str(e)}", exc_info=True)
+                else:
+                    failed_count += 1
+                    logger.warning(f"Failed to collect VM: {props.get('name', 'Unknown')}")
+        except OperationCancelled:
+            cancelled = True
+        
+        logger.info(
+            f"VMware采集完成: vCenter={vcenter_host}, 成功={completed_count}, 失败={failed_count}, 总计={total}",
+            extra={
+                'host_ip': vcenter_host,
+                'total_vms': total,
+                'completed': completed_count,
+                'failed': failed_count,
+                'operation': 'vmware_collect_all_complete'
+            }
+        )
+        
+        if cancelled:
+            logger.info(f"VMware采集已取消: vCenter={vcenter_host}, 已完成={completed_count}, 总计={total}")
+        
+        return {'vms': vm_list, 'total': total, 'completed': completed_count, 'failed': failed_count,
+                'cancelled': cancelled}
+    
+    def _collect_all_vms_tracked(self, vcenter_host: str, username: str, password: str,
+                                 progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        带变更跟踪的所有虚拟机采集
+        
+        已有该 vCenter 的变更跟踪状态时，通过 WaitForUpdatesEx 取得上次版本之后创建、修改和
+        删除的虚拟机，只检索变化的虚拟机；没有跟踪状态、状态过期（VMWARE_INCREMENTAL_MAX_AGE）
+        或会话、版本已失效时执行完整采集并建立新的跟踪状态。采集被取消时丢弃跟踪状态。
+        
+        Returns:
+            与 _collect_all_vms 相同，增量采集时另有 incremental=True 和
+            removed_vm_uuids（已删除虚拟机的UUID列表）
+        """
+        key = (vcenter_host, username)
+        with self._trackers_lock:
+            tracker = self._trackers.pop(key, None)
+        max_age = current_app.config.get('VMWARE_INCREMENTAL_MAX_AGE', 604800) if current_app else 604800
+        if tracker and time.monotonic() - tracker.created_at > max_age:
+            # 定期完整采集，刷新不参与变更跟踪的统计属性
+            tracker.close()
+            tracker = None
+        
+        if tracker:
+            try:
+                result = self._collect_changes(vcenter_host, tracker, progress_callback)
+            except OperationCancelled:
+                tracker.close()
+                return {'vms': [], 'total': 0, 'completed': 0, 'failed': 0, 'cancelled': True}
+            except Exception as e:
+                logger.warning(f"VMware增量采集不可用，改为完整采集: vCenter={vcenter_host}, 原因={str(e)}")
+                tracker.close()
+            else:
+                self._keep_tracker(key, tracker, result)
+                return result
+        
+        from pyVmomi import vim
+        lease = self._sessions.acquire(vcenter_host, username, password)
+        tracker = None
+        try:
+            try:
+                tracker = self._create_tracker(lease)
+            except vim.fault.NotAuthenticated:
+                lease.relogin()
+                tracker = self._create_tracker(lease)
+            result = self._collect_full_tracked(vcenter_host, tracker, progress_callback)
+        except OperationCancelled:
+            tracker.close()
+            return {'vms': [], 'total': 0, 'completed': 0, 'failed': 0, 'cancelled': True}
+        except Exception:
+            if tracker:
+                tracker.close()
+            else:
+                lease.release()
+            raise
+        self._keep_tracker(key, tracker, result)
+        return result
+    
+    def _keep_tracker(self, key: Tuple[str, str], tracker: _ChangeTracker, result: Dict[str, Any]):
+        """保存跟踪状态供下次增量采集使用，采集被取消时丢弃"""
+        if result.get('cancelled'):
+            tracker.close()
+            return
+        with self._trackers_lock:
+            previous = self._trackers.pop(key, None)
+            self._trackers[key] = tracker
+        if previous:
+            previous.close()
+    
+    def _create_tracker(self, lease) -> _ChangeTracker:
+        """创建独立的 PropertyCollector 和监视所有虚拟机 TRACKED_PROPERTIES 的过滤器"""
+        from pyVmomi import vim, vmodl
+        
+        content = lease.service_instance.RetrieveContent()
+        collector = content.propertyCollector.CreatePropertyCollector()
+        view = content.viewManager.CreateContainerView(
+            container=content.rootFolder,
+            type=[vim.VirtualMachine],
+            recursive=True
+        )
+        spec = vmodl.query.PropertyCollector
+        filter_spec = spec.FilterSpec(
+            objectSet=[self._view_object_spec(view)],
+            propSet=[spec.PropertySpec(type=vim.VirtualMachine, pathSet=TRACKED_PROPERTIES, all=False)]
+        )
+        property_filter = collector.CreateFilter(filter_spec, partialUpdates=False)
+        return _ChangeTracker(lease, collector, property_filter, view)
+    
+    def _wait_for_updates(self, tracker: _ChangeTracker, token=None) -> Tuple[Dict[str, Tuple[str, Any, Dict[str, Any]]], str]:
+        """
+        取得跟踪版本之后的所有变更（不等待）
+        
+        Returns:
+            ({moId: (变更类型 enter/modify/leave, 虚拟机引用, {属性路径: 值})}, 新版本)，
+            新版本由调用方在变更处理完成后保存
+        """
+        from pyVmomi import vmodl
+        
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=self._page_size())
+        version = tracker.version
+        updates = {}
+        while True:
+            update_set = self._retrieve_page(lambda: tracker.collector.WaitForUpdatesEx(version, options), token)
+            if update_set is None:
+                break
+            for filter_update in update_set.filterSet or []:
+                for object_update in filter_update.objectSet or []:
+                    kind = str(object_update.kind)
+                    props = {
+                        change.name: change.val if change.op in ('assign', 'add') else None
+                        for change in (object_update.changeSet or [])
+                    }
+                    previous = updates.get(object_update.obj._moId)
+                    if previous and kind != 'leave':
+                        # 同一虚拟机在多页中出现时合并属性，先出现的 enter 保持为 enter
+                        kind = 'enter' if previous[0] == 'enter' else kind
+                        props = {**previous[2], **props}
+                    updates[object_update.obj._moId] = (kind, object_update.obj, props)
+            version = update_set.version
+            if not update_set.truncated:
+                break
+        return updates, version
+    
+    def _collect_full_tracked(self, vcenter_host: str, tracker: _ChangeTracker,
+                              progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """新建跟踪状态后的完整采集：过滤器的初始结果包含所有虚拟机的跟踪属性，再补充统计属性"""
+        from pyVmomi import vim
+        
+        token = current_token()
+        content = tracker.service_instance.RetrieveContent()
+        updates, version = self._wait_for_updates(tracker, token)
+        volatile = {
+            vm._moId: props
+            for vm, props in self._iter_properties(content, tracker.view, [(vim.VirtualMachine, VOLATILE_PROPERTIES)], token=token)
+        }
+        entered = [(vm, props) for kind, vm, props in updates.values() if kind != 'leave']
+        items = ((vm, {**props, **volatile.get(vm._moId, {})}) for vm, props in entered)
+        result = self._build_vm_list(vcenter_host, content, items, len(entered), progress_callback, token,
+                                     tracker.vm_uuids)
+        if not result['cancelled']:
+            tracker.version = version
+        return result
+    
+    def _collect_changes(self, vcenter_host: str, tracker: _ChangeTracker,
+                         progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """增量采集：只检索上次版本之后创建或修改的虚拟机，并返回已删除虚拟机的UUID"""
+        from pyVmomi import vim
+        
+        token = current_token()
+        # 会话已失效时抛出 NotAuthenticated，由调用方改为完整采集
+        content = tracker.service_instance.RetrieveContent()
+        updates, version = self._wait_for_updates(tracker, token)
+        changed = [vm for kind, vm, _ in updates.values() if kind != 'leave']
+        removed_vm_uuids = [
+            tracker.vm_uuids.pop(mo_id)
+            for mo_id, (kind, _, _) in updates.items()
+            if kind == 'leave' and mo_id in tracker.vm_uuids
+        ]
+        
+        logger.info(
+            f"VMware增量采集: vCenter={vcenter_host}, 变化={len(changed)}, 删除={len(removed_vm_uuids)}",
+            extra={
+                'host_ip': vcenter_host,
+                'changed_count': len(changed),
+                'removed_count': len(removed_vm_uuids),
+                'operation': 'vmware_collect_incremental'
+            }
+        )
+        
+        props_by_id = self._retrieve_vm_properties(content, changed, token) if changed else {}
+        items = ((vm, props_by_id[vm._moId]) for vm in changed if vm._moId in props_by_id)
+        result = self._build_vm_list(vcenter_host, content, items, len(props_by_id), progress_callback, token,
+                                     tracker.vm_uuids)
+        result.update(incremental=True, removed_vm_uuids=removed_vm_uuids)
+        if not result['cancelled']:
+            tracker.version = version
+        return result
+    
+    def _retrieve_vm_properties(self, content, vms: List[Any], token=None) -> Dict[str, Dict[str, Any]]:
+        """
+        批量检索指定虚拟机的 VM_PROPERTIES
+        
+        变更之后被删除的虚拟机会使整次检索失败，此时逐台检索并跳过已不存在的虚拟机。
+        
+        Returns:
+            {moId: {属性路径: 值}}
+        """
+        from pyVmomi import vim, vmodl
+        
+        prop_specs = [(vim.VirtualMachine, VM_PROPERTIES)]
+        try:
+            return {
+                vm._moId: props
+                for vm, props in self._iter_properties(content, vms, prop_specs, traverse=False, token=token)
             }
+        except vmodl.fault.ManagedObjectNotFound:
+            results = {}
+            for vm in vms:
+                try:
+                    for _, props in self._iter_properties(content, [vm], prop_specs, traverse=False, token=token):
+                        results[vm._moId] = props
+                except vmodl.fault.ManagedObjectNotFound:
+                    continue
+            return results
+    
+    @staticmethod
+    def _page_size() -> int:
+        return max(current_app.config.get('VMWARE_PROPERTY_PAGE_SIZE', 500), 1) if current_app else 500
+    
+    def _retrieve_page(self, call: Callable, token=None):
+        """
+        领取全局 VMware 采集槽位后执行一次属性检索
+        
+        当前线程已持有槽位（批量采集中的 VMware 主机）时直接执行，不再嵌套等待。
+        任务取消时放弃等待并抛出 OperationCancelled，等待超过 VMWARE_SLOT_TIMEOUT 秒抛出 TimeoutError。
+        """
+        if token:
+            token.raise_if_cancelled()
+        if resource_governor.holds_slot():
+            return call()
+        
+        timeout = current_app.config.get('VMWARE_SLOT_TIMEOUT', 300) if current_app else 300
+        should_abort = (lambda: token.cancelled) if token else None
+        with resource_governor.slot('vmware', timeout=timeout, should_abort=should_abort) as acquired:
+            if token:
+                token.raise_if_cancelled()
+            if not acquired:
+                raise TimeoutError(f'等待 VMware 采集槽位超时（超过 {timeout} 秒）')
+            return call()
+    
+    @staticmethod
+    def _view_object_spec(view):
+        """遍历 ContainerView 中所有对象的 ObjectSpec"""
+        from pyVmomi import vim, vmodl
+        
+        spec = vmodl.query.PropertyCollector
+        return spec.ObjectSpec(obj=view, skip=True, selectSet=[
+            spec.TraversalSpec(name='traverseView', path='view', skip=False, type=vim.view.ContainerView)
+        ])
+    
+    def _iter_properties(self, content, root, prop_specs: List[Tuple[Any, List[str]]],
+                         traverse: bool = True, token=None) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """
+        通过 PropertyCollector.RetrievePropertiesEx 分页检索对象属性
+        
+        Args:
+            content: ServiceContent
+            root: ContainerView（traverse=True，检索视图中的对象），或托管对象、托管对象列表
+            prop_specs: [(托管对象类型, 属性路径列表)]
+            traverse: 是否遍历 ContainerView
+            token: 取消令牌，取消后不再检索后续分页
             
+        Yields:
+            (托管对象引用, {属性路径: 值})，对象上不存在的属性不出现在字典中
+        """
+        from pyVmomi import vmodl
+        
+        spec = vmodl.query.PropertyCollector
+        if traverse:
+            object_specs = [self._view_object_spec(root)]
+        else:
+            objects = root if isinstance(root, list) else [root]
+            object_specs = [spec.ObjectSpec(obj=obj, skip=False) for obj in objects]
+        filter_spec = spec.FilterSpec(
+            objectSet=object_specs,
+            propSet=[spec.PropertySpec(type=obj_type, pathSet=paths, all=False) for obj_type, paths in prop_specs]
+        )
+        options = spec.RetrieveOptions(maxObjects=self._page_size())
+        collector = content.propertyCollector
+        
+        result = self._retrieve_page(lambda: collector.RetrievePropertiesEx([filter_spec], options), token)
+        try:
+            while result:
+                for obj_content in result.objects:
+                    yield obj_content.obj, {prop.name: prop.val for prop in (obj_content.propSet or [])}
+                if not result.token:
+                    result = None
+                    break
+                page_token = result.token
+                result = self._retrieve_page(lambda: collector.ContinueRetrievePropertiesEx(page_token), token)
+        finally:
+            # 提前结束时释放服务端保存的分页结果
+            if result is not None and result.token:
+                try:
+                    collector.CancelRetrievePropertiesEx(result.token)
+                except Exception:
+                    pass
+    
+    def _managed_object_names(self, content, token=None) -> Dict[str, str]:
+        """一次性检索宿主机、网络和数据存储的名称，返回 {moId: 名称}"""
+        from pyVmomi import vim
+        
+        types = [vim.HostSystem, vim.Network, vim.Datastore]
+        view = content.viewManager.CreateContainerView(container=content.rootFolder, type=types, recursive=True)
+        try:
             return {
-                'hostname': hostname,
-                'os_name': os_name,
-                'cpu_model': cpu_model,
-                'cpu_cores': cpu_cores,
-                'memory_total': memory_total,
-                'memory_free_mb': memory_free_mb,
-                'os_bit': os_bit,
-                'boot_method': boot_method,
-                'network_interfaces': network_interfaces,
-                'disk_info': disk_info,
-                'vmware_info': vmware_info
+                obj._moId: props.get('name')
+                for obj, props in self._iter_properties(content, view, [(t, ['name']) for t in types], token=token)
             }
+        finally:
+            view.Destroy()
+    
+    def _collect_vm_details(self, vm, content) -> Dict[str, Any]:
+        """
+        采集单个虚拟机详细信息，一次检索取得所需的全部属性
+        
+        Args:
+            vm: 虚拟机对象
+            content: ServiceContent
+            
+        Returns:
+            虚拟机信息字典
+        """
+        try:
+            from pyVmomi import vim
+            
+            for _, props in self._iter_properties(content, vm, [(vim.VirtualMachine, VM_PROPERTIES)], traverse=False):
+                return self._build_vm_info(props, lambda ref: ref.name)
+            return {}
             
         except Exception as e:
             logger.error(f"Error collecting VM details: {str(e)}")
             return {}
-
+    
+    def _build_vm_info(self, props: Dict[str, Any], name_of: Callable[[Any], Optional[str]]) -> Dict[str, Any]:
+        """
+        根据检索到的属性生成虚拟机信息
+        
+        Args:
+            props: {属性路径: 值}，路径见 VM_PROPERTIES
+            name_of: 获取托管对象（宿主机、网络、数据存储）名称的函数
+            
+        Returns:
+            虚拟机信息字典，没有属性时为空字典
+        """
+        if not props:
+            return {}
+        from pyVmomi import vim
+        
+        # CPU信息
+        cpu_cores = props.get('config.hardware.numCPU')
+        if cpu_cores is None:
+            cpu_cores = props.get('summary.config.numCpu')
+        cpu_model = None  # vCenter可能不直接提供CPU型号
+        
+        # 内存信息
+        memory_total = props.get('summary.config.memorySizeMB') or 0
+        
+        # Guest OS信息
+        hostname = props.get('summary.guest.hostName')
+        os_name = props.get('summary.config.guestFullName')
+        
+        # Guest内存使用情况：空闲内存 = 总内存 - 已使用内存
+        memory_free_mb = None
+        memory_used_mb = props.get('summary.quickStats.guestMemoryUsage')
+        if memory_used_mb is not None and memory_total > 0:
+            memory_free_mb = max(0, memory_total - memory_used_mb)
+        
+        # 启动固件类型（BIOS/UEFI）
+        boot_method = None
+        firmware_type = str(props['config.firmware']) if props.get('config.firmware') else None
+        if firmware_type:
+            if 'efi' in firmware_type.lower() or 'uefi' in firmware_type.lower():
+                boot_method = 'UEFI'
+            elif 'bios' in firmware_type.lower():
+                boot_method = 'BIOS'
+            else:
+                boot_method = firmware_type
+        
+        # 操作系统位数（从Guest OS信息推断）
+        os_bit = None
+        if os_name:
+            if '64-bit' in os_name or 'x64' in os_name.lower() or 'amd64' in os_name.lower():
+                os_bit = '64-bit'
+            elif '32-bit' in os_name or 'x86' in os_name.lower():
+                os_bit = '32-bit'
+        
+        devices = props.get('config.hardware.device') or []
+        guest_nets = props.get('guest.net') or []
+        guest_disks = props.get('guest.disk') or []
+        
+        # 网络接口信息：从虚拟硬件配置和Guest状态获取
+        network_interfaces = []
+        for device in devices:
+            if isinstance(device, vim.vm.device.VirtualEthernetCard):
+                net_adapter = {
+                    'label': device.deviceInfo.label if device.deviceInfo else None,
+                    'mac_address': device.macAddress,
+                    'address_type': device.addressType,
+                    'wake_on_lan_enabled': device.wakeOnLanEnabled
+                }
+                
+                # 获取连接的网络名称
+                if isinstance(device.backing, vim.vm.device.VirtualEthernetCard.NetworkBackingInfo):
+                    net_adapter['network_name'] = name_of(device.backing.network) if device.backing.network else None
+                elif isinstance(device.backing, vim.vm.device.VirtualEthernetCard.DistributedVirtualPortBackingInfo):
+                    net_adapter['portgroup_key'] = device.backing.port.portgroupKey if device.backing.port else None
+                
+                # 从Guest状态获取IP地址信息
+                for net in guest_nets:
+                    if net.deviceConfigId == device.key:
+                        net_adapter['ip_addresses'] = list(net.ipAddress) if net.ipAddress else []
+                        net_adapter['connected'] = net.connected
+                        net_adapter['network'] = net.network
+                        break
+                
+                network_interfaces.append(net_adapter)
+        
+        # 如果没有从配置获取到网络信息，从Guest状态获取
+        if not network_interfaces:
+            for net in guest_nets:
+                network_interfaces.append({
+                    'device': net.deviceConfigId,
+                    'ip_addresses': list(net.ipAddress) if net.ipAddress else [],
+                    'mac_address': net.macAddress,
+                    'connected': net.connected,
+                    'network': net.network
+                })
+        
+        # 磁盘信息：从虚拟硬件配置和Guest状态获取
+        disk_info = []
+        for device in devices:
+            if isinstance(device, vim.vm.device.VirtualDisk):
+                backing = device.backing
+                disk_detail = {
+                    'label': device.deviceInfo.label if device.deviceInfo else None,
+                    'capacity_bytes': device.capacityInBytes,
+                    'capacity_kb': device.capacityInKB,
+                    'disk_mode': str(backing.diskMode) if hasattr(backing, 'diskMode') else None,
+                    'eagerly_scrub': backing.eagerlyScrub if hasattr(backing, 'eagerlyScrub') else None,
+                    'thin_provisioned': backing.thinProvisioned if hasattr(backing, 'thinProvisioned') else None,
+                    'uuid': backing.uuid if hasattr(backing, 'uuid') else None
+                }
+                
+                # 获取存储路径
+                if isinstance(backing, (vim.vm.device.VirtualDisk.FlatVer2BackingInfo,
+                                        vim.vm.device.VirtualDisk.SeSparseBackingInfo)):
+                    disk_detail['file_name'] = backing.fileName
+                    disk_detail['datastore'] = name_of(backing.datastore) if backing.datastore else None
+                
+                # 从Guest状态获取使用情况
+                for disk in guest_disks:
+                    if disk.diskPath:
+                        disk_detail['disk_path'] = disk.diskPath
+                        disk_detail['capacity_guest'] = disk.capacity
+                        disk_detail['free_space'] = disk.freeSpace
+                        break
+                
+                disk_info.append(disk_detail)
+        
+        # 如果没有从配置获取到磁盘信息，从Guest状态获取
+        if not disk_info:
+            for disk in guest_disks:
+                disk_info.append({
+                    'disk_path': disk.diskPath,
+                    'capacity': disk.capacity,
+                    'free_space': disk.freeSpace
+                })
+        
+        # 宿主机信息
+        host_info = {}
+        if props.get('runtime.host'):
+            host_info = {
+                'host_name': name_of(props['runtime.host']),
+                'host_type': 'VMware ESXi'
+            }
+        
+        # 编译信息
+        vmware_info = {
+            'vm_name': props.get('summary.config.name'),
+            'vm_uuid': props.get('summary.config.uuid'),
+            'power_state': props.get('runtime.powerState'),
+            'tools_status': props.get('summary.guest.toolsStatus'),
+            'host': host_info
+        }
+        
+        return {
+            'hostname': hostname,
+            'os_name': os_name,
+            'cpu_model': cpu_model,
+            'cpu_cores': cpu_cores,
+            'memory_total': memory_total,
+            'memory_free_mb': memory_free_mb,
+            'os_bit': os_bit,
+            'boot_method': boot_method,
+            'network_interfaces': network_interfaces,
+            'disk_info': disk_info,
+            'vmware_info': vmware_info
+        }
@@ -0,0 +1,258 @@
+"""
+vCenter 会话池
+按 (vCenter, 凭证) 复用已登录的 pyVmomi 会话，后台线程定期保活并注销长时间空闲的会话，
+会话失效（NotAuthenticated）时重新登录
+"""
+import atexit
+import hashlib
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Tuple
+from flask import current_app
+from app.core.utils.logger import app_logger as logger
+
+
+class _PooledSession:
+    """一个已登录的 vCenter 会话"""
+
+    def __init__(self, vcenter_host: str, username: str, password: str, service_instance):
+        self.vcenter_host = vcenter_host
+        self.username = username
+        self.password = password
+        self.service_instance = service_instance
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.last_checked = self.last_used
+        self.lock = threading.Lock()  # 串行化重新登录
+
+
+class _Lease:
+    """会话租约，release 之前会话不会因空闲被注销"""
+
+    def __init__(self, pool: 'VCenterSessionPool', session: _PooledSession):
+        self._pool = pool
+        self._session = session
+        self._released = False
+
+    @property
+    def service_instance(self):
+        return self._session.service_instance
+
+    def relogin(self, stale_service_instance=None):
+        """会话失效后重新登录，其他持有者已重新登录时直接使用新会话"""
+        self._pool._relogin(self._session, stale_service_instance or self._session.service_instance)
+        return self._session.service_instance
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._pool._release(self._session)
+
+
+class VCenterSessionPool:
+    """按 (vCenter, 用户名, 密码摘要) 共享的 vCenter 会话池"""
+
+    # 复用会话时，距上次检查超过该秒数先确认会话仍然有效
+    VALIDATE_AFTER = 60
+
+    def __init__(self):
+        self.keepalive_interval = 300
+        self.idle_timeout = 1800
+        self._sessions: Dict[Tuple[str, str, str], _PooledSession] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_config(self):
+        if current_app:
+            self.keepalive_interval = max(current_app.config.get('VMWARE_SESSION_KEEPALIVE_INTERVAL', 300), 10)
+            self.idle_timeout = max(current_app.config.get('VMWARE_SESSION_IDLE_TIMEOUT', 1800), 0)
+
+    @staticmethod
+    def _key(vcenter_host: str, username: str, password: str) -> Tuple[str, str, str]:
+        # 密码只以摘要参与键，修改密码后使用新会话，旧会话空闲后注销
+        return vcenter_host, username, hashlib.sha256((password or '').encode()).hexdigest()
+
+    def acquire(self, vcenter_host: str, username: str, password: str) -> _Lease:
+        """
+        租用会话，没有可用会话时登录
+
+        Returns:
+            会话租约，使用结束后需调用 release
+        """
+        self._load_config()
+        self._ensure_keepalive()
+        key = self._key(vcenter_host, username, password)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session:
+                session.in_use += 1
+        if session:
+            lease = _Lease(self, session)
+            if time.monotonic() - session.last_checked >= self.VALIDATE_AFTER:
+                try:
+                    self._validate(session)
+                except Exception:
+                    lease.release()
+                    raise
+            return lease
+
+        service_instance = self._login(vcenter_host, username, password)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = _PooledSession(vcenter_host, username, password, service_instance)
+                self._sessions[key] = session
+                service_instance = None
+            session.in_use += 1
+        if service_instance is not None:
+            # 并发登录时已有其他线程放入会话，注销多余的会话
+            self._logout(service_instance)
+        logger.debug(f"vCenter session opened: {vcenter_host} ({username})")
+        return _Lease(self, session)
+
+    @contextmanager
+    def session(self, vcenter_host: str, username: str, password: str):
+        """在 with 块内租用会话，返回租约"""
+        lease = self.acquire(vcenter_host, username, password)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def run(self, vcenter_host: str, username: str, password: str, func: Callable[[Any], Any]) -> Any:
+        """
+        使用池中的会话执行 func(service_instance)
+
+        会话已被 vCenter 注销（NotAuthenticated）时重新登录并重试一次。
+        """
+        from pyVmomi import vim
+
+        with self.session(vcenter_host, username, password) as lease:
+            service_instance = lease.service_instance
+            try:
+                return func(service_instance)
+            except vim.fault.NotAuthenticated:
+                logger.info(f"vCenter session expired, logging in again: {vcenter_host} ({username})")
+                return func(lease.relogin(service_instance))
+
+    def close_all(self):
+        """注销所有会话"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._logout(session.service_instance)
+
+    def shutdown(self):
+        self._stop.set()
+        self.close_all()
+
+    def _release(self, session: _PooledSession):
+        with self._lock:
+            session.in_use = max(session.in_use - 1, 0)
+            session.last_used = time.monotonic()
+
+    def _validate(self, session: _PooledSession):
+        """会话已被 vCenter 注销（如 vCenter 重启）时重新登录"""
+        service_instance = session.service_instance
+        try:
+            valid = service_instance.content.sessionManager.currentSession is not None
+        except Exception:
+            valid = False
+        if valid:
+            session.last_checked = time.monotonic()
+        else:
+            logger.info(f"vCenter session expired, logging in again: {session.vcenter_host} ({session.username})")
+            self._relogin(session, service_instance)
+
+    def _relogin(self, session: _PooledSession, stale_service_instance):
+        with session.lock:
+            if session.service_instance is not stale_service_instance:
+                return
+            session.service_instance = self._login(session.vcenter_host, session.username, session.password)
+            session.last_checked = time.monotonic()
+        self._logout(stale_service_instance)
+
+    @staticmethod
+    def _login(vcenter_host: str, username: str, password: str):
+        """登录到vCenter/ESXi（忽略SSL证书验证）"""
+        from pyVim import connect
+        import ssl
+
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS)
+        ssl_context.verify_mode = ssl.CERT_NONE
+        return connect.SmartConnect(
+            host=vcenter_host,
+            user=username,
+            pwd=password,
+            sslContext=ssl_context,
+            port=443
+        )
+
+    @staticmethod
+    def _logout(service_instance):
+        from pyVim import connect
+        try:
+            connect.Disconnect(service_instance)
+        except Exception:
+            pass
+
+    def _ensure_keepalive(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._keepalive_loop, name='vcenter_session_keepalive', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            try:
+                self._sweep()
+            except Exception as e:
+                logger.error(f"Error in vCenter session keepalive: {str(e)}")
+
+    def _sweep(self):
+        """注销空闲超时的会话，其余会话超过保活间隔未检查时调用 CurrentTime 保活"""
+        now = time.monotonic()
+        expired = []
+        to_check = []
+        with self._lock:
+            for key, session in list(self._sessions.items()):
+                if session.in_use == 0 and now - session.last_used >= self.idle_timeout:
+                    expired.append(self._sessions.pop(key))
+                elif now - session.last_checked >= self.keepalive_interval:
+                    to_check.append((key, session))
+
+        for session in expired:
+            logger.debug(f"vCenter session idle, logging out: {session.vcenter_host} ({session.username})")
+            self._logout(session.service_instance)
+
+        for key, session in to_check:
+            service_instance = session.service_instance
+            try:
+                service_instance.CurrentTime()
+                session.last_checked = time.monotonic()
+            except Exception as e:
+                # 会话已失效：仍在使用时重新登录，否则移出会话池
+                if session.in_use:
+                    try:
+                        self._relogin(session, service_instance)
+                        continue
+                    except Exception:
+                        pass
+                logger.info(f"vCenter session dropped: {session.vcenter_host} ({session.username}), reason={str(e)}")
+                with self._lock:
+                    if self._sessions.get(key) is session:
+                        del self._sessions[key]
+                self._logout(service_instance)
+
+
+# 创建全局实例
+vcenter_session_pool = VCenterSessionPool()
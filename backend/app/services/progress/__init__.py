@@ -0,0 +1 @@
+"""进度推送服务模块"""
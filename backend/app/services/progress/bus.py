@@ -0,0 +1,256 @@
+"""
+进度事件总线
+扫描任务和采集任务的进度、状态变化在数据库提交后发布到总线，
+SSE 连接订阅对应主题，不再轮询数据库
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.models import ScanJob, CollectionTask, CollectionProgress
+from app.core.utils.logger import app_logger as logger
+
+CHANNEL_PREFIX = 'ipams:progress:'
+
+# 主题结束状态，推送后 SSE 连接关闭
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def scan_topic(job_id: str) -> str:
+    return f"scan_job:{job_id}"
+
+
+def collection_topic(task_id: str) -> str:
+    return f"collection_task:{task_id}"
+
+
+class Subscription:
+    """一个 SSE 连接的订阅，事件放入有界队列，队列满时丢弃最旧的事件"""
+
+    def __init__(self, bus, topics: List[str], max_queue: int):
+        self.bus = bus
+        self.topics = topics
+        self.queue = queue.Queue(maxsize=max_queue)
+
+    def put(self, message: Dict):
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                # 进度事件可被后续事件覆盖，丢弃最旧的一条
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class ProgressBus:
+    """进度事件总线
+
+    事件先分发给本进程的订阅者；Redis 可用时同时发布到 Redis 频道，
+    由各进程的监听线程转发给自己的订阅者，使任意进程上的 SSE 连接都能
+    收到其他进程执行的任务进度。总线不保存历史事件，新连接的初始状态
+    由接口从数据库读取一次。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ProgressBus, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self.app = None
+                    self.origin = uuid.uuid4().hex
+                    self.max_queue = 100
+                    self.max_subscribers = 200
+                    self._subscribers = {}
+                    self._subscriber_count = 0
+                    self._sub_lock = threading.Lock()
+                    self._stop = threading.Event()
+                    self._thread = None
+                    self._initialized = True
+
+    def init_app(self, app):
+        """读取配置，注册数据库提交事件并启动 Redis 监听线程"""
+        self.app = app
+        self.max_queue = max(app.config.get('PROGRESS_STREAM_QUEUE_SIZE', 100), 1)
+        self.max_subscribers = app.config.get('PROGRESS_STREAM_MAX_SUBSCRIBERS', 200)
+
+        if not event.contains(Session, 'after_flush', _collect_changes):
+            event.listen(Session, 'after_flush', _collect_changes)
+            event.listen(Session, 'after_commit', _publish_changes)
+            event.listen(Session, 'after_rollback', _discard_changes)
+
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name='progress_bus', daemon=True)
+        self._thread.start()
+        logger.info("Progress bus initialized")
+
+    def _redis(self):
+        return self.app.extensions.get('redis') if self.app else None
+
+    def publish(self, topic: str, event_type: str, data: Dict):
+        """发布事件
+
+        Args:
+            topic: 主题，如 scan_job:<id>、collection_task:<id>
+            event_type: 事件类型，对应 SSE 的 event 字段
+            data: 事件数据，需可 JSON 序列化
+        """
+        message = {'topic': topic, 'event': event_type, 'data': data, 'ts': time.time(), 'origin': self.origin}
+        self._dispatch(message)
+
+        redis_client = self._redis()
+        if not redis_client:
+            return
+        try:
+            redis_client.publish(CHANNEL_PREFIX + topic, json.dumps(message, default=str))
+        except Exception as e:
+            logger.warning(f"Failed to publish progress event to Redis: {str(e)}")
+
+    def subscribe(self, topics: Iterable[str]) -> Optional[Subscription]:
+        """订阅主题，超过连接上限时返回 None"""
+        with self._sub_lock:
+            if self.max_subscribers and self._subscriber_count >= self.max_subscribers:
+                return None
+            subscription = Subscription(self, list(topics), self.max_queue)
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+            self._subscriber_count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._sub_lock:
+            removed = False
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    removed = True
+                    if not subscribers:
+                        del self._subscribers[topic]
+            if removed:
+                self._subscriber_count -= 1
+
+    def _dispatch(self, message: Dict):
+        with self._sub_lock:
+            subscribers = list(self._subscribers.get(message['topic'], ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def _listen(self):
+        """监听 Redis 频道，转发其他进程发布的事件"""
+        while not self._stop.is_set():
+            redis_client = self._redis()
+            if not redis_client:
+                self._stop.wait(5)
+                continue
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                while not self._stop.is_set():
+                    item = pubsub.get_message(timeout=1.0)
+                    if not item:
+                        continue
+                    message = json.loads(item['data'])
+                    # 本进程发布的事件已在 publish 中分发
+                    if message.get('origin') == self.origin:
+                        continue
+                    self._dispatch(message)
+            except Exception as e:
+                logger.warning(f"Progress bus Redis listener error, reconnecting: {str(e)}")
+                self._stop.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def stop(self):
+        self._stop.set()
+
+
+def scan_job_event(job: ScanJob) -> Dict:
+    """扫描任务的轻量状态，不包含扫描结果"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'machines_found': job.machines_found,
+        'error_message': job.error_message,
+        'start_time': job.start_time.isoformat() if job.start_time else None,
+        'end_time': job.end_time.isoformat() if job.end_time else None
+    }
+
+
+def collection_task_event(task: CollectionTask) -> Dict:
+    """采集任务的轻量状态"""
+    return {
+        'task_id': task.id,
+        'status': task.status,
+        'total_hosts': task.total_hosts,
+        'success_count': task.success_count,
+        'failed_count': task.failed_count,
+        'end_time': task.end_time.isoformat() if task.end_time else None
+    }
+
+
+def _collect_changes(session, flush_context):
+    """flush 后记录发生变化的任务，提交成功后再发布"""
+    pending = session.info.setdefault('progress_events', OrderedDict())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, ScanJob):
+            pending[('job', obj.id)] = (scan_topic(obj.id), 'job', scan_job_event(obj))
+        elif isinstance(obj, CollectionTask):
+            pending[('task', obj.id)] = (collection_topic(obj.id), 'task', collection_task_event(obj))
+        elif isinstance(obj, CollectionProgress):
+            event_type = 'host_progress' if obj.host_id else 'progress'
+            pending[(event_type, obj.id)] = (collection_topic(obj.task_id), event_type, obj.to_dict())
+
+
+def _publish_changes(session):
+    pending = session.info.pop('progress_events', None)
+    if not pending:
+        return
+    for topic, event_type, data in pending.values():
+        try:
+            progress_bus.publish(topic, event_type, data)
+        except Exception as e:
+            logger.error(f"Error publishing progress event for {topic}: {str(e)}")
+
+
+def _discard_changes(session):
+    session.info.pop('progress_events', None)
+
+
+# 创建全局进度事件总线实例
+progress_bus = ProgressBus()
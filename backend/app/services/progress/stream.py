@@ -0,0 +1,77 @@
+"""
+Server-Sent Events 输出
+"""
+import json
+import time
+
+from typing import Dict, Iterable, Iterator
+from flask import Response, stream_with_context
+from .bus import Subscription, TERMINAL_STATUSES
+
+
+def format_event(event_type: str, data: Dict, event_id: str = None) -> str:
+    """格式化一条 SSE 事件"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def is_terminal(message: Dict, event_types: Iterable[str]) -> bool:
+    """任务级事件进入结束状态时返回 True"""
+    return message['event'] in event_types and message['data'].get('status') in TERMINAL_STATUSES
+
+
+def stream_response(subscription: Subscription, initial: Iterable[Dict],
+                    terminal_events: Iterable[str], heartbeat: int = 15,
+                    max_seconds: int = 3600, retry_ms: int = 3000) -> Response:
+    """生成 SSE 响应
+
+    先发送 initial 中的最新状态，之后推送订阅到的事件。任务进入结束状态后发送
+    end 事件并关闭连接；空闲时每 heartbeat 秒发送注释行保持连接；连接超过
+    max_seconds 后主动关闭，由浏览器按 retry 间隔重连。
+
+    Args:
+        subscription: 进度总线订阅
+        initial: 连接建立时补发的事件
+        terminal_events: 携带任务状态的事件类型
+        heartbeat: 心跳间隔（秒）
+        max_seconds: 单个连接最长保持时间（秒）
+        retry_ms: 建议浏览器重连间隔（毫秒）
+    """
+    terminal_events = tuple(terminal_events)
+
+    def generate() -> Iterator[str]:
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield f"retry: {retry_ms}\n\n"
+            for message in initial:
+                yield format_event(message['event'], message['data'], str(message.get('ts', '')))
+                if is_terminal(message, terminal_events):
+                    yield format_event('end', message['data'])
+                    return
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(message['event'], message['data'], str(message['ts']))
+                if is_terminal(message, terminal_events):
+                    yield format_event('end', message['data'])
+                    return
+        finally:
+            subscription.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 关闭 nginx 缓冲
+        }
+    )
+    # 客户端在首个事件前断开时生成器不会执行 finally，这里兜底取消订阅
+    response.call_on_close(subscription.close)
+    return response
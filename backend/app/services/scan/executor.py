@@ -1,7 +1,12 @@
 import nmap
 import os
-import psutil
+import re
+import ipaddress
+import shlex
+import signal
+import subprocess
 import time
+import tempfile
 import threading
 import xml.etree.ElementTree as ET
 
@@ -12,11 +17,19 @@ from flask import current_app
 from app.models.models import db, ScanJob, ScanResult, IP
 from app.core.utils.logger import app_logger as logger
 from app.services.notification.events import NotificationEvent, send_notification
+from app.services.scan.writer import ScanResultWriter
+from app.services.scan.port_stats import port_stats, parse_ports, format_ports
+from app.services.scan.passive import get_passive_fresh_hosts
+from app.tasks.cancellation import CancellationToken, OperationCancelled
+from app.services.progress.bus import progress_bus, scan_topic
+from app.tasks.task_registry import task_registry
 
 class ScanExecutor:
-    def __init__(self, job_id: str, subnet: str, threads: int = 5, scan_params: Optional[Dict] = None):
+    def __init__(self, job_id: str, subnet: str, threads: int = 5, scan_params: Optional[Dict] = None, targets: Optional[str] = None):
         self.job_id = job_id
         self.subnet = subnet
+        # 实际扫描目标，连续扫描时为网段的一个切片（空格分隔的 CIDR）
+        self.targets = targets or subnet
         self.threads = threads
         self.scan_params = scan_params or {}
         self.lock = threading.Lock()
@@ -26,11 +39,28 @@ class ScanExecutor:
         self.current_phase = "discovery"
         self.app = current_app._get_current_object()
         self.notification_manager = current_app.notification_manager
-        self.cancelled = False
+        self.token = CancellationToken()
         self.current_scan_process = None
+        self.nmap_process = None  # 正在运行的 nmap 子进程
         self.monitor_thread = None
         self.job_user_id = None
+        self.job_subnet_id = None
+        self.hosts_with_ports = set()  # 发现开放端口的主机
+        self.early_results = {}  # 优先端口阶段保存的结果 ip -> ScanResult.id
+        self.auto_collected_ips = set()  # 已触发自动采集的主机
+        self.followers = []  # 合并到本次扫描的其他策略的任务ID
+        self.followers_closed = False  # 扫描结束后不再接受合并
+        self.writer = ScanResultWriter(job_id, subnet, notification_manager=self.notification_manager)
         logger.debug(f"Initializing scan executor for job {job_id} on subnet {subnet}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    @cancelled.setter
+    def cancelled(self, value: bool):
+        if value:
+            self.token.cancel('Scan cancelled')
         
     def _load_job_user_id(self):
         """加载任务的user_id"""
@@ -38,6 +68,7 @@ class ScanExecutor:
             job = ScanJob.query.get(self.job_id)
             if job:
                 self.job_user_id = job.user_id
+                self.job_subnet_id = job.subnet_id
 
     def monitor_progress(self):
         """监控扫描进度"""
@@ -65,7 +96,7 @@ class ScanExecutor:
                         self._update_progress(current_progress)
                         last_progress = current_progress
                         
-                    time.sleep(0.5)  # 更频繁地更新进度
+                    self.token.wait(0.5)  # 更频繁地更新进度，取消后立即退出
                     
                 except Exception as e:
                     logger.error(f"Progress monitoring error: {str(e)}")
@@ -79,7 +110,26 @@ class ScanExecutor:
                     if job:
                         job.progress = min(progress, 100)
                         job.machines_found = self.machines_found
+                        followers = list(self.followers)
+                        if followers:
+                            # 同步合并任务的进度
+                            ScanJob.query.filter(ScanJob.id.in_(followers)).update({
+                                'progress': min(progress, 100),
+                                'machines_found': self.machines_found
+                            }, synchronize_session=False)
                         db.session.commit()
+                        # 进度随下一次心跳同步到任务注册表
+                        for registered_id in [self.job_id] + followers:
+                            task_registry.update('scan', registered_id, progress=min(progress, 100),
+                                                 machines_found=self.machines_found)
+                        # 批量更新不会触发提交事件，单独推送合并任务的进度
+                        for follower_id in followers:
+                            progress_bus.publish(scan_topic(follower_id), 'job', {
+                                'job_id': follower_id,
+                                'status': 'running',
+                                'progress': min(progress, 100),
+                                'machines_found': self.machines_found
+                            })
                         logger.debug(f"Job {self.job_id}: Updated progress to {progress}%")
                     else:
                         logger.error(f"Job {self.job_id}: Job not found in database")
@@ -90,50 +140,13 @@ class ScanExecutor:
             logger.error(f"Job {self.job_id}: Error updating progress: {str(e)}")
             
     def cancel(self):
-        """取消扫描任务"""
-        self.cancelled = True
+        """取消扫描任务
+
+        设置取消令牌，令牌回调会终止正在运行的 nmap 进程组，
+        扫描线程在下一个检查点退出并释放占用的资源。
+        """
         self.scanning = False
-        
-        logger.debug(f"Job {self.job_id}: Starting cancellation process")
-        logger.debug(f"Job {self.job_id}: current_scan_process status: {self.current_scan_process is not None}")
-        
-        # 停止当前的 nmap 进程
-        if self.current_scan_process:
-            try:
-                logger.debug(f"Job {self.job_id}: Stopping current nmap process")
-                # 获取 nmap 进程的 PID
-                if hasattr(self.nm, 'get_nmap_pid'):
-                    pid = self.nm.get_nmap_pid()
-                    if pid:
-                        import signal
-                        try:
-                            os.kill(pid, signal.SIGTERM)
-                            logger.debug(f"Job {self.job_id}: Sent SIGTERM to nmap process {pid}")
-                        except ProcessLookupError:
-                            logger.warning(f"Job {self.job_id}: Nmap process {pid} not found")
-                        except Exception as e:
-                            logger.error(f"Job {self.job_id}: Error killing nmap process: {str(e)}")
-                
-                # 尝试终止所有相关的 nmap 进程
-                try:
-                    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                        try:
-                            if 'nmap' in proc.info['name'].lower():
-                                cmdline = ' '.join(proc.info['cmdline'] or [])
-                                if self.subnet in cmdline:
-                                    proc.terminate()
-                                    logger.info(f"Job {self.job_id}: Terminated nmap process {proc.info['pid']}")
-                        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                            pass
-                except Exception as e:
-                    logger.error(f"Job {self.job_id}: Error terminating nmap processes: {str(e)}")
-                
-                self.current_scan_process = None
-            except Exception as e:
-                logger.error(f"Job {self.job_id}: Error stopping nmap process: {str(e)}")
-        else:
-            logger.info(f"Job {self.job_id}: No active nmap process to stop")
-        
+        self.token.cancel('Scan cancelled')
         logger.info(f"Job {self.job_id}: Scan cancelled")
         
         # 更新任务状态为已取消
@@ -150,45 +163,13 @@ class ScanExecutor:
             db.session.rollback()
 
     def cleanup(self):
-        """清理资源"""
+        """清理资源，不改变取消状态"""
         try:
             self.scanning = False
-            self.cancelled = True
             
-            # 停止当前的 nmap 进程
-            if self.current_scan_process:
-                try:
-                    logger.debug(f"Job {self.job_id}: Stopping current nmap process")
-                    # 获取 nmap 进程的 PID
-                    if hasattr(self.nm, 'get_nmap_pid'):
-                        pid = self.nm.get_nmap_pid()
-                        if pid:
-                            import signal
-                            try:
-                                os.kill(pid, signal.SIGTERM)
-                                logger.debug(f"Job {self.job_id}: Sent SIGTERM to nmap process {pid}")
-                            except ProcessLookupError:
-                                logger.warning(f"Job {self.job_id}: Nmap process {pid} not found")
-                            except Exception as e:
-                                logger.error(f"Job {self.job_id}: Error killing nmap process: {str(e)}")
-                    
-                    # 尝试终止所有相关的 nmap 进程
-                    try:
-                        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                            try:
-                                if 'nmap' in proc.info['name'].lower():
-                                    cmdline = ' '.join(proc.info['cmdline'] or [])
-                                    if self.subnet in cmdline:
-                                        proc.terminate()
-                                        logger.debug(f"Job {self.job_id}: Terminated nmap process {proc.info['pid']}")
-                            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                                pass
-                    except Exception as e:
-                        logger.error(f"Job {self.job_id}: Error terminating nmap processes: {str(e)}")
-                    
-                    self.current_scan_process = None
-                except Exception as e:
-                    logger.error(f"Job {self.job_id}: Error stopping nmap process: {str(e)}")
+            # 停止仍在运行的 nmap 进程
+            if self.nmap_process and self.nmap_process.poll() is None:
+                self._kill_nmap(self.nmap_process)
             
             # 等待监控线程结束
             if self.monitor_thread and self.monitor_thread.is_alive():
@@ -201,6 +182,69 @@ class ScanExecutor:
         except Exception as e:
             logger.error(f"Job {self.job_id}: Error during cleanup: {str(e)}")
 
+    def _kill_nmap(self, process: subprocess.Popen):
+        """终止 nmap 进程组：先发送 SIGTERM，超过宽限时间仍未退出则发送 SIGKILL"""
+        grace = self.app.config.get('NMAP_KILL_GRACE_SECONDS', 5)
+
+        def send(sig):
+            if process.poll() is not None:
+                return
+            try:
+                os.killpg(process.pid, sig)
+                logger.debug(f"Job {self.job_id}: Sent signal {sig} to nmap process group {process.pid}")
+            except ProcessLookupError:
+                pass
+            except Exception as e:
+                logger.error(f"Job {self.job_id}: Error killing nmap process {process.pid}: {str(e)}")
+
+        send(signal.SIGTERM)
+        timer = threading.Timer(grace, send, args=(signal.SIGKILL,))
+        timer.daemon = True
+        timer.start()
+
+    def _run_nmap(self, hosts: str, arguments: str) -> Dict:
+        """运行 nmap 并解析结果
+
+        与 PortScanner.scan 相同的参数和返回值，但由执行器自己启动子进程：
+        nmap 在独立的进程组中运行，取消令牌触发时整个进程组被终止，
+        不必等待扫描结束。取消后抛出 OperationCancelled。
+        """
+        self.token.raise_if_cancelled()
+        args = [self.nm._nmap_path, '-oX', '-'] + shlex.split(hosts) + shlex.split(arguments)
+        process = subprocess.Popen(
+            args,
+            bufsize=100000,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        self.nmap_process = process
+        unregister = self.token.register(lambda: self._kill_nmap(process))
+        try:
+            nmap_output, nmap_err = process.communicate()
+        finally:
+            unregister()
+            self.nmap_process = None
+        self.token.raise_if_cancelled()
+
+        nmap_err = bytes.decode(nmap_err)
+        nmap_err_keep_trace = []
+        nmap_warn_keep_trace = []
+        for line in nmap_err.splitlines():
+            if not line:
+                continue
+            if re.match(r'^Warning: ', line, re.IGNORECASE):
+                nmap_warn_keep_trace.append(line + os.linesep)
+            else:
+                nmap_err_keep_trace.append(line + os.linesep)
+        return self.nm.analyse_nmap_xml_scan(
+            nmap_xml_output=nmap_output,
+            nmap_err=nmap_err,
+            nmap_err_keep_trace=nmap_err_keep_trace,
+            nmap_warn_keep_trace=nmap_warn_keep_trace
+        )
+
     def scan_network(self):
         try:
             with self.app.app_context():
@@ -240,11 +284,32 @@ class ScanExecutor:
                         logger.debug(f"Job {self.job_id}: Scan cancelled before host discovery")
                         return False
 
+                    # 新鲜度窗口内被 ARP/DHCP 被动观测到的主机视为存活，跳过存活探测
+                    passive_hosts = self._get_passive_hosts()
+                    discovery_args = '-sn -T5 --stats-every 1s'
+                    exclude_path = None
+                    if passive_hosts:
+                        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as exclude_file:
+                            exclude_file.write('\n'.join(passive_hosts))
+                            exclude_path = exclude_file.name
+                        discovery_args += f' --excludefile {exclude_path}'
+                        logger.info(f"Job {self.job_id}: Skipping discovery for {len(passive_hosts)} passively seen hosts")
+
                     logger.debug(f"Job {self.job_id}: Starting nmap scan for host discovery")
-                    self.current_scan_process = self.nm.scan(
-                        hosts=self.subnet,
-                        arguments='-sn -T5 --stats-every 1s'
-                    )
+                    try:
+                        self.current_scan_process = self._run_nmap(
+                            hosts=self.targets,
+                            arguments=discovery_args
+                        )
+                    except Exception as e:
+                        if not passive_hosts or self.cancelled:
+                            raise
+                        # 目标全部被排除时 nmap 可能报错，此时只使用被动观测结果
+                        logger.warning(f"Job {self.job_id}: Host discovery failed, using passive results only: {str(e)}")
+                        self.current_scan_process = {'scan': {}}
+                    finally:
+                        if exclude_path:
+                            os.remove(exclude_path)
                     logger.info(f"Job {self.job_id}: Host discovery scan completed, current_scan_process status: {self.current_scan_process is not None}")
                 except Exception as e:
                     logger.error(f"Job {self.job_id}: Error during host discovery: {str(e)}")
@@ -259,6 +324,8 @@ class ScanExecutor:
                     host for host in self.current_scan_process['scan']
                     if self.current_scan_process['scan'][host].get('status', {}).get('state') == 'up'
                 ]
+                discovered = set(active_hosts)
+                active_hosts += [host for host in passive_hosts if host not in discovered]
 
                 self._save_discovery_result(active_hosts)
                 
@@ -309,6 +376,21 @@ class ScanExecutor:
                     else:
                         logger.debug(f"Job {self.job_id}: Using default scan mode with default ports: {scan_ports}")
 
+                # 按历史开放率优先探测高概率端口，尽早产出结果并触发自动采集
+                priority_ports = self._get_priority_ports(scan_ports)
+                if priority_ports:
+                    self._scan_priority_ports(active_hosts, priority_ports)
+                    if self.cancelled:
+                        logger.info(f"Job {self.job_id}: Scan cancelled during priority port scan")
+                        return False
+                    if scan_ports:
+                        remaining_ports = [p for p in parse_ports(scan_ports) if p not in priority_ports]
+                        scan_ports = format_ports(remaining_ports)
+                        if not scan_ports:
+                            # 所有端口已在优先阶段探测完毕
+                            active_hosts = []
+                            self.scanned_hosts = self.total_hosts
+
                 # 端口扫描
                 for i, host in enumerate(active_hosts, 1):
                     # 检查是否被取消
@@ -330,7 +412,7 @@ class ScanExecutor:
                             return False
                         
                         logger.debug(f"Job {self.job_id}: Starting port scan for {host}, current_scan_process status before scan: {self.current_scan_process is not None}")
-                        self.current_scan_process = self.nm.scan(
+                        self.current_scan_process = self._run_nmap(
                             hosts=host,
                             arguments=scan_arguments
                         )
@@ -351,7 +433,8 @@ class ScanExecutor:
                                         open_ports.append(port)
                                 
                                 if open_ports:
-                                    self.machines_found += 1
+                                    self.hosts_with_ports.add(host)
+                                    self.machines_found = len(self.hosts_with_ports)
                                     self._save_result(host, open_ports)
                                     logger.debug(f"Job {self.job_id}: Found {len(open_ports)} open ports on {host}")
                                 else:
@@ -361,6 +444,9 @@ class ScanExecutor:
                         else:
                             logger.warning(f"Job {self.job_id}: No scan results for host {host}")
                             
+                    except OperationCancelled:
+                        logger.info(f"Job {self.job_id}: Port scan for {host} interrupted by cancellation")
+                        return False
                     except Exception as e:
                         logger.error(f"Job {self.job_id}: Port scan failed for host {host}: {str(e)}")
                         continue
@@ -378,7 +464,7 @@ class ScanExecutor:
                         return False
                     
                     # 添加短暂延迟，让进度更新更平滑
-                    time.sleep(0.5)
+                    self.token.wait(0.5)
                 
                 # 扫描完成
                 logger.info(f"Job {self.job_id}: All hosts scanned, updating final status")
@@ -419,6 +505,10 @@ class ScanExecutor:
             
             # 清理资源
             self.cleanup()
+
+            # 已取消的任务保持 cancelled 状态
+            if self.cancelled:
+                return False
             
             # 更新任务状态为失败
             with self.app.app_context():
@@ -433,99 +523,98 @@ class ScanExecutor:
             return False
                 
     def _save_result(self, ip: str, open_ports: list):
+        host_data = self.current_scan_process['scan'][ip]
+        if ip in self.early_results:
+            self.writer.merge_result(self.early_results[ip], open_ports, host_data)
+        else:
+            self.writer.save_result(ip, open_ports, host_data)
+
+    def _get_passive_hosts(self) -> list:
+        """获取扫描目标中在新鲜度窗口内被被动观测到的主机"""
+        freshness = self.app.config.get('PASSIVE_FRESHNESS_SECONDS', 0)
+        if freshness <= 0 or self.scan_params.get('skip_passive') is False:
+            return []
+        try:
+            hosts = get_passive_fresh_hosts(self.subnet, freshness)
+            if self.targets != self.subnet:
+                networks = [ipaddress.ip_network(t, strict=False) for t in self.targets.split()]
+                hosts = [h for h in hosts if any(ipaddress.ip_address(h) in n for n in networks)]
+            return hosts
+        except Exception as e:
+            logger.error(f"Job {self.job_id}: Error loading passive liveness data: {str(e)}")
+            return []
+
+    def _get_priority_ports(self, scan_ports: Optional[str]) -> list:
+        """获取需要优先探测的端口"""
+        if self.scan_params.get('priority_ports') is False or not self.job_subnet_id:
+            return []
+        top_n = self.app.config.get('PORT_PRIORITY_TOP_N', 10)
+        if top_n <= 0:
+            return []
         try:
+            candidates = parse_ports(scan_ports) if scan_ports else None
+            return port_stats.get_priority_ports(
+                self.job_subnet_id,
+                candidates=candidates,
+                top_n=top_n,
+                history_jobs=self.app.config.get('PORT_STATS_HISTORY_JOBS', 20),
+                ttl=self.app.config.get('PORT_STATS_CACHE_TTL', 3600)
+            )
+        except Exception as e:
+            logger.error(f"Job {self.job_id}: Error loading port statistics: {str(e)}")
+            return []
+
+    def _scan_priority_ports(self, active_hosts: list, priority_ports: list):
+        """对所有存活主机批量探测优先端口，保存结果并提前触发自动采集"""
+        ports = format_ports(priority_ports)
+        batch_size = self.app.config.get('PORT_PRIORITY_BATCH_HOSTS', 256)
+        logger.info(f"Job {self.job_id}: Probing priority ports {ports} on {len(active_hosts)} hosts")
+        for start in range(0, len(active_hosts), batch_size):
+            if self.cancelled:
+                return
+            batch = active_hosts[start:start + batch_size]
             try:
-                job = ScanJob.query.get(self.job_id)
-                if not job:
-                    logger.error(f"Job {self.job_id} not found when saving result")
-                    return
-                
-                # 构建端口信息字典
-                ports_info = {}
-                for port in open_ports:
-                    port_info = self.current_scan_process['scan'][ip]['tcp'][port]
-                    ports_info[str(port)] = {
-                        'protocol': 'tcp',
-                        'service': port_info.get('name', ''),
-                        'version': port_info.get('version', ''),
-                        'banner': port_info.get('banner', ''),
-                        'state': port_info.get('state', '')
-                    }
-                
-                result = ScanResult(
-                    job_id=self.job_id,
-                    ip_address=ip,
-                    open_ports=ports_info,
-                    status='up',
-                    raw_data=self.current_scan_process['scan'][ip]
+                self.current_scan_process = self._run_nmap(
+                    hosts=' '.join(batch),
+                    arguments=f'-sT -T4 --host-timeout 10s --max-rtt-timeout 500ms --max-retries 1 -p {ports}'
                 )
-                db.session.add(result)
-                db.session.commit()
-                logger.debug(f"Saved scan result for job {self.job_id}, IP {ip}")
+            except OperationCancelled:
+                return
             except Exception as e:
-                db.session.rollback()
-                logger.error(f"Database error saving result for job {self.job_id}: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error saving result for job {self.job_id}: {str(e)}")
+                logger.error(f"Job {self.job_id}: Priority port scan failed: {str(e)}")
+                continue
+
+            for host in batch:
+                host_data = self.current_scan_process['scan'].get(host)
+                if not host_data:
+                    continue
+                open_ports = self.writer.get_open_ports(host_data)
+                if not open_ports:
+                    continue
+                result = self.writer.save_result(host, open_ports, host_data)
+                if result:
+                    self.early_results[host] = result.id
+                    self.hosts_with_ports.add(host)
+            self.machines_found = len(self.hosts_with_ports)
+
+        if self.early_results:
+            self._trigger_auto_collection(ip_addresses=list(self.early_results))
     
     def _save_discovery_result(self, active_hosts):
-        try:
-            try:
-                scanned_ips = set()
-                for host in active_hosts:
-                    ip_address = host
-                    scanned_ips.add(ip_address)
-                        
-                    # 更新或创建 IP 记录
-                    ip = IP.query.filter_by(ip_address=ip_address).first()
-                    if ip:
-                        ip.last_scanned = datetime.utcnow()
-                        if ip.status == 'inactive':
-                            ip.status = 'unclaimed'
-                            # 发送IP地址状态变更通知
-                            if self.job_user_id:
-                                self.notification_manager.create_notification(
-                                    user_id=self.job_user_id,
-                                    title="IP地址状态变更",
-                                    content=f"IP地址 {ip_address} 的状态已从 'inactive' 变为 'unclaimed'。",
-                                    type="ip",
-                                    commit=True
-                                )
-                                logger.debug(f"Sent notification for IP status change {ip_address} to user {self.job_user_id}")
-                    else:
-                        ip = IP(
-                            ip_address=ip_address,
-                            status='unclaimed',
-                            last_scanned=datetime.utcnow()
-                        )
-                        db.session.add(ip)
-                        # 发送新IP地址发现通知
-                        if self.job_user_id:
-                            self.notification_manager.create_notification(
-                                user_id=self.job_user_id,
-                                title="新IP地址发现",
-                                content=f"在扫描 {self.subnet} 时发现了新的IP地址: {ip_address}",
-                                type="ip",
-                                commit=True
-                            )
-                            logger.debug(f"Sent notification for new IP {ip_address} to user {self.job_user_id}")
-                
-                # 标记未响应的 IP 为 inactive
-                IP.query.filter(
-                    IP.ip_address.notin_(scanned_ips),
-                    IP.status != 'inactive'
-                ).update({
-                    'status': 'inactive',
-                    'last_scanned': datetime.utcnow()
-                }, synchronize_session=False)
-                
-                db.session.commit()
-                logger.info(f"Saved discovery results for job {self.job_id}")
-            except Exception as e:
-                db.session.rollback()
-                logger.error(f"Database error saving discovery results for job {self.job_id}: {str(e)}")
-        except Exception as e:
-            logger.error(f"Error saving discovery results for job {self.job_id}: {str(e)}")
+        self.writer.job_user_id = self.job_user_id
+        if self.targets == self.subnet:
+            self.writer.save_discovery_result(active_hosts)
+        else:
+            # 切片扫描只将切片内未响应的地址标记为 inactive
+            slice_hosts = [
+                str(ip) for target in self.targets.split()
+                for ip in ipaddress.ip_network(target, strict=False)
+            ]
+            self.writer.save_discovery_result(
+                active_hosts,
+                inactive_hosts=slice_hosts,
+                mark_missing_inactive=False
+            )
     
     def execute(self):
         """执行扫描任务"""
@@ -566,10 +655,13 @@ class ScanExecutor:
             logger.error(f"Error executing scan for job {self.job_id}: {str(e)}")
             return False
     
-    def _trigger_auto_collection(self):
+    def _trigger_auto_collection(self, ip_addresses: Optional[list] = None):
         """
         触发自动信息采集
         检查扫描结果中绑定了凭证的主机，自动触发信息采集
+
+        Args:
+            ip_addresses: 只处理这些 IP 的扫描结果，None 表示处理全部；已触发过的主机不会重复采集
         """
         try:
             from app.models.models import HostInfo
@@ -581,10 +673,16 @@ class ScanExecutor:
                 return
             
             # 获取扫描任务的所有结果
-            scan_results = ScanResult.query.filter_by(
+            query = ScanResult.query.filter_by(
                 job_id=self.job_id,
                 deleted=False
-            ).all()
+            )
+            if ip_addresses is not None:
+                query = query.filter(ScanResult.ip_address.in_(ip_addresses))
+            scan_results = [
+                result for result in query.all()
+                if result.ip_address not in self.auto_collected_ips
+            ]
             
             if not scan_results:
                 logger.debug(f"Job {self.job_id}: No scan results found for auto collection")
@@ -593,6 +691,7 @@ class ScanExecutor:
             # 为每个扫描结果查找或创建HostInfo，并检查是否有绑定凭证
             host_ids_to_collect = []
             for result in scan_results:
+                self.auto_collected_ips.add(result.ip_address)
                 try:
                     # 查找IP对应的HostInfo
                     ip_obj = IP.query.filter_by(ip_address=result.ip_address, deleted=False).first()
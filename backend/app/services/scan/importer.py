@@ -0,0 +1,295 @@
+import os
+import ipaddress
+import xml.etree.ElementTree as ET
+
+from typing import Optional, Dict, Iterator, Tuple, IO, Union
+from datetime import datetime
+
+from flask import current_app
+from app.models.models import db, ScanJob, ScanSubnet, ScanPolicy
+from app.core.utils.logger import app_logger as logger
+from app.services.scan.writer import ScanResultWriter
+
+
+class NmapXmlImporter:
+    """nmap XML 离线导入器
+
+    使用 iterparse 流式解析 nmap -oX 输出，每解析完一个 <host> 即转换为
+    python-nmap 格式的主机数据并释放对应的 XML 节点，内存占用与文件大小无关。
+    解析结果通过 ScanResultWriter 分批写入，与在线扫描产生的数据完全一致。
+    """
+
+    def __init__(self, job_id: str, subnet: str, chunk_size: int = 500):
+        self.job_id = job_id
+        self.subnet = subnet
+        self.chunk_size = max(int(chunk_size), 1)
+        self.writer = ScanResultWriter(job_id, subnet)
+        try:
+            self.network = ipaddress.ip_network(subnet, strict=False)
+        except ValueError:
+            self.network = None
+        self.stats = {
+            'hosts_total': 0,
+            'hosts_up': 0,
+            'hosts_down': 0,
+            'hosts_skipped': 0,
+            'results_saved': 0
+        }
+
+    @staticmethod
+    def _parse_host(host_elem) -> Tuple[Optional[str], Dict]:
+        """将 <host> 节点转换为 python-nmap 的 scan[ip] 格式"""
+        host_data = {
+            'hostnames': [],
+            'addresses': {},
+            'vendor': {},
+            'status': {'state': '', 'reason': ''},
+            'tcp': {}
+        }
+
+        status = host_elem.find('status')
+        if status is not None:
+            host_data['status'] = {
+                'state': status.get('state', ''),
+                'reason': status.get('reason', '')
+            }
+
+        ip = None
+        for address in host_elem.findall('address'):
+            addrtype = address.get('addrtype')
+            addr = address.get('addr')
+            if addrtype == 'ipv4':
+                ip = addr
+                host_data['addresses']['ipv4'] = addr
+            elif addrtype == 'mac':
+                host_data['addresses']['mac'] = addr
+                if address.get('vendor'):
+                    host_data['vendor'][addr] = address.get('vendor')
+
+        hostnames = host_elem.find('hostnames')
+        if hostnames is not None:
+            for hostname in hostnames.findall('hostname'):
+                host_data['hostnames'].append({
+                    'name': hostname.get('name', ''),
+                    'type': hostname.get('type', '')
+                })
+
+        ports = host_elem.find('ports')
+        if ports is not None:
+            for port in ports.findall('port'):
+                if port.get('protocol') != 'tcp':
+                    continue
+                state = port.find('state')
+                service = port.find('service')
+                host_data['tcp'][int(port.get('portid'))] = {
+                    'state': state.get('state', '') if state is not None else '',
+                    'reason': state.get('reason', '') if state is not None else '',
+                    'name': service.get('name', '') if service is not None else '',
+                    'product': service.get('product', '') if service is not None else '',
+                    'version': service.get('version', '') if service is not None else '',
+                    'extrainfo': service.get('extrainfo', '') if service is not None else '',
+                    'conf': service.get('conf', '') if service is not None else '',
+                    'cpe': ' '.join(c.text or '' for c in service.findall('cpe')) if service is not None else ''
+                }
+
+        os_elem = host_elem.find('os')
+        if os_elem is not None:
+            host_data['osmatch'] = [
+                {'name': m.get('name', ''), 'accuracy': m.get('accuracy', '')}
+                for m in os_elem.findall('osmatch')
+            ]
+
+        return ip, host_data
+
+    @classmethod
+    def iter_hosts(cls, source: Union[str, IO]) -> Iterator[Tuple[str, Dict]]:
+        """流式遍历 nmap XML 中的主机
+
+        Args:
+            source: 文件路径或二进制文件对象
+
+        Yields:
+            Tuple[str, Dict]: (IPv4 地址, python-nmap 格式的主机数据)
+        """
+        root = None
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag != 'host':
+                continue
+            ip, host_data = cls._parse_host(elem)
+            # 释放已处理的节点，保持内存平稳
+            elem.clear()
+            if root is not None:
+                root.clear()
+            yield ip, host_data
+
+    def run(self, source: Union[str, IO], total_bytes: int = 0) -> Dict:
+        """执行导入
+
+        Args:
+            source: 文件路径或二进制文件对象
+            total_bytes: 文件总大小，用于估算进度
+
+        Returns:
+            Dict: 导入统计信息
+        """
+        if isinstance(source, str):
+            total_bytes = total_bytes or os.path.getsize(source)
+            with open(source, 'rb') as f:
+                return self._run(f, total_bytes)
+        return self._run(source, total_bytes)
+
+    def _run(self, f: IO, total_bytes: int) -> Dict:
+        up_hosts = []
+        down_hosts = []
+        for ip, host_data in self.iter_hosts(f):
+            self.stats['hosts_total'] += 1
+            if not ip or (self.network and ipaddress.ip_address(ip) not in self.network):
+                self.stats['hosts_skipped'] += 1
+                continue
+
+            if host_data['status']['state'] == 'up':
+                up_hosts.append((ip, host_data))
+            else:
+                down_hosts.append(ip)
+
+            if len(up_hosts) + len(down_hosts) >= self.chunk_size:
+                self._flush(up_hosts, down_hosts, self._estimate_progress(f, total_bytes))
+                up_hosts, down_hosts = [], []
+
+        self._flush(up_hosts, down_hosts, 100)
+        return self.stats
+
+    @staticmethod
+    def _estimate_progress(f: IO, total_bytes: int) -> int:
+        """根据已读取字节数估算进度"""
+        try:
+            if total_bytes:
+                return min(int(f.tell() * 100 / total_bytes), 99)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def _flush(self, up_hosts: list, down_hosts: list, progress: int):
+        """将一批主机写入数据库并在同一事务中提交"""
+        if not up_hosts and not down_hosts and progress < 100:
+            return
+
+        if not self.writer.save_discovery_result(
+            [ip for ip, _ in up_hosts],
+            inactive_hosts=down_hosts,
+            mark_missing_inactive=False,
+            commit=False
+        ):
+            raise RuntimeError(f"Failed to save discovery results for job {self.job_id}")
+
+        for ip, host_data in up_hosts:
+            open_ports = self.writer.get_open_ports(host_data)
+            if open_ports and self.writer.save_result(ip, open_ports, host_data, commit=False):
+                self.stats['results_saved'] += 1
+
+        self.stats['hosts_up'] += len(up_hosts)
+        self.stats['hosts_down'] += len(down_hosts)
+
+        job = ScanJob.query.get(self.job_id)
+        if job:
+            job.progress = progress
+            job.machines_found = self.stats['results_saved']
+        db.session.commit()
+        logger.debug(f"Job {self.job_id}: Imported {self.stats['hosts_total']} hosts, progress {progress}%")
+
+
+def create_import_job(subnet_id: str, user_id: str, policy_id: Optional[str] = None,
+                      is_admin: bool = False) -> ScanJob:
+    """为离线导入创建扫描任务记录
+
+    Args:
+        subnet_id: 网段ID
+        user_id: 用户ID，网段和策略须属于该用户
+        policy_id: 策略ID，未指定时使用关联该网段的策略
+        is_admin: 管理员可以导入到任意用户的网段和策略
+
+    Returns:
+        ScanJob: 新建的扫描任务
+
+    Raises:
+        ValueError: 网段或策略不存在或不属于该用户时
+    """
+    owner = {} if is_admin else {'user_id': user_id}
+    subnet = ScanSubnet.query.filter_by(id=subnet_id, deleted=False, **owner).first()
+    if not subnet:
+        raise ValueError(f"Subnet {subnet_id} not found")
+
+    if policy_id:
+        policy = ScanPolicy.query.filter_by(id=policy_id, deleted=False, **owner).first()
+    else:
+        policy = subnet.policies.filter_by(deleted=False, **owner).first()
+    if not policy:
+        raise ValueError(f"No scan policy found for subnet {subnet_id}")
+
+    job = ScanJob(
+        user_id=user_id,
+        policy_id=policy.id,
+        subnet_id=subnet.id,
+        status='pending',
+        start_time=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def import_nmap_xml(job_id: str, source: Union[str, IO], chunk_size: Optional[int] = None) -> Dict:
+    """将 nmap XML 导入到指定扫描任务，需在应用上下文中调用
+
+    Args:
+        job_id: 扫描任务ID
+        source: 文件路径或二进制文件对象
+        chunk_size: 每批提交的主机数
+
+    Returns:
+        Dict: 导入统计信息
+    """
+    job = ScanJob.query.get(job_id)
+    if not job:
+        raise ValueError(f"Job {job_id} not found")
+
+    chunk_size = chunk_size or current_app.config.get('SCAN_IMPORT_CHUNK_SIZE', 500)
+    importer = NmapXmlImporter(job.id, job.subnet.subnet, chunk_size=chunk_size)
+
+    job.status = 'running'
+    db.session.commit()
+    try:
+        stats = importer.run(source)
+        job = ScanJob.query.get(job_id)
+        job.status = 'completed'
+        job.progress = 100
+        job.end_time = datetime.utcnow()
+        db.session.commit()
+        logger.info(f"Job {job_id}: Nmap XML import completed: {stats}")
+    except Exception as e:
+        db.session.rollback()
+        job = ScanJob.query.get(job_id)
+        if job:
+            job.status = 'failed'
+            job.error_message = str(e)[:255]
+            job.end_time = datetime.utcnow()
+            db.session.commit()
+        logger.error(f"Job {job_id}: Nmap XML import failed: {str(e)}")
+        raise
+
+    # 导入完成后发送一条汇总通知，避免逐个 IP 发送
+    notification_manager = getattr(current_app, 'notification_manager', None)
+    if notification_manager:
+        notification_manager.create_notification(
+            user_id=job.user_id,
+            title="扫描结果导入完成",
+            content=f"网段 {job.subnet.subnet} 导入完成，共解析 {stats['hosts_total']} 台主机，"
+                    f"存活 {stats['hosts_up']} 台，发现开放端口 {stats['results_saved']} 台",
+            type="scan",
+            commit=True
+        )
+    return stats
@@ -0,0 +1,187 @@
+import json
+import ipaddress
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+
+from app.models.models import db, ScanResult
+from app.core.utils.logger import app_logger as logger
+
+
+class ScanResultIngestor:
+    """扫描结果批量写入器
+
+    逐行校验外部扫描器推送的结果，按块使用 bulk_insert_mappings 写入，
+    每块单独提交，不在会话中保留 ORM 对象，内存占用与上传大小无关。
+    """
+
+    # 每个请求最多返回的错误明细条数
+    MAX_ERRORS = 100
+
+    def __init__(self, job_id: str, chunk_size: int = 500):
+        self.job_id = job_id
+        self.chunk_size = max(int(chunk_size), 1)
+        self.accepted = 0
+        self.rejected = 0
+        self.chunks = []
+        self.errors = []
+        self._pending = []
+        self._chunk_rejected = 0
+
+    @staticmethod
+    def normalize_row(row) -> Tuple[Optional[Dict], Optional[str]]:
+        """校验并转换单条结果
+
+        支持两种端口格式：open_ports 字典/列表，或旧接口的 port/protocol/service 平铺字段。
+
+        Returns:
+            Tuple[Optional[Dict], Optional[str]]: (写入映射, 错误信息)
+        """
+        if not isinstance(row, dict):
+            return None, '记录必须是 JSON 对象'
+
+        ip_address = row.get('ip_address')
+        if not ip_address or not isinstance(ip_address, str):
+            return None, '缺少 ip_address'
+        try:
+            ip_address = str(ipaddress.ip_address(ip_address.strip()))
+        except ValueError:
+            return None, f'无效的 IP 地址: {ip_address}'
+
+        open_ports = row.get('open_ports')
+        if open_ports is None and row.get('port') is not None:
+            open_ports = [{
+                'port': row.get('port'),
+                'protocol': row.get('protocol'),
+                'service': row.get('service'),
+                'version': row.get('version'),
+                'banner': row.get('banner'),
+                'state': 'open'
+            }]
+
+        ports_info = {}
+        if isinstance(open_ports, dict):
+            items = [dict(info or {}, port=port) for port, info in open_ports.items()]
+        elif isinstance(open_ports, list):
+            items = [p if isinstance(p, dict) else {'port': p} for p in open_ports]
+        elif open_ports is None:
+            items = []
+        else:
+            return None, 'open_ports 格式无效'
+
+        for item in items:
+            try:
+                port = int(item.get('port'))
+            except (TypeError, ValueError):
+                return None, f"无效的端口: {item.get('port')}"
+            if not 0 < port < 65536:
+                return None, f'端口超出范围: {port}'
+            ports_info[str(port)] = {
+                'protocol': item.get('protocol') or 'tcp',
+                'service': item.get('service') or '',
+                'version': item.get('version') or '',
+                'banner': item.get('banner') or '',
+                'state': item.get('state') or 'open'
+            }
+
+        status = row.get('status') or 'up'
+        if status not in ('up', 'down'):
+            return None, f'无效的状态: {status}'
+
+        os_info = row.get('os_info')
+        if os_info is not None:
+            os_info = str(os_info)[:255]
+
+        now = datetime.utcnow()
+        return {
+            'job_id': None,
+            'ip_address': ip_address,
+            'open_ports': ports_info,
+            'os_info': os_info,
+            'status': status,
+            'raw_data': row.get('raw_data'),
+            'deleted': False,
+            'created_at': now,
+            'updated_at': now
+        }, None
+
+    def add_row(self, row, line_no: int):
+        """添加一条结果，满一块时自动写入"""
+        mapping, error = self.normalize_row(row)
+        if error:
+            self._reject(line_no, error)
+        else:
+            mapping['job_id'] = self.job_id
+            self._pending.append(mapping)
+
+        if len(self._pending) + self._chunk_rejected >= self.chunk_size:
+            self.flush()
+
+    def add_line(self, line: bytes, line_no: int):
+        """解析并添加一行 NDJSON"""
+        line = line.strip()
+        if not line:
+            return
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            self._reject(line_no, f'JSON 解析失败: {str(e)}')
+            if self._chunk_rejected >= self.chunk_size:
+                self.flush()
+            return
+        self.add_row(row, line_no)
+
+    def ingest_lines(self, lines: Iterable[bytes]) -> Dict:
+        """逐行读取 NDJSON 并写入"""
+        for line_no, line in enumerate(lines, 1):
+            self.add_line(line, line_no)
+        self.flush()
+        return self.summary()
+
+    def ingest_rows(self, rows: List) -> Dict:
+        """写入已解析的结果列表"""
+        for index, row in enumerate(rows, 1):
+            self.add_row(row, index)
+        self.flush()
+        return self.summary()
+
+    def flush(self):
+        """写入当前块并提交"""
+        if not self._pending and not self._chunk_rejected:
+            return
+        accepted = len(self._pending)
+        if self._pending:
+            try:
+                db.session.bulk_insert_mappings(ScanResult, self._pending)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Job {self.job_id}: Failed to insert result chunk {len(self.chunks) + 1}: {str(e)}")
+                self.rejected += accepted
+                self._chunk_rejected += accepted
+                accepted = 0
+                if len(self.errors) < self.MAX_ERRORS:
+                    self.errors.append({'chunk': len(self.chunks) + 1, 'error': str(e)})
+
+        self.accepted += accepted
+        self.chunks.append({
+            'chunk': len(self.chunks) + 1,
+            'accepted': accepted,
+            'rejected': self._chunk_rejected
+        })
+        self._pending = []
+        self._chunk_rejected = 0
+
+    def summary(self) -> Dict:
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'chunks': self.chunks,
+            'errors': self.errors
+        }
+
+    def _reject(self, line_no: int, error: str):
+        self.rejected += 1
+        self._chunk_rejected += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({'line': line_no, 'error': error})
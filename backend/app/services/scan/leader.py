@@ -0,0 +1,136 @@
+import os
+import socket
+import threading
+import time
+import uuid
+
+from typing import Callable, Optional
+
+from app.services.redis.manager import RedisManager
+from app.core.utils.logger import app_logger as logger
+
+# 仅当锁仍由自己持有时才续期/释放
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElector:
+    """基于 Redis 锁的主节点选举
+
+    每个进程以唯一标识竞争同一个带过期时间的 Redis 键，持有者定期续期；
+    持有者退出或失联后，键在 ttl 内过期，其他进程即可接管。
+    Redis 不可用时不成为主节点（fail closed），持续重试获取锁；主节点超过 ttl
+    未能续期时主动降级，避免锁过期后与接管的进程同时触发调度。
+    on_tick 只在主节点的每个选举周期调用，on_cycle 在所有进程的每个选举周期调用。
+    """
+
+    def __init__(self, key: str, ttl: int = 15, on_elected: Optional[Callable] = None,
+                 on_demoted: Optional[Callable] = None, on_tick: Optional[Callable] = None,
+                 on_cycle: Optional[Callable] = None):
+        self.key = key
+        self.ttl = max(int(ttl), 3)
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.on_tick = on_tick
+        self.on_cycle = on_cycle
+        self.is_leader = False
+        self.app = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, app):
+        """启动选举线程"""
+        self.app = app
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='scheduler_leader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止选举并释放锁"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        if self.is_leader:
+            try:
+                with self.app.app_context():
+                    RedisManager.get_redis().eval(RELEASE_SCRIPT, 1, self.key, self.identity)
+            except Exception as e:
+                logger.warning(f"Failed to release leader lock {self.key}: {str(e)}")
+            self._set_leader(False)
+
+    def get_leader(self) -> Optional[str]:
+        """获取当前主节点标识"""
+        try:
+            with self.app.app_context():
+                return RedisManager.get(self.key)
+        except Exception:
+            return self.identity if self.is_leader else None
+
+    def _try_acquire(self) -> bool:
+        with self.app.app_context():
+            redis_client = RedisManager.get_redis()
+            ttl_ms = self.ttl * 1000
+            if self.is_leader:
+                if redis_client.eval(RENEW_SCRIPT, 1, self.key, self.identity, ttl_ms):
+                    return True
+            return bool(redis_client.set(self.key, self.identity, nx=True, px=ttl_ms))
+
+    def _run(self):
+        interval = max(self.ttl / 3, 1)
+        renewed_at = None
+        failing = False
+        while not self._stop.is_set():
+            try:
+                leader = self._try_acquire()
+                if leader:
+                    renewed_at = time.monotonic()
+                self._set_leader(leader)
+                if failing:
+                    logger.info(f"Leader election for {self.key} recovered")
+                failing = False
+            except Exception as e:
+                # Redis 不可用时不成为主节点，保持当前角色并继续重试
+                if not failing:
+                    logger.warning(f"Leader election for {self.key} failed, retrying: {str(e)}")
+                failing = True
+                if self.is_leader and (renewed_at is None or time.monotonic() - renewed_at >= self.ttl):
+                    # 锁已过期，其他进程可能已接管
+                    logger.warning(f"Leader lock {self.key} could not be renewed within {self.ttl}s, stepping down")
+                    self._set_leader(False)
+            if self.is_leader and self.on_tick:
+                try:
+                    self.on_tick()
+                except Exception as e:
+                    logger.error(f"Leader tick callback failed: {str(e)}")
+            if self.on_cycle:
+                try:
+                    self.on_cycle()
+                except Exception as e:
+                    logger.warning(f"Leader election cycle callback failed: {str(e)}")
+            self._stop.wait(interval)
+
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        callback = self.on_elected if leader else self.on_demoted
+        logger.info(f"Process {self.identity} {'acquired' if leader else 'lost'} leadership of {self.key}")
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Leader {'elected' if leader else 'demoted'} callback failed: {str(e)}")
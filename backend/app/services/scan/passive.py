@@ -0,0 +1,263 @@
+import os
+import re
+import csv
+import ipaddress
+
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from datetime import datetime, timedelta
+
+from app.models.models import db, IP
+from app.core.utils.logger import app_logger as logger
+
+IPV4_RE = re.compile(r'(?<![\d.])((?:\d{1,3}\.){3}\d{1,3})(?![\d.])')
+MAC_RE = re.compile(r'(?<![0-9A-Fa-f])((?:[0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2})(?![0-9A-Fa-f])')
+ISC_TIME_RE = re.compile(r'\d+ (\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})')
+
+# 一次观测：(IP, MAC, 观测时间)
+Observation = Tuple[str, Optional[str], datetime]
+
+
+def _normalize_mac(mac: Optional[str]) -> Optional[str]:
+    if not mac:
+        return None
+    mac = mac.replace('-', ':').lower()
+    if mac in ('00:00:00:00:00:00', 'ff:ff:ff:ff:ff:ff'):
+        return None
+    return mac
+
+
+def _decode(line) -> str:
+    return line.decode('utf-8', errors='ignore') if isinstance(line, bytes) else line
+
+
+def parse_arp(lines: Iterable, observed_at: Optional[datetime] = None) -> Iterator[Observation]:
+    """解析 ARP 表导出
+
+    兼容 `ip neigh`、`arp -an`、/proc/net/arp 以及 Windows `arp -a` 的输出，
+    每行取第一个 IPv4 和 MAC 地址，跳过未完成解析的条目。
+    """
+    observed_at = observed_at or datetime.utcnow()
+    for line in lines:
+        line = _decode(line)
+        upper = line.upper()
+        if 'INCOMPLETE' in upper or 'FAILED' in upper:
+            continue
+        ip_match = IPV4_RE.search(line)
+        mac_match = MAC_RE.search(line)
+        if not ip_match or not mac_match:
+            continue
+        mac = _normalize_mac(mac_match.group(1))
+        if mac:
+            yield ip_match.group(1), mac, observed_at
+
+
+def _parse_isc_time(value: str) -> Optional[datetime]:
+    match = ISC_TIME_RE.search(value)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%Y/%m/%d %H:%M:%S')
+
+
+def parse_isc_leases(lines: Iterable, now: Optional[datetime] = None) -> Iterator[Observation]:
+    """解析 ISC dhcpd.leases，只返回仍处于 active 状态且未过期的租约
+
+    观测时间取 cltt（客户端最后交互时间），缺失时使用 starts。
+    """
+    now = now or datetime.utcnow()
+    lease = None
+    for line in lines:
+        line = _decode(line).strip()
+        if line.startswith('lease ') and line.endswith('{'):
+            lease = {'ip': line.split()[1]}
+            continue
+        if lease is None:
+            continue
+        if line == '}':
+            state = lease.get('state', 'active')
+            ends = lease.get('ends')
+            seen = lease.get('cltt') or lease.get('starts')
+            if state == 'active' and (ends is None or ends > now) and seen:
+                yield lease['ip'], lease.get('mac'), seen
+            lease = None
+            continue
+
+        line = line.rstrip(';')
+        if line.startswith('binding state '):
+            lease['state'] = line.split()[-1]
+        elif line.startswith('hardware ethernet '):
+            lease['mac'] = _normalize_mac(line.split()[-1])
+        elif line.startswith(('starts ', 'ends ', 'cltt ')):
+            key = line.split(' ', 1)[0]
+            lease[key] = _parse_isc_time(line)
+
+
+def parse_kea_leases(lines: Iterable, now: Optional[datetime] = None) -> Iterator[Observation]:
+    """解析 Kea memfile 租约 CSV（kea-leases4.csv），只返回 state 为 0 且未过期的租约
+
+    观测时间为 expire - valid_lifetime，即最近一次续租时间。
+    """
+    now = now or datetime.utcnow()
+    reader = csv.DictReader(_decode(line) for line in lines)
+    for row in reader:
+        try:
+            expire = datetime.utcfromtimestamp(int(row.get('expire') or 0))
+            lifetime = int(row.get('valid_lifetime') or 0)
+            state = int(row.get('state') or 0)
+        except (TypeError, ValueError):
+            continue
+        if state != 0 or expire <= now:
+            continue
+        yield row.get('address'), _normalize_mac(row.get('hwaddr')), expire - timedelta(seconds=lifetime)
+
+
+PARSERS = {
+    'arp': parse_arp,
+    'isc': parse_isc_leases,
+    'kea': parse_kea_leases
+}
+
+
+class PassiveLivenessIngestor:
+    """被动存活信息写入器
+
+    将 ARP/DHCP 观测按块合并后批量更新 IP 表的状态、last_scanned、MAC 地址
+    和 last_seen_passive，不存在的 IP 以 unclaimed 状态创建。
+    """
+
+    def __init__(self, chunk_size: int = 500):
+        self.chunk_size = max(int(chunk_size), 1)
+        self.stats = {'observations': 0, 'invalid': 0, 'updated': 0, 'created': 0}
+        self._pending = {}
+
+    def ingest(self, observations: Iterable[Observation]) -> Dict:
+        for ip_address, mac, seen_at in observations:
+            self.stats['observations'] += 1
+            try:
+                ip_address = str(ipaddress.IPv4Address(ip_address))
+            except (ValueError, TypeError):
+                self.stats['invalid'] += 1
+                continue
+            # 同一块内同一 IP 只保留最新的观测
+            current = self._pending.get(ip_address)
+            if not current or seen_at > current[1]:
+                self._pending[ip_address] = (mac or (current[0] if current else None), seen_at)
+            if len(self._pending) >= self.chunk_size:
+                self.flush()
+        self.flush()
+        return self.stats
+
+    def flush(self):
+        if not self._pending:
+            return
+        try:
+            existing = {
+                ip.ip_address: ip for ip in IP.query.filter(IP.ip_address.in_(list(self._pending))).all()
+            }
+            for ip_address, (mac, seen_at) in self._pending.items():
+                ip = existing.get(ip_address)
+                if ip is None:
+                    db.session.add(IP(
+                        ip_address=ip_address,
+                        status='unclaimed',
+                        mac_address=mac,
+                        last_scanned=seen_at,
+                        last_seen_passive=seen_at
+                    ))
+                    self.stats['created'] += 1
+                    continue
+                if ip.last_seen_passive and ip.last_seen_passive >= seen_at:
+                    continue
+                ip.last_seen_passive = seen_at
+                if not ip.last_scanned or ip.last_scanned < seen_at:
+                    ip.last_scanned = seen_at
+                if mac:
+                    ip.mac_address = mac
+                if ip.status == 'inactive':
+                    ip.status = 'unclaimed'
+                self.stats['updated'] += 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error saving passive liveness observations: {str(e)}")
+            raise
+        finally:
+            self._pending = {}
+
+
+def ingest_passive_source(source_format: str, lines: Iterable, chunk_size: int = 500) -> Dict:
+    """解析并写入一个被动存活数据源，需在应用上下文中调用
+
+    Args:
+        source_format: 数据格式 arp/isc/kea
+        lines: 文件行迭代器
+        chunk_size: 每批提交的 IP 数
+
+    Returns:
+        Dict: 写入统计信息
+
+    Raises:
+        ValueError: 格式不支持时
+    """
+    parser = PARSERS.get(source_format)
+    if not parser:
+        raise ValueError(f"Unsupported passive source format: {source_format}")
+    return PassiveLivenessIngestor(chunk_size).ingest(parser(lines))
+
+
+def get_passive_fresh_hosts(subnet: str, freshness_seconds: int) -> list:
+    """获取子网中在新鲜度窗口内被被动观测到的 IP
+
+    Args:
+        subnet: 子网 CIDR
+        freshness_seconds: 新鲜度窗口（秒）
+
+    Returns:
+        list: IP 地址列表
+    """
+    if freshness_seconds <= 0:
+        return []
+    network = ipaddress.ip_network(subnet, strict=False)
+    since = datetime.utcnow() - timedelta(seconds=freshness_seconds)
+    rows = db.session.query(IP.ip_address).filter(
+        IP.last_seen_passive >= since,
+        IP.deleted == False
+    ).yield_per(1000)
+    return [ip for (ip,) in rows if ipaddress.ip_address(ip) in network]
+
+
+class PassiveSourceWatcher:
+    """定时读取配置的被动数据源文件，文件未变化时跳过"""
+
+    def __init__(self):
+        self._mtimes = {}
+
+    @staticmethod
+    def parse_sources(value: str) -> list:
+        """解析 PASSIVE_LIVENESS_SOURCES 配置，格式为 "arp:/path,isc:/path" """
+        sources = []
+        for item in (value or '').split(','):
+            item = item.strip()
+            if not item or ':' not in item:
+                continue
+            source_format, path = item.split(':', 1)
+            sources.append((source_format.strip(), path.strip()))
+        return sources
+
+    def run(self, app):
+        with app.app_context():
+            chunk_size = app.config.get('PASSIVE_LIVENESS_CHUNK_SIZE', 500)
+            for source_format, path in self.parse_sources(app.config.get('PASSIVE_LIVENESS_SOURCES', '')):
+                try:
+                    mtime = os.path.getmtime(path)
+                    if self._mtimes.get(path) == mtime:
+                        continue
+                    with open(path, 'rb') as f:
+                        stats = ingest_passive_source(source_format, f, chunk_size)
+                    self._mtimes[path] = mtime
+                    logger.info(f"Ingested passive source {path}: {stats}")
+                except Exception as e:
+                    logger.error(f"Error ingesting passive source {path}: {str(e)}")
+
+
+# 创建全局被动数据源监视器实例
+passive_source_watcher = PassiveSourceWatcher()
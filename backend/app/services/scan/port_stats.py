@@ -0,0 +1,133 @@
+import time
+import threading
+
+from typing import Dict, List, Optional, Iterable
+
+from app.models.models import db, ScanJob, ScanResult
+from app.core.utils.logger import app_logger as logger
+
+
+def parse_ports(ports: str) -> List[int]:
+    """解析 nmap 端口表达式（如 "22,80,8000-8010"）为有序端口列表"""
+    result = set()
+    for part in str(ports).replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            result.update(range(int(start), int(end) + 1))
+        else:
+            result.add(int(part))
+    return sorted(p for p in result if 0 < p < 65536)
+
+
+def format_ports(ports: Iterable[int]) -> str:
+    """将端口列表压缩为 nmap 端口表达式，连续端口合并为区间"""
+    ports = sorted(set(ports))
+    parts = []
+    i = 0
+    while i < len(ports):
+        start = ports[i]
+        while i + 1 < len(ports) and ports[i + 1] == ports[i] + 1:
+            i += 1
+        end = ports[i]
+        parts.append(str(start) if start == end else f"{start}-{end}")
+        i += 1
+    return ','.join(parts)
+
+
+class PortStats:
+    """子网端口开放率统计
+
+    根据子网最近若干次扫描的 ScanResult 统计各端口的开放率，
+    结果按子网缓存，供 ScanExecutor 优先探测高开放率端口。
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_open_rates(self, subnet_id: str, history_jobs: int = 20, ttl: int = 3600) -> Dict[int, float]:
+        """获取子网各端口的历史开放率
+
+        Args:
+            subnet_id: 子网ID
+            history_jobs: 统计最近多少次已完成的扫描任务
+            ttl: 缓存时间（秒）
+
+        Returns:
+            Dict[int, float]: 端口 -> 开放率（开放该端口的主机数 / 有开放端口的主机数）
+        """
+        with self._lock:
+            cached = self._cache.get(subnet_id)
+            if cached and time.time() - cached[0] < ttl:
+                return cached[1]
+
+        rates = {}
+        try:
+            job_ids = [
+                job_id for (job_id,) in db.session.query(ScanJob.id).filter(
+                    ScanJob.subnet_id == subnet_id,
+                    ScanJob.status == 'completed',
+                    ScanJob.deleted == False
+                ).order_by(ScanJob.end_time.desc()).limit(history_jobs)
+            ]
+            if job_ids:
+                counts = {}
+                hosts = 0
+                query = db.session.query(ScanResult.open_ports).filter(
+                    ScanResult.job_id.in_(job_ids),
+                    ScanResult.deleted == False
+                ).yield_per(500)
+                for (open_ports,) in query:
+                    if not open_ports:
+                        continue
+                    hosts += 1
+                    for port in open_ports:
+                        try:
+                            port = int(port)
+                        except (TypeError, ValueError):
+                            continue
+                        counts[port] = counts.get(port, 0) + 1
+                if hosts:
+                    rates = {port: count / hosts for port, count in counts.items()}
+        except Exception as e:
+            logger.error(f"Error computing port statistics for subnet {subnet_id}: {str(e)}")
+            return {}
+
+        with self._lock:
+            self._cache[subnet_id] = (time.time(), rates)
+        return rates
+
+    def get_priority_ports(self, subnet_id: str, candidates: Optional[List[int]] = None, top_n: int = 10,
+                           history_jobs: int = 20, ttl: int = 3600) -> List[int]:
+        """获取子网中历史开放率最高的端口
+
+        Args:
+            subnet_id: 子网ID
+            candidates: 候选端口，None 表示不限制
+            top_n: 返回的端口数
+            history_jobs: 统计最近多少次扫描任务
+            ttl: 缓存时间（秒）
+
+        Returns:
+            List[int]: 按开放率降序排列的端口
+        """
+        rates = self.get_open_rates(subnet_id, history_jobs, ttl)
+        if candidates is not None:
+            candidate_set = set(candidates)
+            rates = {port: rate for port, rate in rates.items() if port in candidate_set}
+        ranked = sorted(rates.items(), key=lambda item: (-item[1], item[0]))
+        return [port for port, _ in ranked[:top_n]]
+
+    def invalidate(self, subnet_id: Optional[str] = None):
+        """清除缓存"""
+        with self._lock:
+            if subnet_id:
+                self._cache.pop(subnet_id, None)
+            else:
+                self._cache.clear()
+
+
+# 创建全局端口统计实例
+port_stats = PortStats()
@@ -1,17 +1,32 @@
 import json
+import sys
+import math
+import ipaddress
 import shutil
 import threading
 import time
+import atexit
+import uuid
+import psutil
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.models.models import db, ScanPolicy, ScanJob, ScanSubnet
 from app.tasks.task_manager import TaskManager
+from app.tasks.task_state import task_state
+from app.tasks.backpressure import backpressure
+from app.services.redis.manager import RedisManager
+from app.services.scan.passive import passive_source_watcher
+from app.services.scan.leader import LeaderElector
+from app.services.scan.triggers import OffsetCronTrigger, policy_offset
+from app.tasks.scheduler_telemetry import SchedulerTelemetry
 from app.core.utils.logger import app_logger as logger
-from app.core.error.errors import DatabaseError
+from app.core.error.errors import DatabaseError, QueueFullError
 
 # 配置调度器
 executors = {
@@ -24,15 +39,32 @@ job_defaults = {
     'misfire_grace_time': 60
 }
 
+# 各进程发布的策略调度遥测 {进程标识: 快照JSON}，以及最近一次重置时间
+TELEMETRY_KEY = 'ipams:scheduler:telemetry'
+TELEMETRY_RESET_KEY = 'ipams:scheduler:telemetry:reset'
+
+
+def policy_job_key(job_id: str) -> str:
+    """遥测分组键：推迟任务和连续扫描任务的ID带后缀，按策略合并统计"""
+    for kind in ('deferred', 'continuous'):
+        if f'_{kind}_' in job_id:
+            return f"{job_id.split(f'_{kind}_')[0]}_{kind}"
+    return job_id
+
 class PolicyScheduler:
     _instance = None
     _lock = threading.Lock()
     _initialized = False
     _running_jobs = set()
+    _continuous_cursors = {}  # Redis 不可用时的连续扫描游标
+    _continuous_jobs = {}  # 连续扫描各切片最近一次提交的任务ID
+    _waiting_policies = {}  # 被推迟的策略 {policy_id: (priority, expires_at)}，低优先级策略为其让行
+    _waiting_lock = threading.Lock()
     _scheduler_started = False
     _scheduler = None
     _max_retries = 3
     _retry_delay = 2  # 秒
+    _running_job_window = timedelta(hours=6)  # 准入控制只统计此时间内启动的任务，忽略异常残留的记录
 
     def __new__(cls):
         if cls._instance is None:
@@ -54,7 +86,10 @@ class PolicyScheduler:
                             )
                         self.scheduler = PolicyScheduler._scheduler
                         self.task_manager = TaskManager()
+                        self.telemetry = SchedulerTelemetry('policy', key_func=policy_job_key)
+                        self._telemetry_reset_at = time.time()
                         self.app = None
+                        self.elector = None
                         self._initialized = True
                         logger.info("PolicyScheduler initialized")
                     except Exception as e:
@@ -62,18 +97,40 @@ class PolicyScheduler:
                         raise
         
     def init_app(self, app):
-        """初始化应用实例"""
+        """初始化应用实例
+
+        调度器以暂停状态启动：所有进程都可以通过持久化作业存储增删策略任务，
+        只有通过 Redis 选举成为主节点的进程才会恢复调度并触发扫描。
+        """
         if not self.app:
             self.app = app
             retry_count = 0
             while retry_count < self._max_retries:
                 try:
                     if not self._scheduler_started and not self.scheduler.running:
-                        self.scheduler.start()
+                        self._configure_jobstores()
+                        self.telemetry.attach(
+                            self.scheduler,
+                            max_workers=executors['default']._pool._max_workers,
+                            max_jobs=app.config.get('SCHEDULER_TELEMETRY_MAX_JOBS', 500)
+                        )
+                        self.task_manager.on_job_finished(self._record_scan_run)
+                        self.scheduler.start(paused=True)
                         self._scheduler_started = True
-                        logger.debug("Scheduler started")
-                        # 在启动调度器后立即初始化任务
-                        self.init_scheduler()
+                        logger.debug("Scheduler started in paused mode")
+                        self._schedule_passive_sources()
+
+                        # 启动主节点选举，当选后加载策略并恢复调度
+                        self.elector = LeaderElector(
+                            key=app.config.get('SCHEDULER_LEADER_KEY', 'ipams:scheduler:leader'),
+                            ttl=app.config.get('SCHEDULER_LEADER_TTL', 15),
+                            on_elected=self._on_elected,
+                            on_demoted=self._on_demoted,
+                            on_tick=self.scheduler.wakeup,
+                            on_cycle=self._publish_telemetry
+                        )
+                        self.elector.start(app)
+                        atexit.register(self.shutdown)
                         break
                 except Exception as e:
                     retry_count += 1
@@ -85,41 +142,173 @@ class PolicyScheduler:
                             message="无法启动调度器",
                             details={'original_error': str(e)}
                         )
-    
+
+    def _configure_jobstores(self):
+        """配置作业存储：策略任务持久化到数据库，进程内任务保存在内存"""
+        jobstores = {'memory': MemoryJobStore()}
+        if self.app.config.get('SCHEDULER_JOBSTORE', 'sqlalchemy') == 'sqlalchemy':
+            url = self.app.config.get('SCHEDULER_JOBSTORE_URL') or self.app.config.get('SQLALCHEMY_DATABASE_URI')
+            jobstores['default'] = SQLAlchemyJobStore(url=url, tablename='apscheduler_jobs')
+        else:
+            jobstores['default'] = MemoryJobStore()
+        self.scheduler.configure(
+            jobstores=jobstores,
+            executors=executors,
+            job_defaults=job_defaults,
+            timezone=pytz.UTC
+        )
+
+    @property
+    def is_leader(self) -> bool:
+        return bool(self.elector and self.elector.is_leader)
+
+    def _on_elected(self):
+        """当选主节点：同步策略任务并恢复调度"""
+        self.init_scheduler()
+        self.scheduler.resume()
+        logger.info("Scheduler resumed on leader process")
+
+    def _on_demoted(self):
+        """失去主节点身份：暂停调度"""
+        self.scheduler.pause()
+        logger.info("Scheduler paused, process is no longer leader")
+
+    def _record_scan_run(self, job):
+        """记录策略扫描的实际执行耗时（结束时间 - 开始时间），包括合并到进行中扫描的任务"""
+        if job.policy_id:
+            self.telemetry.record_run(
+                str(job.policy_id),
+                (job.end_time - job.start_time).total_seconds(),
+                failed=job.status == 'failed'
+            )
+
+    def _publish_telemetry(self):
+        """将本进程的策略调度遥测写入 Redis，并执行其他进程发起的重置"""
+        redis_client = self.app.extensions.get('redis') if self.app else None
+        if not redis_client or not self.elector:
+            return
+        reset_at = float(redis_client.get(TELEMETRY_RESET_KEY) or 0)
+        if reset_at > self._telemetry_reset_at:
+            self._telemetry_reset_at = reset_at
+            self.telemetry.reset()
+        snapshot = self.telemetry.snapshot()
+        snapshot['published_at'] = time.time()
+        snapshot['is_leader'] = self.is_leader
+        redis_client.hset(TELEMETRY_KEY, self.elector.identity, json.dumps(snapshot))
+
+    def telemetry_snapshot(self) -> dict:
+        """合并所有进程的策略调度遥测
+
+        触发统计只在主节点产生，扫描耗时由执行扫描的进程记录；各进程在每个选举周期
+        发布快照，超过两个锁过期时间未更新的快照视为进程已退出。Redis 不可用时只返回本进程的统计。
+        """
+        identity = self.elector.identity if self.elector else None
+        merged = SchedulerTelemetry(self.telemetry.name, key_func=policy_job_key, max_jobs=self.telemetry.max_jobs)
+        merged.merge(self.telemetry.snapshot())
+        processes = [identity]
+        try:
+            redis_client = self.app.extensions.get('redis') if self.app else None
+            entries = redis_client.hgetall(TELEMETRY_KEY) if redis_client else {}
+            stale_before = time.time() - (self.elector.ttl if self.elector else 15) * 2
+            stale = []
+            for owner, data in entries.items():
+                if owner == identity:
+                    continue
+                snapshot = json.loads(data)
+                if snapshot.get('published_at', 0) < stale_before:
+                    stale.append(owner)
+                    continue
+                merged.merge(snapshot)
+                processes.append(owner)
+            if stale:
+                redis_client.hdel(TELEMETRY_KEY, *stale)
+        except Exception as e:
+            logger.warning(f"Failed to read scheduler telemetry of other processes: {str(e)}")
+        result = merged.snapshot()
+        result['processes'] = processes
+        return result
+
+    def reset_telemetry(self):
+        """重置所有进程的策略调度遥测，其他进程在下一个选举周期执行重置"""
+        self.telemetry.reset()
+        redis_client = self.app.extensions.get('redis') if self.app else None
+        if not redis_client:
+            return
+        now = time.time()
+        self._telemetry_reset_at = now
+        try:
+            redis_client.set(TELEMETRY_RESET_KEY, now)
+            redis_client.delete(TELEMETRY_KEY)
+        except Exception as e:
+            logger.warning(f"Failed to reset scheduler telemetry of other processes: {str(e)}")
+
+    def shutdown(self):
+        """停止选举并关闭调度器"""
+        try:
+            if self.elector:
+                self.elector.stop()
+            if self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+        except Exception as e:
+            logger.error(f"Error shutting down scheduler: {str(e)}")
+        try:
+            redis_client = self.app.extensions.get('redis') if self.app else None
+            if redis_client and self.elector:
+                redis_client.hdel(TELEMETRY_KEY, self.elector.identity)
+        except Exception as e:
+            logger.warning(f"Failed to remove scheduler telemetry: {str(e)}")
+
     def init_scheduler(self):
-        """初始化调度器，加载所有活动的策略"""
+        """同步调度器中的策略任务
+
+        持久化存储中已有的任务保持不变（保留其下次运行时间，接管时可补跑错过的触发），
+        补充缺失的活动策略任务，移除已删除或停用策略的任务。
+        """
         if not self.app:
             logger.error("Application not initialized")
             return
-            
+
         try:
             with self._lock:
-                # 检查是否已经在运行
-                existing_jobs = self.scheduler.get_jobs()
-                if existing_jobs:
-                    logger.debug(f"Scheduler already has {len(existing_jobs)} jobs, skipping initialization")
-                    return
-                    
                 with self.app.app_context():
                     # 获取所有活动的策略
                     policies = ScanPolicy.query.filter_by(
                         deleted=False,
                         status='active'
                     ).all()
-                    
-                    # 移除所有现有的任务
-                    for job in self.scheduler.get_jobs():
-                        self.scheduler.remove_job(job.id)
-                    
-                    # 重新调度所有活动的策略
+                    active_ids = {policy.id for policy in policies}
+
+                    # 移除已失效策略的任务
+                    for job in self.scheduler.get_jobs(jobstore='default'):
+                        if job.id.split('_')[0] not in active_ids:
+                            self.scheduler.remove_job(job.id, jobstore='default')
+                            logger.info(f"Removed stale job {job.id}")
+
+                    # 补充缺失的任务，已存在的任务会被跳过
                     for policy in policies:
-                        if not policy.deleted and policy.status == 'active':
-                            self.schedule_policy(policy)
-                        
-                    logger.debug(f"Initialized scheduler with {len(policies)} policies")
+                        self.schedule_policy(policy)
+
+                    logger.debug(f"Synchronized scheduler with {len(policies)} policies")
         except Exception as e:
             logger.error(f"Error initializing scheduler: {str(e)}")
-    
+
+    def _schedule_passive_sources(self):
+        """定时读取配置的 ARP/DHCP 被动数据源文件"""
+        if not self.app.config.get('PASSIVE_LIVENESS_SOURCES'):
+            return
+        try:
+            self.scheduler.add_job(
+                passive_source_watcher.run,
+                trigger=IntervalTrigger(seconds=self.app.config.get('PASSIVE_LIVENESS_INTERVAL', 300)),
+                id='passive_liveness_ingest',
+                args=[self.app],
+                jobstore='memory',
+                replace_existing=True
+            )
+            logger.debug("Scheduled passive liveness ingestion")
+        except Exception as e:
+            logger.error(f"Failed to schedule passive liveness ingestion: {str(e)}")
+
     def schedule_policy(self, policy):
         """调度单个策略"""
         try:
@@ -129,7 +318,11 @@ class PolicyScheduler:
                 return
 
             strategies = json.loads(policy.strategies) if isinstance(policy.strategies, str) else policy.strategies
-            for strategy in strategies:
+            for index, strategy in enumerate(strategies):
+                if strategy.get('type') == 'continuous':
+                    self._schedule_continuous(policy, index, strategy)
+                    continue
+
                 # 创建定时任务
                 job_id = f"{policy.id}_{strategy['cron']}"
                 
@@ -139,10 +332,14 @@ class PolicyScheduler:
                     continue
                 
                 try:
-                    # 添加 cron 触发器
-                    trigger = CronTrigger.from_crontab(strategy['cron'])
+                    # 添加 cron 触发器，按策略ID在抖动窗口内确定性偏移，避免整点集中触发
+                    window = int(strategy.get('jitter_seconds', self.app.config.get('SCHEDULER_JITTER_WINDOW', 300)))
+                    trigger = OffsetCronTrigger.from_crontab(
+                        strategy['cron'],
+                        offset_seconds=policy_offset(policy.id, window)
+                    )
                     self.scheduler.add_job(
-                        self.execute_policy,
+                        run_policy_job,
                         trigger=trigger,
                         id=job_id,
                         args=[policy.id, strategy],
@@ -155,7 +352,7 @@ class PolicyScheduler:
                         start_job_id = f"{job_id}_start"
                         if not self.scheduler.get_job(start_job_id):
                             self.scheduler.add_job(
-                                self.execute_policy,
+                                run_policy_job,
                                 trigger=DateTrigger(run_date=start_time),
                                 id=start_job_id,
                                 args=[policy.id, strategy],
@@ -170,8 +367,14 @@ class PolicyScheduler:
         except Exception as e:
             logger.error(f"Error scheduling policy {policy.id}: {str(e)}")
     
-    def execute_policy(self, policy_id, strategy):
-        """执行策略扫描"""
+    def execute_policy(self, policy_id, strategy, attempt=0):
+        """执行策略扫描
+
+        Args:
+            policy_id: 策略ID
+            strategy: 扫描策略
+            attempt: 因准入控制被推迟的次数，大于 0 表示这是一次推迟后的执行
+        """
         if not self.app:
             logger.error("Application not initialized")
             return
@@ -180,6 +383,7 @@ class PolicyScheduler:
         job_key = f"{policy_id}_{strategy.get('cron', '')}"
         if job_key in self._running_jobs:
             logger.warning(f"Policy {policy_id} is already running, skipping")
+            self.telemetry.record_skip(job_key, 'already_running')
             return
             
         try:
@@ -194,8 +398,10 @@ class PolicyScheduler:
                     status='running'
                 ).first()
                 
-                if running_jobs:
+                # 推迟后的执行是同一次触发的剩余部分，不受此限制
+                if running_jobs and not attempt:
                     logger.warning(f"Policy {policy.name} has running jobs, skipping")
+                    self.telemetry.record_skip(job_key, 'jobs_running')
                     # 创建失败的任务记录，说明跳过原因
                     self._create_failed_job(policy, strategy, "Policy has running jobs, skipping execution")
                     return
@@ -225,21 +431,44 @@ class PolicyScheduler:
                         # 如果没有指定子网，使用策略关联的所有子网
                         subnet_ids = [subnet.id for subnet in policy.subnets]
                     
+                    subnets = [ScanSubnet.query.get(subnet_id) for subnet_id in subnet_ids]
+                    subnet_ids = [subnet.id for subnet in subnets if subnet and not subnet.deleted]
+
+                    # 子网上已有兼容的扫描在执行时直接合并，不再重复探测
+                    if self.app.config.get('SCAN_COALESCE_ENABLED', True):
+                        pending_ids = []
+                        for subnet_id in subnet_ids:
+                            if not self.task_manager.attach_to_inflight(policy_id, subnet_id, scan_params):
+                                pending_ids.append(subnet_id)
+                        subnet_ids = pending_ids
+
+                    # 准入控制：根据运行中的扫描数、系统负载和扫描队列剩余位置决定本次可启动的子网数，其余推迟执行
+                    capacity = self._scan_capacity(policy)
+                    deferred_ids = subnet_ids[capacity:]
+                    subnet_ids = subnet_ids[:capacity]
+
                     # 为每个子网创建扫描任务
-                    for subnet_id in subnet_ids:
-                        subnet = ScanSubnet.query.get(subnet_id)
-                        if not subnet or subnet.deleted:
-                            continue
-                        
+                    for index, subnet_id in enumerate(subnet_ids):
                         try:
                             # 使用任务管理器执行扫描
                             self.task_manager.submit_scan_task(None, policy_id, subnet_id, scan_params)
+                        except QueueFullError:
+                            # 扫描队列被其他提交占满，剩余子网与未准入的子网一起推迟
+                            deferred_ids = subnet_ids[index:] + deferred_ids
+                            subnet_ids = subnet_ids[:index]
+                            break
                         except Exception as e:
                             error_msg = f"Failed to submit scan task for subnet {subnet_id}: {str(e)}"
                             logger.error(error_msg)
                             # 创建失败的任务记录
                             self._create_failed_job(policy, strategy, error_msg)
                             continue
+
+                    if deferred_ids:
+                        self._defer_policy(policy, strategy, deferred_ids, attempt)
+                        self.telemetry.record_skip(job_key, 'admission_deferred')
+                    else:
+                        self._clear_waiting(policy_id)
                         
                     logger.info(f"Executed policy {policy.name} for subnets {subnet_ids}")
                 finally:
@@ -256,6 +485,203 @@ class PolicyScheduler:
                 if policy:
                     self._create_failed_job(policy, strategy, str(e))
     
+    def _admission_capacity(self) -> int:
+        """根据运行中的扫描数和系统负载计算当前还可以启动的扫描数"""
+        try:
+            cpu_usage = psutil.cpu_percent(interval=None)
+            memory_usage = psutil.virtual_memory().percent
+            max_cpu = self.app.config.get('SCAN_ADMISSION_MAX_CPU', 85)
+            max_memory = self.app.config.get('SCAN_ADMISSION_MAX_MEMORY', 90)
+            if cpu_usage >= max_cpu or memory_usage >= max_memory:
+                logger.warning(f"System load too high (cpu {cpu_usage}%, memory {memory_usage}%), deferring scans")
+                return 0
+
+            max_running = self.app.config.get('SCAN_MAX_RUNNING', 10)
+            if max_running <= 0:
+                return sys.maxsize
+            running = ScanJob.query.filter(
+                ScanJob.status.in_(['pending', 'running']),
+                ScanJob.start_time >= datetime.utcnow() - self._running_job_window
+            ).count()
+            return max(max_running - running, 0)
+        except Exception as e:
+            logger.error(f"Error checking scan admission: {str(e)}")
+            return 1
+
+    def _scan_capacity(self, policy) -> int:
+        """本次可启动的扫描数：准入容量和扫描队列剩余位置取较小值，
+        有更高优先级的策略在等待时返回 0，让其先执行"""
+        capacity = min(self._admission_capacity(), backpressure.available('scan'))
+        if capacity > 0 and self._outranked(policy):
+            logger.debug(f"Policy {policy.name} yields to higher priority deferred policies")
+            return 0
+        return int(capacity)
+
+    def _outranked(self, policy) -> bool:
+        """是否有其他优先级更高的策略正在等待扫描队列"""
+        now = time.monotonic()
+        priority = policy.priority or 0
+        with self._waiting_lock:
+            for policy_id, (_, expires_at) in list(self._waiting_policies.items()):
+                if expires_at < now:
+                    self._waiting_policies.pop(policy_id, None)
+            return any(
+                waiting_priority > priority
+                for policy_id, (waiting_priority, _) in self._waiting_policies.items()
+                if policy_id != policy.id
+            )
+
+    def _clear_waiting(self, policy_id):
+        with self._waiting_lock:
+            self._waiting_policies.pop(policy_id, None)
+
+    def _defer_policy(self, policy, strategy, subnet_ids, attempt):
+        """将未准入的子网推迟到稍后执行"""
+        deferred_strategy = dict(strategy, subnet_ids=subnet_ids)
+        if attempt >= self.app.config.get('SCHEDULER_MAX_DEFERRALS', 30):
+            self._clear_waiting(policy.id)
+            self._create_failed_job(policy, deferred_strategy, "Deferred by admission control too many times, skipping execution")
+            return
+
+        delay = self.app.config.get('SCHEDULER_DEFER_SECONDS', 60)
+        # 登记等待中的策略，推迟执行前低优先级策略为其让出扫描队列；记录在两个推迟周期后过期
+        with self._waiting_lock:
+            self._waiting_policies[policy.id] = (policy.priority or 0, time.monotonic() + delay * 2)
+        job_id = f"{policy.id}_deferred_{uuid.uuid4().hex[:8]}"
+        self.scheduler.add_job(
+            run_policy_job,
+            trigger=DateTrigger(run_date=datetime.now(pytz.UTC) + timedelta(seconds=delay)),
+            id=job_id,
+            args=[policy.id, deferred_strategy, attempt + 1]
+        )
+        logger.info(f"Deferred {len(subnet_ids)} subnets of policy {policy.name} by {delay}s (attempt {attempt + 1})")
+
+    def _schedule_continuous(self, policy, index, strategy):
+        """调度连续扫描策略
+
+        按固定间隔触发，每次只扫描每个子网的一个切片，切片大小保证在
+        period_minutes 内覆盖整个子网。
+        """
+        job_id = f"{policy.id}_continuous_{index}"
+        if self.scheduler.get_job(job_id):
+            logger.warning(f"Job {job_id} already exists, skipping")
+            return
+
+        try:
+            interval = int(strategy.get('interval_seconds') or self.app.config.get('CONTINUOUS_SCAN_INTERVAL_SECONDS', 300))
+            start_date = None
+            if strategy.get('start_time'):
+                start_date = datetime.fromisoformat(strategy['start_time'].replace('Z', '+00:00'))
+                if start_date <= datetime.now(pytz.UTC):
+                    start_date = None
+
+            self.scheduler.add_job(
+                run_continuous_job,
+                trigger=IntervalTrigger(seconds=interval, start_date=start_date),
+                id=job_id,
+                args=[policy.id, strategy],
+                replace_existing=True
+            )
+            logger.debug(f"Scheduled continuous policy {policy.name} every {interval}s")
+        except Exception as e:
+            logger.error(f"Failed to schedule job {job_id}: {str(e)}")
+
+    def execute_continuous(self, policy_id, strategy):
+        """执行连续扫描的一个时间片"""
+        if not self.app:
+            logger.error("Application not initialized")
+            return
+
+        try:
+            with self.app.app_context():
+                policy = ScanPolicy.query.get(policy_id)
+                if not policy or policy.deleted or policy.status != 'active':
+                    return
+
+                if not shutil.which('nmap'):
+                    logger.error("nmap program not found in system path")
+                    return
+
+                interval = int(strategy.get('interval_seconds') or self.app.config.get('CONTINUOUS_SCAN_INTERVAL_SECONDS', 300))
+                period = int(strategy.get('period_minutes') or self.app.config.get('CONTINUOUS_SCAN_PERIOD_MINUTES', 1440)) * 60
+                scan_params = strategy.get('scan_params', {})
+
+                subnet_ids = strategy.get('subnet_ids', []) or [subnet.id for subnet in policy.subnets]
+                for subnet_id in subnet_ids:
+                    subnet = ScanSubnet.query.get(subnet_id)
+                    if not subnet or subnet.deleted:
+                        continue
+
+                    slice_key = f"{policy_id}:{subnet_id}"
+                    # 上一个切片仍在执行时跳过本次，不推进游标
+                    last_job_id = self._continuous_jobs.get(slice_key)
+                    if last_job_id and task_state.get_task(last_job_id)['status'] in ('pending', 'running'):
+                        logger.debug(f"Continuous slice for {slice_key} still running, skipping tick")
+                        self.telemetry.record_skip(f"{policy_id}_continuous", 'slice_running')
+                        continue
+
+                    if self._scan_capacity(policy) <= 0:
+                        logger.debug(f"Continuous slice for {slice_key} deferred by admission control")
+                        self.telemetry.record_skip(f"{policy_id}_continuous", 'admission_deferred')
+                        continue
+
+                    targets = self._next_slice(slice_key, subnet.subnet, interval, period)
+                    if not targets:
+                        continue
+
+                    try:
+                        job = self.task_manager.submit_scan_task(None, policy_id, subnet_id, scan_params, targets=targets)
+                        self._continuous_jobs[slice_key] = job.id
+                        logger.debug(f"Submitted continuous slice {targets} for policy {policy.name}")
+                    except Exception as e:
+                        logger.error(f"Failed to submit continuous slice for subnet {subnet_id}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error executing continuous policy {policy_id}: {str(e)}")
+
+    def _next_slice(self, slice_key, subnet, interval, period):
+        """计算下一个扫描切片并推进游标
+
+        Args:
+            slice_key: 游标键（策略ID:子网ID）
+            subnet: 子网 CIDR
+            interval: 触发间隔（秒）
+            period: 覆盖整个子网的目标周期（秒）
+
+        Returns:
+            str: 以空格分隔的 CIDR 列表
+        """
+        try:
+            network = ipaddress.ip_network(subnet, strict=False)
+        except ValueError as e:
+            logger.error(f"Invalid subnet {subnet}: {str(e)}")
+            return None
+
+        total = network.num_addresses
+        slice_size = max(1, math.ceil(total * interval / max(period, interval)))
+
+        redis_key = f"scan:continuous_cursor:{slice_key}"
+        cursor = None
+        try:
+            value = RedisManager.get(redis_key)
+            cursor = int(value) if value is not None else None
+        except Exception:
+            pass
+        if cursor is None:
+            cursor = self._continuous_cursors.get(slice_key, 0)
+        cursor = cursor % total
+
+        end = min(cursor + slice_size, total)
+        next_cursor = end % total
+        self._continuous_cursors[slice_key] = next_cursor
+        try:
+            RedisManager.set_with_ttl(redis_key, str(next_cursor), period * 2)
+        except Exception:
+            pass
+
+        first = network.network_address + cursor
+        last = network.network_address + end - 1
+        return ' '.join(str(net) for net in ipaddress.summarize_address_range(first, last))
+
     def _create_failed_job(self, policy, strategy, error_msg):
         """创建失败的任务记录"""
         try:
@@ -311,6 +737,9 @@ class PolicyScheduler:
                 
                 # 清除运行标记
                 self._running_jobs = {job for job in self._running_jobs if not job.startswith(f"{policy_id}_")}
+                for key in [key for key in self._continuous_jobs if key.startswith(f"{policy_id}:")]:
+                    self._continuous_jobs.pop(key, None)
+                self._clear_waiting(policy_id)
                 
                 logger.info(f"Removed all jobs for policy {policy.name}")
         except Exception as e:
@@ -335,4 +764,15 @@ class PolicyScheduler:
         except Exception as e:
             logger.error(f"Error updating policy {policy_id}: {str(e)}")
 
-scheduler = PolicyScheduler()
\ No newline at end of file
+scheduler = PolicyScheduler()
+
+
+# 持久化作业存储只能保存可按模块路径引用的函数，不能保存绑定方法
+def run_policy_job(policy_id, strategy, attempt=0):
+    """cron 策略任务入口"""
+    scheduler.execute_policy(policy_id, strategy, attempt)
+
+
+def run_continuous_job(policy_id, strategy):
+    """连续扫描任务入口"""
+    scheduler.execute_continuous(policy_id, strategy)
\ No newline at end of file
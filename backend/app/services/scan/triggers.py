@@ -0,0 +1,53 @@
+import hashlib
+
+from datetime import timedelta
+
+from apscheduler.triggers.cron import CronTrigger
+
+
+def policy_offset(policy_id: str, window: int) -> int:
+    """根据策略ID计算固定的触发偏移量（秒），同一策略每次计算结果相同"""
+    if window <= 0:
+        return 0
+    return int(hashlib.md5(policy_id.encode('utf-8')).hexdigest(), 16) % (window + 1)
+
+
+class OffsetCronTrigger(CronTrigger):
+    """带固定偏移量的 cron 触发器
+
+    在 cron 计算出的触发时间上统一加上 offset 秒，用于把整点触发的策略
+    确定性地分散到一个时间窗口内。与 CronTrigger 自带的随机 jitter 不同，
+    同一策略每次触发的偏移量相同，触发间隔保持不变。
+    """
+
+    def __init__(self, offset_seconds: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.offset = timedelta(seconds=offset_seconds)
+
+    @classmethod
+    def from_crontab(cls, expr, timezone=None, offset_seconds: int = 0):
+        values = expr.split()
+        if len(values) != 5:
+            raise ValueError(f'Wrong number of fields; got {len(values)}, expected 5')
+
+        return cls(minute=values[0], hour=values[1], day=values[2], month=values[3],
+                   day_of_week=values[4], timezone=timezone, offset_seconds=offset_seconds)
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        if previous_fire_time:
+            previous_fire_time = previous_fire_time - self.offset
+        next_fire_time = super().get_next_fire_time(previous_fire_time, now - self.offset)
+        return next_fire_time + self.offset if next_fire_time else None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['offset'] = self.offset.total_seconds()
+        return state
+
+    def __setstate__(self, state):
+        offset = state.pop('offset', 0)
+        super().__setstate__(state)
+        self.offset = timedelta(seconds=offset)
+
+    def __str__(self):
+        return f"{super().__str__()} offset={int(self.offset.total_seconds())}s"
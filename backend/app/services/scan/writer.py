@@ -0,0 +1,217 @@
+from typing import Optional, Dict, Iterable, List
+from datetime import datetime
+
+from app.models.models import db, ScanJob, ScanResult, IP
+from app.core.utils.logger import app_logger as logger
+
+
+class ScanResultWriter:
+    """扫描结果写入器
+
+    负责将主机发现结果写入 IP 表、将端口扫描结果写入 ScanResult 表，
+    由在线扫描 (ScanExecutor) 和离线导入 (NmapXmlImporter) 共用。
+    """
+
+    def __init__(self, job_id: str, subnet: str, job_user_id: Optional[str] = None, notification_manager=None):
+        self.job_id = job_id
+        self.subnet = subnet
+        self.job_user_id = job_user_id
+        self.notification_manager = notification_manager
+
+    @staticmethod
+    def build_ports_info(host_data: Dict, open_ports: Iterable) -> Dict:
+        """根据 python-nmap 格式的主机数据构建端口信息字典
+
+        Args:
+            host_data: 单个主机的扫描数据 (scan[ip])
+            open_ports: 开放端口列表
+
+        Returns:
+            Dict: 以端口号字符串为键的端口信息
+        """
+        ports_info = {}
+        tcp = host_data.get('tcp', {})
+        for port in open_ports:
+            port_info = tcp.get(port, {})
+            ports_info[str(port)] = {
+                'protocol': 'tcp',
+                'service': port_info.get('name', ''),
+                'version': port_info.get('version', ''),
+                'banner': port_info.get('banner', ''),
+                'state': port_info.get('state', '')
+            }
+        return ports_info
+
+    @staticmethod
+    def get_open_ports(host_data: Dict) -> List[int]:
+        """获取主机数据中状态为 open 的 TCP 端口"""
+        return [
+            port for port, port_info in host_data.get('tcp', {}).items()
+            if port_info.get('state') == 'open'
+        ]
+
+    def save_result(self, ip: str, open_ports: list, host_data: Dict, commit: bool = True) -> Optional[ScanResult]:
+        """保存单个主机的端口扫描结果
+
+        Args:
+            ip: IP 地址
+            open_ports: 开放端口列表
+            host_data: 单个主机的扫描数据
+            commit: 是否立即提交事务
+
+        Returns:
+            Optional[ScanResult]: 保存的扫描结果，失败返回 None
+        """
+        try:
+            try:
+                job = ScanJob.query.get(self.job_id)
+                if not job:
+                    logger.error(f"Job {self.job_id} not found when saving result")
+                    return None
+
+                result = ScanResult(
+                    job_id=self.job_id,
+                    ip_address=ip,
+                    open_ports=self.build_ports_info(host_data, open_ports),
+                    status='up',
+                    raw_data=host_data
+                )
+                db.session.add(result)
+                if commit:
+                    db.session.commit()
+                logger.debug(f"Saved scan result for job {self.job_id}, IP {ip}")
+                return result
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Database error saving result for job {self.job_id}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error saving result for job {self.job_id}: {str(e)}")
+        return None
+
+    def merge_result(self, result_id: str, open_ports: list, host_data: Dict, commit: bool = True) -> Optional[ScanResult]:
+        """将后续端口扫描的结果合并到已保存的扫描结果中
+
+        Args:
+            result_id: 已保存的扫描结果ID
+            open_ports: 新发现的开放端口列表
+            host_data: 单个主机的扫描数据
+            commit: 是否立即提交事务
+
+        Returns:
+            Optional[ScanResult]: 合并后的扫描结果，失败返回 None
+        """
+        try:
+            result = ScanResult.query.get(result_id)
+            if not result:
+                logger.error(f"Scan result {result_id} not found when merging")
+                return None
+
+            ports_info = dict(result.open_ports or {})
+            ports_info.update(self.build_ports_info(host_data, open_ports))
+            result.open_ports = ports_info
+
+            raw_data = dict(result.raw_data or {})
+            tcp = {str(port): info for port, info in (raw_data.get('tcp') or {}).items()}
+            tcp.update({str(port): info for port, info in host_data.get('tcp', {}).items()})
+            raw_data.update(host_data)
+            raw_data['tcp'] = tcp
+            result.raw_data = raw_data
+
+            if commit:
+                db.session.commit()
+            logger.debug(f"Merged scan result for job {self.job_id}, IP {result.ip_address}")
+            return result
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Database error merging result for job {self.job_id}: {str(e)}")
+        return None
+
+    def save_discovery_result(self, active_hosts: Iterable[str], inactive_hosts: Optional[Iterable[str]] = None,
+                              mark_missing_inactive: bool = True, commit: bool = True) -> bool:
+        """保存主机发现结果
+
+        Args:
+            active_hosts: 存活主机 IP 列表
+            inactive_hosts: 明确未响应的主机 IP 列表
+            mark_missing_inactive: 是否将不在 active_hosts 中的其他 IP 全部标记为 inactive
+            commit: 是否立即提交事务
+
+        Returns:
+            bool: 是否保存成功
+        """
+        try:
+            try:
+                now = datetime.utcnow()
+                scanned_ips = set()
+                for host in active_hosts:
+                    ip_address = host
+                    scanned_ips.add(ip_address)
+
+                    # 更新或创建 IP 记录
+                    ip = IP.query.filter_by(ip_address=ip_address).first()
+                    if ip:
+                        ip.last_scanned = now
+                        if ip.status == 'inactive':
+                            ip.status = 'unclaimed'
+                            # 发送IP地址状态变更通知
+                            self._notify(
+                                title="IP地址状态变更",
+                                content=f"IP地址 {ip_address} 的状态已从 'inactive' 变为 'unclaimed'。"
+                            )
+                    else:
+                        ip = IP(
+                            ip_address=ip_address,
+                            status='unclaimed',
+                            last_scanned=now
+                        )
+                        db.session.add(ip)
+                        # 发送新IP地址发现通知
+                        self._notify(
+                            title="新IP地址发现",
+                            content=f"在扫描 {self.subnet} 时发现了新的IP地址: {ip_address}"
+                        )
+
+                if mark_missing_inactive:
+                    # 标记未响应的 IP 为 inactive
+                    IP.query.filter(
+                        IP.ip_address.notin_(scanned_ips),
+                        IP.status != 'inactive'
+                    ).update({
+                        'status': 'inactive',
+                        'last_scanned': now
+                    }, synchronize_session=False)
+                elif inactive_hosts:
+                    # 只标记明确未响应的 IP 为 inactive
+                    down_ips = [ip for ip in inactive_hosts if ip not in scanned_ips]
+                    if down_ips:
+                        IP.query.filter(
+                            IP.ip_address.in_(down_ips),
+                            IP.status != 'inactive'
+                        ).update({
+                            'status': 'inactive',
+                            'last_scanned': now
+                        }, synchronize_session=False)
+
+                if commit:
+                    db.session.commit()
+                logger.info(f"Saved discovery results for job {self.job_id}")
+                return True
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Database error saving discovery results for job {self.job_id}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error saving discovery results for job {self.job_id}: {str(e)}")
+        return False
+
+    def _notify(self, title: str, content: str):
+        """向任务所属用户发送 IP 通知"""
+        if not self.job_user_id or not self.notification_manager:
+            return
+        self.notification_manager.create_notification(
+            user_id=self.job_user_id,
+            title=title,
+            content=content,
+            type="ip",
+            commit=True
+        )
+        logger.debug(f"Sent notification '{title}' to user {self.job_user_id}")
@@ -0,0 +1,363 @@
+import atexit
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+
+from collections import deque
+from typing import Dict, Optional, Tuple
+from app.core.error.errors import QueueFullError, RequestTooLargeError
+from app.core.utils.logger import app_logger as logger
+
+# 各类工作的默认队列深度（已接受但未完成的工作单元数）
+DEFAULT_DEPTHS = {
+    'scan': 50,
+    'collection': 200
+}
+
+# 各类工作队列深度的配置项
+DEPTH_SETTINGS = {
+    'scan': 'SCAN_QUEUE_MAX_DEPTH',
+    'collection': 'COLLECTION_QUEUE_MAX_DEPTH'
+}
+
+KEY_PREFIX = 'ipams:backpressure:'
+OWNERS_KEY = 'ipams:backpressure:owners'
+
+# 完成记录按该秒数分桶写入 Redis
+BUCKET_SECONDS = 5
+
+# 汇总所有存活进程的占用数，心跳超时进程的占用被清除；按 mode 检查或占用
+# KEYS[1]: 各进程占用数 hash, KEYS[2]: 进程心跳 hash
+# ARGV: owner, count, depth, now, stale_before, mode (acquire/force/check)
+ACQUIRE_SCRIPT = """
+local total = 0
+local entries = redis.call('hgetall', KEYS[1])
+for i = 1, #entries, 2 do
+    local owner = entries[i]
+    local seen = tonumber(redis.call('hget', KEYS[2], owner) or '0')
+    if owner ~= ARGV[1] and seen < tonumber(ARGV[5]) then
+        redis.call('hdel', KEYS[1], owner)
+        redis.call('hdel', KEYS[2], owner)
+    else
+        total = total + tonumber(entries[i + 1])
+    end
+end
+redis.call('hset', KEYS[2], ARGV[1], ARGV[4])
+local count = tonumber(ARGV[2])
+local depth = tonumber(ARGV[3])
+if ARGV[6] ~= 'force' and depth > 0 and total + count > depth then
+    return {0, total}
+end
+if ARGV[6] ~= 'check' then
+    redis.call('hincrby', KEYS[1], ARGV[1], count)
+    total = total + count
+end
+return {1, total}
+"""
+
+
+class Backpressure:
+    """任务提交背压控制
+
+    每类工作维护一个有界计数：提交时占用，完成时释放。扫描以任务为单位，
+    批量采集以主机为单位。超过深度上限的提交被拒绝，并根据最近一段时间的
+    完成速率估算需要等待多久才能腾出足够的位置（Retry-After）。单次提交的工作量
+    本身就超过深度上限时无论等待多久都无法接受，直接以 RequestTooLargeError 拒绝。
+    从持久化队列恢复的任务已被接受过，强制占用，不受上限限制。
+
+    深度上限和完成速率在所有进程间共享：每个进程的占用数和完成记录写入 Redis，
+    检查与占用在同一个 Lua 脚本中原子完成；进程定期发送心跳并同步本地占用数，
+    心跳超时（进程退出或崩溃）的占用被清除，其任务由持久化队列在其他进程强制恢复。
+    Redis 不可用时退化为按进程计数。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(Backpressure, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self.app = None
+                    self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                    self.heartbeat_interval = 10
+                    self.depths = dict(DEFAULT_DEPTHS)
+                    self.window = 300
+                    self.default_retry_after = 30
+                    self.max_retry_after = 600
+                    self._pending = {kind: 0 for kind in self.depths}
+                    self._rejected = {kind: 0 for kind in self.depths}
+                    self._completions = {kind: deque() for kind in self.depths}
+                    self._state_lock = threading.Lock()
+                    self._shared_failing = False
+                    self._stop = threading.Event()
+                    self._thread = None
+                    self._initialized = True
+
+    def init_app(self, app):
+        """从配置读取队列深度并启动心跳线程"""
+        self.app = app
+        self.depths['scan'] = app.config.get('SCAN_QUEUE_MAX_DEPTH', DEFAULT_DEPTHS['scan'])
+        self.depths['collection'] = app.config.get('COLLECTION_QUEUE_MAX_DEPTH', DEFAULT_DEPTHS['collection'])
+        self.window = max(app.config.get('BACKPRESSURE_RATE_WINDOW', 300), 10)
+        self.default_retry_after = max(app.config.get('BACKPRESSURE_DEFAULT_RETRY_AFTER', 30), 1)
+        self.max_retry_after = max(app.config.get('BACKPRESSURE_MAX_RETRY_AFTER', 600), self.default_retry_after)
+        self.heartbeat_interval = max(app.config.get('BACKPRESSURE_HEARTBEAT_INTERVAL', 10), 1)
+        logger.info(f"Backpressure initialized with queue depths {self.depths}")
+
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name='backpressure_heartbeat', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _redis(self):
+        return self.app.extensions.get('redis') if self.app else None
+
+    @staticmethod
+    def _pending_key(kind: str) -> str:
+        return f"{KEY_PREFIX}{kind}:pending"
+
+    @staticmethod
+    def _done_key(kind: str) -> str:
+        return f"{KEY_PREFIX}{kind}:done"
+
+    def _shared_failed(self, e: Exception):
+        if not self._shared_failing:
+            logger.warning(f"Shared backpressure state unavailable, counting per process: {str(e)}")
+        self._shared_failing = True
+
+    def _shared(self, kind: str, count: int, mode: str) -> Optional[Tuple[bool, int]]:
+        """在 Redis 中检查或占用位置（需持有 _state_lock）
+
+        Returns:
+            (是否接受, 所有进程的占用数)，Redis 不可用时返回 None
+        """
+        redis_client = self._redis()
+        if not redis_client:
+            return None
+        now = time.time()
+        try:
+            accepted, total = redis_client.eval(
+                ACQUIRE_SCRIPT, 2, self._pending_key(kind), OWNERS_KEY,
+                self.owner, count, self.depths.get(kind, 0), now, now - self.heartbeat_interval * 3, mode
+            )
+        except Exception as e:
+            self._shared_failed(e)
+            return None
+        self._shared_failing = False
+        return bool(accepted), int(total)
+
+    def _shared_throughput(self, kind: str) -> Optional[float]:
+        """所有进程最近窗口内每秒完成的工作单元数，Redis 不可用时返回 None"""
+        redis_client = self._redis()
+        if not redis_client:
+            return None
+        now = time.time()
+        try:
+            buckets = redis_client.hgetall(self._done_key(kind))
+            expired = [bucket for bucket in buckets if int(bucket) < now - self.window - BUCKET_SECONDS]
+            if expired:
+                redis_client.hdel(self._done_key(kind), *expired)
+        except Exception as e:
+            self._shared_failed(e)
+            return None
+        recent = {int(bucket): int(count) for bucket, count in buckets.items() if int(bucket) >= now - self.window}
+        if not recent:
+            return 0.0
+        # 窗口未满时按实际经过的时间计算，避免刚启动时低估速率
+        elapsed = max(now - min(recent), 1.0)
+        return sum(recent.values()) / min(elapsed, self.window)
+
+    def _throughput(self, kind: str, now: float) -> float:
+        """最近窗口内每秒完成的工作单元数（需持有 _state_lock）"""
+        completions = self._completions[kind]
+        while completions and completions[0][0] < now - self.window:
+            completions.popleft()
+        if not completions:
+            return 0.0
+        done = sum(count for _, count in completions)
+        # 窗口未满时按实际经过的时间计算，避免刚启动时低估速率
+        elapsed = max(now - completions[0][0], 1.0)
+        return done / min(elapsed, self.window)
+
+    def _rate(self, kind: str, now: float) -> float:
+        """完成速率，优先使用所有进程的完成记录（需持有 _state_lock）"""
+        rate = self._shared_throughput(kind)
+        return self._throughput(kind, now) if rate is None else rate
+
+    def _retry_after(self, kind: str, count: int, pending: int, now: float) -> int:
+        """估算腾出 count 个位置需要的秒数（需持有 _state_lock）"""
+        overflow = pending + count - self.depths[kind]
+        rate = self._rate(kind, now)
+        if rate <= 0:
+            return self.default_retry_after
+        return int(min(max(math.ceil(overflow / rate), 1), self.max_retry_after))
+
+    def _reject(self, kind: str, count: int, pending: int, now: float) -> QueueFullError:
+        """记录一次拒绝并构造异常（需持有 _state_lock）"""
+        self._rejected[kind] += 1
+        depth = self.depths[kind]
+        return QueueFullError(
+            message=f"{kind} queue is full ({pending}/{depth}), retry later",
+            retry_after=self._retry_after(kind, count, pending, now),
+            details={'kind': kind, 'pending': pending, 'depth': depth, 'requested': count}
+        )
+
+    def _check_size(self, kind: str, count: int):
+        """单次提交超过深度上限时抛出 RequestTooLargeError"""
+        depth = self.depths.get(kind, 0)
+        if depth > 0 and count > depth:
+            setting = DEPTH_SETTINGS.get(kind, 'queue depth')
+            raise RequestTooLargeError(
+                message=f"{kind} request of {count} exceeds the queue limit {depth} ({setting}), split it into smaller requests",
+                details={'kind': kind, 'depth': depth, 'requested': count}
+            )
+
+    def _exceeds(self, kind: str, count: int) -> bool:
+        depth = self.depths.get(kind, 0)
+        return depth > 0 and self._pending[kind] + count > depth
+
+    def check(self, kind: str, count: int = 1):
+        """检查是否能接受 count 个工作单元但不占用，用于提交前的预检
+
+        Raises:
+            RequestTooLargeError: count 本身超过深度上限时抛出
+            QueueFullError: 超过深度上限时抛出
+        """
+        self._check_size(kind, count)
+        now = time.monotonic()
+        with self._state_lock:
+            shared = self._shared(kind, count, 'check')
+            if shared is None:
+                if self._exceeds(kind, count):
+                    raise self._reject(kind, count, self._pending[kind], now)
+            elif not shared[0]:
+                raise self._reject(kind, count, shared[1], now)
+
+    def acquire(self, kind: str, count: int = 1, force: bool = False):
+        """占用 count 个位置
+
+        Args:
+            kind: 工作类别 scan/collection
+            count: 工作单元数
+            force: 忽略深度上限（用于恢复已接受的任务）
+
+        Raises:
+            RequestTooLargeError: count 本身超过深度上限时抛出（force 时不检查）
+            QueueFullError: 超过深度上限时抛出，retry_after 为建议的重试等待秒数
+        """
+        if not force:
+            self._check_size(kind, count)
+        now = time.monotonic()
+        with self._state_lock:
+            shared = self._shared(kind, count, 'force' if force else 'acquire')
+            if shared is None:
+                if not force and self._exceeds(kind, count):
+                    raise self._reject(kind, count, self._pending[kind], now)
+            elif not shared[0]:
+                raise self._reject(kind, count, shared[1], now)
+            self._pending[kind] += count
+
+    def release(self, kind: str, count: int = 1):
+        """释放 count 个位置并计入完成速率"""
+        if count <= 0:
+            return
+        now = time.monotonic()
+        with self._state_lock:
+            self._pending[kind] = max(self._pending[kind] - count, 0)
+            self._completions[kind].append((now, count))
+            self._throughput(kind, now)
+            self._shared_release(kind, count)
+
+    def _shared_release(self, kind: str, count: int):
+        """在 Redis 中释放占用并记录完成数（需持有 _state_lock）"""
+        redis_client = self._redis()
+        if not redis_client:
+            return
+        bucket = int(time.time()) // BUCKET_SECONDS * BUCKET_SECONDS
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hset(self._pending_key(kind), self.owner, self._pending[kind])
+            pipe.hincrby(self._done_key(kind), bucket, count)
+            pipe.expire(self._done_key(kind), self.window * 2)
+            pipe.execute()
+        except Exception as e:
+            self._shared_failed(e)
+
+    def available(self, kind: str) -> float:
+        """当前还能接受的工作单元数，深度为 0 时不限制（返回 inf）"""
+        with self._state_lock:
+            depth = self.depths.get(kind, 0)
+            if depth <= 0:
+                return math.inf
+            shared = self._shared(kind, 0, 'check')
+            pending = self._pending[kind] if shared is None else shared[1]
+            return max(depth - pending, 0)
+
+    def snapshot(self) -> Dict:
+        """获取各类工作的队列占用（所有进程）、完成速率和本进程的拒绝次数"""
+        now = time.monotonic()
+        with self._state_lock:
+            result = {}
+            for kind in self.depths:
+                shared = self._shared(kind, 0, 'check')
+                result[kind] = {
+                    'depth': self.depths[kind],
+                    'pending': self._pending[kind] if shared is None else shared[1],
+                    'local_pending': self._pending[kind],
+                    'shared': shared is not None,
+                    'throughput_per_minute': round(self._rate(kind, now) * 60, 2),
+                    'rejected': self._rejected[kind]
+                }
+            return result
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self._heartbeat()
+
+    def _heartbeat(self):
+        """刷新本进程心跳，并用本地占用数修正 Redis 中的记录"""
+        redis_client = self._redis()
+        if not redis_client:
+            return
+        with self._state_lock:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.hset(OWNERS_KEY, self.owner, time.time())
+                for kind in self.depths:
+                    pipe.hset(self._pending_key(kind), self.owner, self._pending[kind])
+                pipe.execute()
+            except Exception as e:
+                self._shared_failed(e)
+
+    def shutdown(self):
+        """停止心跳并移除本进程的占用记录，未完成的任务由持久化队列在其他进程恢复"""
+        self._stop.set()
+        redis_client = self._redis()
+        if not redis_client:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for kind in self.depths:
+                pipe.hdel(self._pending_key(kind), self.owner)
+            pipe.hdel(OWNERS_KEY, self.owner)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to clear shared backpressure state: {str(e)}")
+
+
+# 创建全局背压控制实例
+backpressure = Backpressure()
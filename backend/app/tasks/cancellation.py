@@ -0,0 +1,92 @@
+import threading
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+from app.core.utils.logger import app_logger as logger
+
+
+class OperationCancelled(Exception):
+    """操作因任务取消而中止"""
+
+
+_current_token: ContextVar[Optional['CancellationToken']] = ContextVar('cancellation_token', default=None)
+
+
+class CancellationToken:
+    """协作式取消令牌
+
+    取消方调用 cancel() 设置取消标志并依次执行已注册的回调（如终止子进程）；
+    执行方在检查点调用 raise_if_cancelled() 或读取 cancelled 主动退出，
+    阻塞等待处使用 wait() 代替 sleep，取消后立即返回。
+    回调只执行一次，取消后注册的回调会被立即执行。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: Optional[str] = None):
+        """取消令牌，重复调用无效果"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._invoke(callback)
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """注册取消回调
+
+        Returns:
+            Callable: 注销函数，操作正常结束后调用以移除回调
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        self._invoke(callback)
+        return lambda: None
+
+    def _unregister(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @staticmethod
+    def _invoke(callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Cancellation callback failed: {str(e)}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待取消，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled(self.reason or 'Operation cancelled')
+
+    @contextmanager
+    def activate(self):
+        """在当前线程（上下文）内设置为当前令牌，供深层调用通过 current_token() 获取"""
+        reset = _current_token.set(self)
+        try:
+            yield self
+        finally:
+            _current_token.reset(reset)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """获取当前上下文的取消令牌，未设置时返回 None"""
+    return _current_token.get()
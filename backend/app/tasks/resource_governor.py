@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+import psutil
+
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from app.core.utils.logger import app_logger as logger
+
+# 各类工作在总预算中的默认份额
+DEFAULT_SHARES = {
+    'scan': 0.4,
+    'collection': 0.4,
+    'vmware': 0.2
+}
+
+
+class ResourceGovernor:
+    """全局并发资源调度器
+
+    扫描、批量采集和 VMware 虚拟机采集共享同一个并发预算，每个工作单元执行前
+    领取一个槽位，结束后归还。每类工作按份额获得上限，其他类别没有等待者时
+    可以借用空闲槽位。预算根据系统负载自适应调整：1 分钟负载或内存使用率超过
+    上限时按比例收缩，负载回落后逐步恢复到配置的基准预算。
+
+    已持有槽位的线程不能再等待其他槽位：预算收缩后所有槽位可能都被等待内层槽位的
+    持有者占用，内层领取永远无法成功。嵌套的工作通过 holds_slot() 判断后直接执行。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(ResourceGovernor, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self.cpu_count = psutil.cpu_count() or 1
+                    self.base_budget = self.cpu_count * 4
+                    self.budget = self.base_budget
+                    self.shares = dict(DEFAULT_SHARES)
+                    self.max_load = 1.5
+                    self.max_memory = 90.0
+                    self.adjust_interval = 10
+                    self.load = 0.0
+                    self.memory = 0.0
+                    self._in_use = {kind: 0 for kind in self.shares}
+                    self._waiting = {kind: 0 for kind in self.shares}
+                    self._granted = {kind: 0 for kind in self.shares}
+                    self._cond = threading.Condition()
+                    self._held = threading.local()  # 当前线程通过 slot() 持有的槽位数
+                    self._last_adjust = 0
+                    self._initialized = True
+
+    def init_app(self, app):
+        """从配置读取预算和负载阈值"""
+        self.base_budget = app.config.get('RESOURCE_BUDGET') or self.cpu_count * 4
+        self.max_load = app.config.get('RESOURCE_MAX_LOAD', 1.5)
+        self.max_memory = app.config.get('RESOURCE_MAX_MEMORY', 90)
+        self.adjust_interval = app.config.get('RESOURCE_ADJUST_INTERVAL', 10)
+        shares = self.parse_shares(app.config.get('RESOURCE_SHARES', ''))
+        with self._cond:
+            self.shares.update(shares)
+            for kind in self.shares:
+                self._in_use.setdefault(kind, 0)
+                self._waiting.setdefault(kind, 0)
+                self._granted.setdefault(kind, 0)
+            self.budget = self.base_budget
+            self._cond.notify_all()
+        logger.info(f"Resource governor initialized with budget {self.base_budget}, shares {self.shares}")
+
+    @staticmethod
+    def parse_shares(value: str) -> Dict[str, float]:
+        """解析 RESOURCE_SHARES 配置，格式为 "scan:0.4,collection:0.4,vmware:0.2" """
+        shares = {}
+        for item in (value or '').split(','):
+            if ':' not in item:
+                continue
+            kind, share = item.split(':', 1)
+            try:
+                shares[kind.strip()] = max(float(share), 0.0)
+            except ValueError:
+                continue
+        return shares
+
+    def _cap(self, kind: str) -> int:
+        total = sum(self.shares.values()) or 1
+        return max(1, int(round(self.budget * self.shares.get(kind, 0) / total)))
+
+    def _adjust(self):
+        """根据系统负载调整预算（需持有 _cond）"""
+        now = time.monotonic()
+        if now - self._last_adjust < self.adjust_interval:
+            return
+        self._last_adjust = now
+        try:
+            self.load = os.getloadavg()[0] / self.cpu_count if hasattr(os, 'getloadavg') else psutil.cpu_percent() / 100
+            self.memory = psutil.virtual_memory().percent
+        except Exception as e:
+            logger.warning(f"Failed to read system load for resource governor: {str(e)}")
+            return
+
+        minimum = len(self.shares)
+        if self.load > self.max_load or self.memory > self.max_memory:
+            # 过载时按比例收缩
+            budget = max(minimum, int(self.budget * 0.75))
+        else:
+            # 负载正常时逐步恢复
+            budget = min(self.base_budget, self.budget + 1)
+        if budget != self.budget:
+            logger.info(
+                f"Resource budget {self.budget} -> {budget} (load {self.load:.2f}/cpu, memory {self.memory:.1f}%)"
+            )
+            self.budget = budget
+            self._cond.notify_all()
+
+    def _can_acquire(self, kind: str) -> bool:
+        if sum(self._in_use.values()) >= self.budget:
+            return False
+        if self._in_use[kind] < self._cap(kind):
+            return True
+        # 超出份额时只能借用其他类别不需要的槽位
+        return not any(
+            waiting and self._in_use[other] < self._cap(other)
+            for other, waiting in self._waiting.items() if other != kind
+        )
+
+    def acquire(self, kind: str, timeout: Optional[float] = None,
+                should_abort: Optional[Callable[[], bool]] = None) -> bool:
+        """领取一个槽位
+
+        Args:
+            kind: 工作类别 scan/collection/vmware
+            timeout: 最长等待时间（秒），None 表示一直等待
+            should_abort: 等待期间定期调用，返回 True 时放弃等待（如任务已取消）
+
+        Returns:
+            bool: 是否领取成功
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            if kind not in self._in_use:
+                self.shares.setdefault(kind, 0)
+                self._in_use[kind] = 0
+                self._waiting[kind] = 0
+                self._granted[kind] = 0
+            self._waiting[kind] += 1
+            try:
+                while True:
+                    self._adjust()
+                    if self._can_acquire(kind):
+                        self._in_use[kind] += 1
+                        self._granted[kind] += 1
+                        return True
+                    if should_abort and should_abort():
+                        return False
+                    wait = 1.0
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[kind] -= 1
+
+    def release(self, kind: str):
+        """归还槽位"""
+        with self._cond:
+            if self._in_use.get(kind, 0) > 0:
+                self._in_use[kind] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, kind: str, timeout: Optional[float] = None,
+             should_abort: Optional[Callable[[], bool]] = None):
+        """以上下文管理器方式领取槽位，领取失败时产出 False 且不占用槽位"""
+        acquired = self.acquire(kind, timeout, should_abort)
+        if acquired:
+            self._held.count = self.held_count() + 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._held.count -= 1
+                self.release(kind)
+
+    def held_count(self) -> int:
+        return getattr(self._held, 'count', 0)
+
+    def holds_slot(self) -> bool:
+        """当前线程是否已通过 slot() 持有槽位"""
+        return self.held_count() > 0
+
+    def available(self, kind: str) -> int:
+        """当前可立即领取的槽位数"""
+        with self._cond:
+            self._adjust()
+            free = max(self.budget - sum(self._in_use.values()), 0)
+            return min(free, max(self._cap(kind) - self._in_use.get(kind, 0), 0))
+
+    def snapshot(self) -> Dict:
+        """获取当前预算和各类别的槽位分配"""
+        with self._cond:
+            self._adjust()
+            return {
+                'base_budget': self.base_budget,
+                'budget': self.budget,
+                'in_use': sum(self._in_use.values()),
+                'load_per_cpu': round(self.load, 2),
+                'memory_percent': self.memory,
+                'max_load': self.max_load,
+                'max_memory': self.max_memory,
+                'classes': {
+                    kind: {
+                        'share': self.shares.get(kind, 0),
+                        'cap': self._cap(kind),
+                        'in_use': self._in_use[kind],
+                        'waiting': self._waiting[kind],
+                        'granted': self._granted[kind]
+                    }
+                    for kind in self._in_use
+                }
+            }
+
+
+# 创建全局资源调度器实例
+resource_governor = ResourceGovernor()
@@ -0,0 +1,363 @@
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from apscheduler.events import (
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR,
+    EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_SCHEDULER_START,
+    EVENT_JOB_ADDED, EVENT_JOB_MODIFIED, EVENT_JOB_REMOVED
+)
+from app.core.utils.logger import app_logger as logger
+
+# 统计合并触发次数时最多回溯的计划时间数
+MAX_COALESCED_SCAN = 10000
+
+# 直方图桶上界（秒），最后一个桶收集所有更大的值
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, float('inf'))
+
+
+class Histogram:
+    """固定桶直方图，内存占用与样本数无关"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        value = max(float(value), 0.0)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估算分位数，返回所在桶的上界（最后一个桶返回最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return self.max if bound == float('inf') else min(bound, self.max)
+        return self.max
+
+    def merge(self, data: Dict):
+        """合并另一个直方图的 to_dict 结果（桶上界相同）"""
+        for i, item in enumerate(data.get('buckets', [])[:len(self.counts)]):
+            self.counts[i] += item['count']
+        self.count += data.get('count', 0)
+        self.total += data.get('sum', 0.0)
+        self.max = max(self.max, data.get('max', 0.0))
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'max': round(self.max, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': [
+                {'le': 'inf' if bound == float('inf') else bound, 'count': count}
+                for bound, count in zip(self.buckets, self.counts)
+            ]
+        }
+
+
+class JobTelemetry:
+    """单个调度任务（或一组任务）的统计"""
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.misfires = 0
+        self.coalesced = 0
+        self.skipped = {}
+        self.lag = Histogram()
+        # 任务函数在执行器线程中的耗时；策略任务只把扫描提交给任务管理器后返回，
+        # 因此是提交耗时而不是扫描耗时
+        self.call_duration = Histogram()
+        self.last_run = None
+
+    def merge(self, data: Dict):
+        """合并另一个进程的 to_dict 结果"""
+        self.runs += data.get('runs', 0)
+        self.errors += data.get('errors', 0)
+        self.misfires += data.get('misfires', 0)
+        self.coalesced += data.get('coalesced', 0)
+        for reason, count in (data.get('skipped') or {}).items():
+            self.skipped[reason] = self.skipped.get(reason, 0) + count
+        if data.get('last_run'):
+            last_run = datetime.fromisoformat(data['last_run'])
+            if self.last_run is None or last_run > self.last_run:
+                self.last_run = last_run
+        self.lag.merge(data.get('lag') or {})
+        self.call_duration.merge(data.get('call_duration') or {})
+
+    def to_dict(self) -> Dict:
+        return {
+            'runs': self.runs,
+            'errors': self.errors,
+            'misfires': self.misfires,
+            'coalesced': self.coalesced,
+            'skipped': dict(self.skipped),
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'lag': self.lag.to_dict(),
+            'call_duration': self.call_duration.to_dict()
+        }
+
+
+class RunTelemetry:
+    """任务实际执行（如策略触发的扫描从开始到结束）的统计"""
+
+    def __init__(self):
+        self.finished = 0
+        self.failed = 0
+        self.run_duration = Histogram()
+
+    def observe(self, seconds: float, failed: bool = False):
+        self.finished += 1
+        if failed:
+            self.failed += 1
+        self.run_duration.observe(seconds)
+
+    def merge(self, data: Dict):
+        self.finished += data.get('finished', 0)
+        self.failed += data.get('failed', 0)
+        self.run_duration.merge(data.get('run_duration') or {})
+
+    def to_dict(self) -> Dict:
+        return {
+            'finished': self.finished,
+            'failed': self.failed,
+            'run_duration': self.run_duration.to_dict()
+        }
+
+
+class SchedulerTelemetry:
+    """APScheduler 调度遥测
+
+    通过事件监听记录每次触发的延迟（实际提交时间 - 计划触发时间）、
+    因超过 misfire_grace_time 被丢弃的触发、因 max_instances 或业务原因跳过的执行，
+    以及任务函数在执行器线程中的耗时和并发执行数峰值；任务函数只负责提交工作时，
+    由执行方通过 record_run 记录工作实际的执行耗时。所有统计保存在固定桶直方图中，
+    按任务分组，分组数超过上限时淘汰最久未更新的分组。各进程的快照可用 merge 合并。
+    """
+
+    def __init__(self, name: str, key_func: Optional[Callable[[str], str]] = None, max_jobs: int = 500):
+        self.name = name
+        self.key_func = key_func or (lambda job_id: job_id)
+        self.max_jobs = max(int(max_jobs), 1)
+        self.max_workers = None
+        self.scheduler = None
+        self.since = datetime.utcnow()
+        self.total = JobTelemetry()
+        self.total_runs = RunTelemetry()
+        self.running = 0
+        self.max_running = 0
+        self._jobs = OrderedDict()
+        self._runs = OrderedDict()
+        self._started = {}
+        self._expected = {}  # {job_id: 任务的下一次计划触发时间}，用于推算被合并的触发
+        self._lock = threading.Lock()
+
+    def attach(self, scheduler, max_workers: Optional[int] = None, max_jobs: Optional[int] = None):
+        """注册调度器事件监听
+
+        Args:
+            scheduler: APScheduler 调度器
+            max_workers: 执行器线程数，随统计一起输出
+            max_jobs: 最多保留的任务分组数
+        """
+        self.max_workers = max_workers
+        self.scheduler = scheduler
+        if max_jobs:
+            self.max_jobs = max(int(max_jobs), 1)
+        scheduler.add_listener(
+            self._on_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+            | EVENT_SCHEDULER_START | EVENT_JOB_ADDED | EVENT_JOB_MODIFIED | EVENT_JOB_REMOVED
+        )
+        if scheduler.running:
+            self._expect_all()
+
+    def _job(self, job_id: str) -> JobTelemetry:
+        return self._group(self._jobs, self.key_func(job_id), JobTelemetry)
+
+    def _group(self, groups: OrderedDict, key: str, factory):
+        stats = groups.get(key)
+        if stats is None:
+            stats = groups[key] = factory()
+            while len(groups) > self.max_jobs:
+                groups.popitem(last=False)
+        else:
+            groups.move_to_end(key)
+        return stats
+
+    def _on_event(self, event):
+        try:
+            # 在持有统计锁之前查询任务，避免与调度器的任务存储锁交叉
+            if event.code == EVENT_SCHEDULER_START:
+                self._expect_all()
+                return
+            if event.code in (EVENT_JOB_ADDED, EVENT_JOB_MODIFIED):
+                self._expect(event.job_id, self._lookup_job(event))
+                return
+            if event.code == EVENT_JOB_REMOVED:
+                self._expected.pop(event.job_id, None)
+                return
+            coalesced = self._coalesced(event) if event.code == EVENT_JOB_SUBMITTED else 0
+            with self._lock:
+                if event.code == EVENT_JOB_SUBMITTED:
+                    self._on_submitted(event, coalesced)
+                elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+                    self._on_finished(event)
+                elif event.code == EVENT_JOB_MISSED:
+                    self._release(event)
+                    for stats in (self._job(event.job_id), self.total):
+                        stats.misfires += 1
+                elif event.code == EVENT_JOB_MAX_INSTANCES:
+                    self._skip(event.job_id, 'max_instances')
+        except Exception as e:
+            logger.error(f"Error recording {self.name} scheduler telemetry: {str(e)}")
+
+    def _lookup_job(self, event):
+        try:
+            return self.scheduler.get_job(event.job_id, event.jobstore)
+        except Exception:
+            return None
+
+    def _expect(self, job_id: str, job):
+        if job is not None and job.next_run_time is not None:
+            self._expected[job_id] = job.next_run_time
+        else:
+            self._expected.pop(job_id, None)
+
+    def _expect_all(self):
+        """记录所有任务的下一次计划触发时间（调度器启动时，停机期间积压的触发由此可见）"""
+        try:
+            for job in self.scheduler.get_jobs():
+                self._expect(job.id, job)
+        except Exception as e:
+            logger.warning(f"Failed to read {self.name} scheduler jobs for telemetry: {str(e)}")
+
+    def _coalesced(self, event) -> int:
+        """本次提交合并掉的积压触发次数
+
+        coalesce 为 True 时调度器只提交最后一个到期的计划时间，scheduled_run_times 中
+        看不到被合并的触发；提交事件发出时任务的 next_run_time 也已更新。因此记录每个任务
+        上一次预期的触发时间，从它按触发器推算到本次计划时间之前的触发都被合并。
+        """
+        run_times = event.scheduled_run_times or []
+        expected = self._expected.get(event.job_id)
+        job = self._lookup_job(event)
+        self._expect(event.job_id, job)
+        if not run_times or job is None or not job.coalesce or expected is None:
+            return 0
+        last = run_times[-1]
+        fire_time = expected
+        count = 0
+        while fire_time is not None and fire_time < last and count < MAX_COALESCED_SCAN:
+            count += 1
+            fire_time = job.trigger.get_next_fire_time(fire_time, last)
+        return count
+
+    def _on_submitted(self, event, coalesced: int = 0):
+        now = datetime.now(timezone.utc)
+        run_times = event.scheduled_run_times or []
+        lag = (now - run_times[-1]).total_seconds() if run_times else 0
+        # 一次提交可能包含多个计划时间，每个计划时间都会产生一个执行或错过事件
+        self._started[(event.job_id, event.jobstore)] = [time.monotonic(), max(len(run_times), 1)]
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        for stats in (self._job(event.job_id), self.total):
+            stats.runs += 1
+            stats.coalesced += coalesced
+            stats.lag.observe(lag)
+            stats.last_run = now
+
+    def _release(self, event) -> Optional[float]:
+        """处理一次提交中的一个计划时间，全部处理完后计为执行结束，返回提交时间"""
+        key = (event.job_id, event.jobstore)
+        entry = self._started.get(key)
+        if entry is None:
+            return None
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._started[key]
+            self.running = max(self.running - 1, 0)
+        return entry[0]
+
+    def _on_finished(self, event):
+        started = self._release(event)
+        for stats in (self._job(event.job_id), self.total):
+            if event.code == EVENT_JOB_ERROR:
+                stats.errors += 1
+            if started is not None:
+                stats.call_duration.observe(time.monotonic() - started)
+
+    def _skip(self, job_id: str, reason: str):
+        for stats in (self._job(job_id), self.total):
+            stats.skipped[reason] = stats.skipped.get(reason, 0) + 1
+
+    def record_skip(self, job_id: str, reason: str):
+        """记录任务因业务原因跳过的执行（如上一次仍在运行、准入控制推迟）"""
+        with self._lock:
+            self._skip(job_id, reason)
+
+    def record_run(self, key: str, seconds: float, failed: bool = False):
+        """记录任务提交的工作实际执行结束（如策略的一次扫描），key 为分组键（如策略ID）"""
+        with self._lock:
+            for stats in (self._group(self._runs, key, RunTelemetry), self.total_runs):
+                stats.observe(seconds, failed)
+
+    def merge(self, snapshot: Dict):
+        """合并另一个进程的统计快照"""
+        with self._lock:
+            since = datetime.fromisoformat(snapshot['since'])
+            self.since = min(self.since, since)
+            self.max_workers = max(self.max_workers or 0, snapshot.get('max_workers') or 0) or None
+            self.running += snapshot.get('running', 0)
+            self.max_running = max(self.max_running, snapshot.get('max_running', 0))
+            self.total.merge(snapshot.get('total') or {})
+            self.total_runs.merge(snapshot.get('total_runs') or {})
+            for key, data in (snapshot.get('jobs') or {}).items():
+                self._group(self._jobs, key, JobTelemetry).merge(data)
+            for key, data in (snapshot.get('runs') or {}).items():
+                self._group(self._runs, key, RunTelemetry).merge(data)
+
+    def snapshot(self) -> Dict:
+        """获取统计快照"""
+        with self._lock:
+            return {
+                'scheduler': self.name,
+                'since': self.since.isoformat(),
+                'max_workers': self.max_workers,
+                'running': self.running,
+                'max_running': self.max_running,
+                'total': self.total.to_dict(),
+                'total_runs': self.total_runs.to_dict(),
+                'jobs': {key: stats.to_dict() for key, stats in self._jobs.items()},
+                'runs': {key: stats.to_dict() for key, stats in self._runs.items()}
+            }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self.since = datetime.utcnow()
+            self.total = JobTelemetry()
+            self.total_runs = RunTelemetry()
+            self.max_running = self.running
+            self._jobs.clear()
+            self._runs.clear()
@@ -7,6 +7,7 @@ from app.core.utils.helpers import cleanup_old_metrics, get_system_metrics
 from datetime import datetime
 from app.models.models import db, SystemMetrics, NetworkMetrics, DiskMetrics, ProcessMetrics
 from app.core.utils.logger import app_logger as logger
+from app.tasks.scheduler_telemetry import SchedulerTelemetry
 
 class MetricsScheduler:
     _instance = None
@@ -31,6 +32,7 @@ class MetricsScheduler:
                         if MetricsScheduler._scheduler is None:
                             MetricsScheduler._scheduler = BackgroundScheduler()
                         self.scheduler = MetricsScheduler._scheduler
+                        self.telemetry = SchedulerTelemetry('metrics')
                         self._initialized = True
                         logger.debug("MetricsScheduler initialized")
                     except Exception as e:
@@ -44,6 +46,7 @@ class MetricsScheduler:
         if not self._app:
             self._app = app
             if not self.scheduler.running:
+                self.telemetry.attach(self.scheduler, max_workers=10)
                 self.scheduler.start()
                 logger.debug("Metrics scheduler started")
                 self.init_scheduler()
@@ -4,10 +4,15 @@ import shutil
 import multiprocessing
 
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Any, Optional
-from app.models.models import db, ScanJob, ScanSubnet, ScanPolicy
+from typing import Callable, Dict, Any, Optional
+from app.models.models import db, ScanJob, ScanSubnet, ScanPolicy, ScanResult, TaskQueueItem
 from app.services.scan.executor import ScanExecutor
 from app.tasks.task_state import task_state
+from app.tasks.task_queue import task_queue
+from app.tasks.task_registry import task_registry
+from app.tasks.resource_governor import resource_governor
+from app.tasks.backpressure import backpressure
+from app.core.error.errors import QueueFullError
 from app.core.utils.logger import app_logger as logger
 from flask import current_app
 from datetime import datetime
@@ -45,19 +50,53 @@ class TaskManager:
                         thread_name_prefix='scan_worker'
                     )
                     self._futures = {}
+                    self._followers_lock = threading.Lock()
+                    self._finish_handlers = []
                     self._initialized = True
                     logger.info(f"TaskManager initialized with ThreadPoolExecutor (max_workers={max_workers})")
 
+    def on_job_finished(self, handler: Callable[[ScanJob], None]):
+        """注册扫描任务结束（completed/failed）的回调 handler(job)，在应用上下文中调用"""
+        self._finish_handlers.append(handler)
+
+    def _notify_finished(self, job: ScanJob):
+        if job.status not in ('completed', 'failed') or not job.start_time or not job.end_time:
+            return
+        for handler in self._finish_handlers:
+            try:
+                handler(job)
+            except Exception as e:
+                logger.error(f"Job finished callback failed for {job.id}: {str(e)}")
+
     def init_app(self, app):
         """初始化应用实例"""
         self.app = app
+        task_queue.register('scan', self._resume_scan_task)
+        task_registry.on_cancel('scan', self.cancel_task)
+        task_registry.on_orphan('scan', self._handle_orphaned_scan)
+
+    def submit_scan_task(self, job_id: str, policy_id: str, subnet_id: str, scan_params: dict = None, targets: str = None) -> ScanJob:
+        """提交扫描任务
 
-    def submit_scan_task(self, job_id: str, policy_id: str, subnet_id: str, scan_params: dict = None) -> ScanJob:
-        """提交扫描任务"""
+        Args:
+            job_id: 任务ID（由调度器提交时为 None）
+            policy_id: 策略ID
+            subnet_id: 子网ID
+            scan_params: 扫描参数
+            targets: 扫描目标，默认为整个子网；连续扫描时为子网的一个切片
+
+        Raises:
+            QueueFullError: 待执行的扫描任务超过 SCAN_QUEUE_MAX_DEPTH
+        """
+        reserved = False
         try:
             # 检查 nmap 是否可用
             if not shutil.which('nmap'):
                 raise RuntimeError("nmap program not found in system path")
+            
+            # 占用扫描队列位置，队列已满时在创建任务记录前拒绝
+            backpressure.acquire('scan')
+            reserved = True
                 
             # 获取当前应用实例
             app = current_app._get_current_object()
@@ -90,41 +129,101 @@ class TaskManager:
                 existing_task = task_state.get_task(job.id)
                 if existing_task['status'] != 'not_found' and existing_task['status'] not in ['failed', 'cancelled']:
                     logger.warning(f"Task {job.id} already exists with status {existing_task['status']}")
+                    backpressure.release('scan')
                     return job
                 
+                # 写入持久化队列，进程退出后由其他进程重新领取执行
+                queue_item_id = task_queue.enqueue('scan', job.id, {
+                    'policy_id': policy_id,
+                    'subnet_id': subnet_id,
+                    'scan_params': scan_params,
+                    'targets': targets
+                })
+                
                 # 创建扫描执行器
                 executor = ScanExecutor(
                     job_id=job.id,
                     subnet=subnet.subnet,
                     threads=policy.threads,
-                    scan_params=scan_params  # 传递扫描参数
+                    scan_params=scan_params,  # 传递扫描参数
+                    targets=targets
                 )
             
-            # 提交任务到线程池
-            future = self._executor.submit(
-                self._execute_scan_task,
-                app,
-                job.id,
-                policy_id,
-                subnet_id,
-                executor  # 传递执行器实例
-            )
-            
-            # 创建任务记录，保存 future 对象和执行器实例
-            task_state.create_task(job.id, policy_id, subnet_id, future, executor)
-            
-            # 设置回调
-            future.add_done_callback(
-                lambda f: self._update_job_status(job.id, f)
-            )
-            
+            self._dispatch_scan(app, job.id, policy_id, subnet_id, executor, queue_item_id)
+            reserved = False
             logger.info(f"Task {job.id} submitted successfully")
             return job
+        except QueueFullError as e:
+            logger.warning(f"Scan task for subnet {subnet_id} rejected: {e.message}")
+            raise
         except Exception as e:
+            if reserved:
+                backpressure.release('scan')
             logger.error(f"Failed to submit task {job_id}: {str(e)}")
             task_state.update_task_status(job_id, 'failed', str(e))
             raise
 
+    def _dispatch_scan(self, app, job_id: str, policy_id: str, subnet_id: str,
+                       executor: ScanExecutor, queue_item_id: Optional[str] = None):
+        """将扫描执行器提交到线程池"""
+        future = self._executor.submit(
+            self._execute_scan_task,
+            app,
+            job_id,
+            policy_id,
+            subnet_id,
+            executor  # 传递执行器实例
+        )
+        
+        # 创建任务记录，保存 future 对象和执行器实例
+        task_state.create_task(job_id, policy_id, subnet_id, future, executor)
+        task_registry.register('scan', job_id, policy_id=policy_id, subnet_id=subnet_id)
+        
+        # 设置回调
+        future.add_done_callback(
+            lambda f: self._update_job_status(job_id, f, executor, queue_item_id)
+        )
+        return future
+
+    def _resume_scan_task(self, queue_item_id: str, job_id: str, payload: dict, attempt: int):
+        """从持久化队列恢复扫描任务：失败后的重试，或接管退出进程遗留的任务"""
+        app = current_app._get_current_object()
+        job = ScanJob.query.get(job_id)
+        if not job or job.deleted or job.status == 'cancelled':
+            task_queue.complete(queue_item_id)
+            return
+
+        policy = ScanPolicy.query.get(payload.get('policy_id'))
+        subnet = ScanSubnet.query.get(payload.get('subnet_id'))
+        if not policy or not subnet or not shutil.which('nmap'):
+            raise RuntimeError("Policy, subnet or nmap not available")
+
+        # 丢弃上一次执行保存的部分结果，重新扫描
+        now = datetime.utcnow()
+        ScanResult.query.filter_by(job_id=job_id, deleted=False).update({
+            'deleted': True,
+            'deleted_at': now
+        }, synchronize_session=False)
+        job.status = 'pending'
+        job.progress = 0
+        job.machines_found = 0
+        job.error_message = None
+        job.start_time = now
+        job.end_time = None
+        db.session.commit()
+
+        executor = ScanExecutor(
+            job_id=job.id,
+            subnet=subnet.subnet,
+            threads=policy.threads,
+            scan_params=payload.get('scan_params'),
+            targets=payload.get('targets')
+        )
+        # 队列中的任务已被接受过，恢复时不受队列深度限制
+        backpressure.acquire('scan', force=True)
+        self._dispatch_scan(app, job.id, policy.id, subnet.id, executor, queue_item_id)
+        logger.info(f"Resumed scan task {job.id} from durable queue (attempt {attempt})")
+
     def _execute_scan_task(self, app, job_id: str, policy_id: str, subnet_id: str, executor: ScanExecutor) -> Dict[str, Any]:
         """执行扫描任务"""
         with app.app_context():
@@ -145,16 +244,25 @@ class TaskManager:
                     logger.error(f"Policy {policy_id} not found")
                     return {'status': 'failed', 'error': 'Policy not found'}
                 
-                # 更新任务状态为运行中
-                task_state.update_task_status(job_id, 'running')
-                logger.info(f"Starting scan for job {job_id}, subnet {subnet.subnet}")
-                
-                # 执行扫描
-                success = executor.execute()
+                # 领取全局扫描槽位，等待期间任务保持 pending
+                with resource_governor.slot('scan', should_abort=lambda: executor.cancelled) as acquired:
+                    if not acquired:
+                        task_state.update_task_status(job_id, 'cancelled')
+                        return {'status': 'cancelled'}
+                    
+                    # 更新任务状态为运行中
+                    task_state.update_task_status(job_id, 'running')
+                    task_registry.update('scan', job_id, flush=True, status='running')
+                    logger.info(f"Starting scan for job {job_id}, subnet {subnet.subnet}")
+                    
+                    # 执行扫描
+                    success = executor.execute()
                 
                 if success:
                     task_state.update_task_status(job_id, 'completed')
                     return {'status': 'completed'}
+                elif executor.cancelled:
+                    return {'status': 'cancelled'}
                 else:
                     task_state.update_task_status(job_id, 'failed', 'Scan execution failed')
                     return {'status': 'failed', 'error': 'Scan execution failed'}
@@ -164,12 +272,200 @@ class TaskManager:
                 task_state.update_task_status(job_id, 'failed', str(e))
                 return {'status': 'failed', 'error': str(e)}
 
-    def _update_job_status(self, job_id: str, future) -> None:
+    def submit_import_task(self, job: ScanJob, file_path: str, remove_file: bool = True):
+        """提交 nmap XML 离线导入任务
+
+        Args:
+            job: 已创建的扫描任务记录
+            file_path: 待导入的 XML 文件路径
+            remove_file: 导入结束后是否删除文件
+        """
+        app = current_app._get_current_object()
+        future = self._executor.submit(
+            self._execute_import_task,
+            app,
+            job.id,
+            file_path,
+            remove_file
+        )
+        task_state.create_task(job.id, job.policy_id, job.subnet_id, future)
+        logger.info(f"Import task {job.id} submitted successfully")
+        return future
+
+    def _execute_import_task(self, app, job_id: str, file_path: str, remove_file: bool) -> Dict[str, Any]:
+        """执行 nmap XML 离线导入任务"""
+        from app.services.scan.importer import import_nmap_xml
+
+        with app.app_context():
+            try:
+                task_state.update_task_status(job_id, 'running')
+                stats = import_nmap_xml(job_id, file_path)
+                task_state.update_task_progress(job_id, 100, stats['results_saved'])
+                task_state.update_task_status(job_id, 'completed')
+                return {'status': 'completed', 'stats': stats}
+            except Exception as e:
+                logger.error(f"Error executing import task {job_id}: {str(e)}")
+                task_state.update_task_status(job_id, 'failed', str(e))
+                return {'status': 'failed', 'error': str(e)}
+            finally:
+                if remove_file:
+                    try:
+                        os.remove(file_path)
+                    except OSError as e:
+                        logger.warning(f"Failed to remove import file {file_path}: {str(e)}")
+
+    @staticmethod
+    def _scan_signature(scan_params: Optional[dict]) -> tuple:
+        """扫描参数签名，签名相同的扫描结果可以互相复用"""
+        params = scan_params or {}
+        scan_type = params.get('scan_type', 'default') if params.get('enable_custom_scan_type') else 'default'
+        ports = params.get('ports') if params.get('enable_custom_ports') else None
+        return scan_type, ports
+
+    def attach_to_inflight(self, policy_id: str, subnet_id: str, scan_params: dict = None) -> Optional[ScanJob]:
+        """将扫描合并到同一子网上正在进行的兼容扫描
+
+        如果子网上已有扫描参数相同的整网扫描在执行，为当前策略创建一条派生任务记录，
+        跟随该扫描的进度，扫描结束后复制其结果和状态，不再重复探测。
+
+        Args:
+            policy_id: 策略ID
+            subnet_id: 子网ID
+            scan_params: 扫描参数
+
+        Returns:
+            Optional[ScanJob]: 派生的任务记录，没有可合并的扫描时返回 None
+        """
+        signature = self._scan_signature(scan_params)
+        for primary_id, task in task_state.find_tasks(subnet_id):
+            executor = task.get('executor')
+            if not executor or executor.cancelled or executor.targets != executor.subnet:
+                continue
+            if self._scan_signature(executor.scan_params) != signature:
+                continue
+
+            policy = ScanPolicy.query.get(policy_id)
+            if not policy:
+                return None
+
+            with self._followers_lock:
+                if executor.followers_closed:
+                    continue
+                job = ScanJob(
+                    user_id=policy.user_id,
+                    policy_id=policy_id,
+                    subnet_id=subnet_id,
+                    status='running',
+                    start_time=datetime.utcnow()
+                )
+                db.session.add(job)
+                db.session.commit()
+                executor.followers.append(job.id)
+
+            task_state.create_task(job.id, policy_id, subnet_id, task.get('future'))
+            task_state.update_task_status(job.id, 'running')
+            task_registry.register('scan', job.id, status='running', policy_id=policy_id,
+                                   subnet_id=subnet_id, primary_job_id=primary_id)
+            logger.info(f"Task {job.id} attached to in-flight scan {primary_id} on subnet {subnet_id}")
+            return job
+        return None
+
+    def _detach_follower(self, job_id: str) -> bool:
+        """将合并任务从主扫描中移除并标记为已取消"""
+        with self._followers_lock:
+            _, executor = task_state.find_task_with_follower(job_id)
+            if executor is None:
+                return False
+            executor.followers.remove(job_id)
+
+        task_registry.unregister('scan', job_id)
+        with self.app.app_context():
+            job = ScanJob.query.get(job_id)
+            if job:
+                job.status = 'cancelled'
+                job.end_time = datetime.utcnow()
+                db.session.commit()
+        return True
+
+    def _complete_followers(self, job_id: str, executor: Optional[ScanExecutor]) -> None:
+        """扫描结束后，将结果和状态复制到合并的派生任务"""
+        if not executor:
+            return
+        with self._followers_lock:
+            executor.followers_closed = True
+            followers = list(executor.followers)
+        if not followers:
+            return
+
+        with self.app.app_context():
+            primary = ScanJob.query.get(job_id)
+            if not primary:
+                return
+            for follower_id in followers:
+                try:
+                    self._copy_results(job_id, follower_id)
+                    follower = ScanJob.query.get(follower_id)
+                    if follower:
+                        # 主扫描失败后等待重试时，跟随任务直接结束
+                        follower.status = primary.status if primary.status in ('completed', 'cancelled') else 'failed'
+                        follower.progress = primary.progress
+                        follower.machines_found = primary.machines_found
+                        follower.error_message = primary.error_message
+                        follower.end_time = datetime.utcnow()
+                    db.session.commit()
+                    if follower:
+                        self._notify_finished(follower)
+                    task_state.update_task_status(follower_id, follower.status if follower else 'failed', primary.error_message)
+                    logger.info(f"Completed attached job {follower_id} from scan {job_id}")
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error completing attached job {follower_id}: {str(e)}")
+                finally:
+                    task_registry.unregister('scan', follower_id)
+
+    @staticmethod
+    def _copy_results(source_job_id: str, target_job_id: str, chunk_size: int = 500) -> int:
+        """按主键分页复制扫描结果到另一个任务"""
+        copied = 0
+        last_id = ''
+        while True:
+            rows = ScanResult.query.filter(
+                ScanResult.job_id == source_job_id,
+                ScanResult.deleted == False,
+                ScanResult.id > last_id
+            ).order_by(ScanResult.id).limit(chunk_size).all()
+            if not rows:
+                break
+            db.session.bulk_insert_mappings(ScanResult, [{
+                'job_id': target_job_id,
+                'ip_address': row.ip_address,
+                'open_ports': row.open_ports,
+                'os_info': row.os_info,
+                'status': row.status,
+                'raw_data': row.raw_data,
+                'deleted': False
+            } for row in rows])
+            copied += len(rows)
+            last_id = rows[-1].id
+        return copied
+
+    def _update_job_status(self, job_id: str, future, executor: Optional[ScanExecutor] = None,
+                           queue_item_id: Optional[str] = None) -> None:
         """更新任务状态"""
         try:
             # 先获取结果
             result = future.result()
             
+            # 确认队列项，失败时按退避策略重新排队
+            retrying = False
+            if queue_item_id:
+                if result['status'] == 'completed':
+                    task_queue.complete(queue_item_id)
+                elif executor and executor.cancelled:
+                    task_queue.cancel(job_id)
+                else:
+                    retrying = task_queue.fail(queue_item_id, result.get('error'))
+            
             # 确保有应用实例
             if not hasattr(self, 'app') or not self.app:
                 from flask import current_app
@@ -179,21 +475,64 @@ class TaskManager:
             with self.app.app_context():
                 job = ScanJob.query.get(job_id)
                 if job:
-                    job.status = result['status']
+                    job.status = 'pending' if retrying else result['status']
                     if result.get('error'):
-                        job.error_message = result['error']
+                        job.error_message = result['error'][:255]
                     job.end_time = datetime.utcnow()
                     db.session.commit()
-                    logger.info(f"Updated job {job_id} status to {result['status']}")
+                    logger.info(f"Updated job {job_id} status to {job.status}")
+                    self._notify_finished(job)
                 else:
                     logger.error(f"Job {job_id} not found")
         except Exception as e:
             logger.error(f"Error updating job status {job_id}: {str(e)}")
+            if queue_item_id:
+                task_queue.fail(queue_item_id, str(e))
             raise
+        finally:
+            task_registry.unregister('scan', job_id)
+            backpressure.release('scan')
+            try:
+                self._complete_followers(job_id, executor)
+            except Exception as e:
+                logger.error(f"Error completing attached jobs of {job_id}: {str(e)}")
 
     def get_task_status(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务状态"""
-        return task_state.get_task(job_id)
+        """获取任务状态，本进程没有记录时查询分布式任务注册表"""
+        task = task_state.get_task(job_id)
+        if task['status'] != 'not_found':
+            return task
+        record = task_registry.get('scan', job_id)
+        if not record:
+            return task
+        return {
+            'status': record.get('status'),
+            'progress': record.get('progress', 0),
+            'machines_found': record.get('machines_found', 0),
+            'error': None if record.get('alive') else 'Task owner stopped heartbeating',
+            'owner': record.get('owner')
+        }
+
+    def _handle_orphaned_scan(self, job_id: str, record: Dict[str, Any]):
+        """处理所属进程失联的扫描任务
+
+        仍有未结束队列项的任务由持久化队列在租约过期后重新执行；
+        没有队列项的任务（如合并任务）标记为失败。
+        """
+        active = TaskQueueItem.query.filter(
+            TaskQueueItem.ref_id == job_id,
+            TaskQueueItem.status.in_(['queued', 'leased'])
+        ).count()
+        if active:
+            logger.info(f"Orphaned scan task {job_id} will be resumed by the durable queue")
+            return
+        job = ScanJob.query.get(job_id)
+        if job and job.status in ('pending', 'running'):
+            job.status = 'failed'
+            job.error_message = f"Task owner {record.get('owner')} stopped heartbeating"[:255]
+            job.end_time = datetime.utcnow()
+            db.session.commit()
+            logger.warning(f"Orphaned scan task {job_id} marked as failed")
 
     def cancel_task(self, job_id: str) -> bool:
         """取消任务
@@ -208,6 +547,13 @@ class TaskManager:
             # 获取任务状态
             task = task_state.get_task(job_id)
             if task['status'] == 'not_found':
+                # 任务在其他进程执行时，通过注册表的取消频道通知所属进程
+                if task_registry.request_cancel('scan', job_id):
+                    logger.info(f"Cancel request for task {job_id} forwarded to its owner")
+                    return True
+                # 等待重试的任务只存在于持久化队列中
+                if self._cancel_queued(job_id):
+                    return True
                 logger.error(f"Task {job_id} not found")
                 return False
                 
@@ -215,10 +561,13 @@ class TaskManager:
                 logger.warning(f"Cannot cancel task {job_id} with status {task['status']}")
                 return False
             
+            # 取消队列项，避免任务被重试或被其他进程接管
+            task_queue.cancel(job_id)
+            
             # 先尝试停止扫描执行器
             executor = task.get('executor')
             if executor and hasattr(executor, 'cancel'):
-                # 强制停止执行器
+                # 触发执行器的取消令牌，nmap 进程组被终止，扫描线程在检查点自行退出
                 executor.cancel()
                 logger.info(f"Scan executor for task {job_id} cancelled")
                 
@@ -226,37 +575,13 @@ class TaskManager:
                 task_state.update_task_status(job_id, 'cancelled')
                 logger.info(f"Task {job_id} marked as cancelled")
                 
-                # 尝试取消 future
+                # 尚未开始执行的 future 直接取消；已在运行的由取消令牌协作退出
                 future = task.get('future')
-                if future:
-                    if not future.done():
-                        try:
-                            # 尝试取消 future
-                            cancelled = future.cancel()
-                            if cancelled:
-                                logger.info(f"Future for task {job_id} cancelled successfully")
-                            else:
-                                logger.warning(f"Failed to cancel future for task {job_id}")
-                                # 如果 future 取消失败，尝试强制停止
-                                if hasattr(future, '_thread'):
-                                    import ctypes
-                                    try:
-                                        thread_id = future._thread.ident
-                                        if thread_id:
-                                            res = ctypes.pythonapi.PyThreadState_SetAsyncExc(
-                                                ctypes.c_long(thread_id),
-                                                ctypes.py_object(SystemExit)
-                                            )
-                                            if res == 0:
-                                                logger.warning(f"Failed to force stop thread for task {job_id}")
-                                            elif res != 1:
-                                                logger.warning(f"Failed to force stop thread for task {job_id}, res={res}")
-                                    except Exception as e:
-                                        logger.error(f"Error force stopping thread for task {job_id}: {str(e)}")
-                        except Exception as e:
-                            logger.error(f"Error cancelling future for task {job_id}: {str(e)}")
+                if future and not future.done():
+                    if future.cancel():
+                        logger.info(f"Future for task {job_id} cancelled before start")
                     else:
-                        logger.info(f"Future for task {job_id} already done")
+                        logger.debug(f"Task {job_id} is running, waiting for it to stop at next checkpoint")
                 
                 # 清理任务状态
                 try:
@@ -265,6 +590,11 @@ class TaskManager:
                 except Exception as e:
                     logger.error(f"Error removing task {job_id} from task state: {str(e)}")
                 
+                return True
+            elif self._detach_follower(job_id):
+                # 合并任务只脱离主扫描，不影响其他策略
+                task_state.remove_task(job_id)
+                logger.info(f"Attached task {job_id} detached and cancelled")
                 return True
             else:
                 logger.warning(f"No executor found for task {job_id}")
@@ -274,6 +604,19 @@ class TaskManager:
             logger.error(f"Error cancelling task {job_id}: {str(e)}")
             return False
 
+    def _cancel_queued(self, job_id: str) -> bool:
+        """取消尚在队列中等待重试的任务"""
+        with self.app.app_context():
+            job = ScanJob.query.get(job_id)
+            if not job or job.status != 'pending':
+                return False
+            task_queue.cancel(job_id)
+            job.status = 'cancelled'
+            job.end_time = datetime.utcnow()
+            db.session.commit()
+            logger.info(f"Queued task {job_id} cancelled")
+            return True
+
     def update_task_progress(self, job_id: str, progress: float, machines_found: int = 0) -> None:
         """更新任务进度"""
         task_state.update_task_progress(job_id, progress, machines_found)
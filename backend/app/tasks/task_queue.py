@@ -0,0 +1,311 @@
+import os
+import socket
+import threading
+import atexit
+import uuid
+
+from typing import Callable, Dict, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from app.models.models import db, TaskQueueItem
+from app.core.utils.logger import app_logger as logger
+
+
+class DurableTaskQueue:
+    """基于数据库的持久化任务队列
+
+    任务提交时写入 task_queue 表并由提交进程直接领取执行，执行期间定期续期租约。
+    每个进程的后台线程会领取两类任务：
+    - 租约已过期的任务：持有进程退出或崩溃，由其他进程（或重启后的进程）接管；
+    - 失败后按指数退避重新排队、已到可执行时间的任务。
+    领取通过带条件的 UPDATE 完成，多个进程同时领取同一任务时只有一个成功。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(DurableTaskQueue, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self.app = None
+                    self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                    self.visibility_timeout = 300
+                    self.poll_interval = 10
+                    self.poll_batch = 10
+                    self.max_attempts = 3
+                    self.retry_backoff = 30
+                    self.retry_backoff_max = 1800
+                    self._handlers = {}
+                    self._inflight = set()
+                    self._inflight_lock = threading.Lock()
+                    self._stop = threading.Event()
+                    self._thread = None
+                    self._initialized = True
+
+    def init_app(self, app):
+        """初始化应用实例并启动领取线程，需在各任务类型注册处理函数之后调用"""
+        self.app = app
+        self.visibility_timeout = max(app.config.get('TASK_QUEUE_VISIBILITY_TIMEOUT', 300), 30)
+        self.poll_interval = max(app.config.get('TASK_QUEUE_POLL_INTERVAL', 10), 1)
+        self.poll_batch = max(app.config.get('TASK_QUEUE_POLL_BATCH', 10), 1)
+        self.max_attempts = max(app.config.get('TASK_QUEUE_MAX_ATTEMPTS', 3), 1)
+        self.retry_backoff = max(app.config.get('TASK_QUEUE_RETRY_BACKOFF', 30), 1)
+        self.retry_backoff_max = max(app.config.get('TASK_QUEUE_RETRY_BACKOFF_MAX', 1800), self.retry_backoff)
+
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='task_queue', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+        logger.info(f"Durable task queue started as {self.owner}")
+
+    def register(self, kind: str, handler: Callable):
+        """注册任务类型的处理函数
+
+        处理函数签名为 handler(item_id, ref_id, payload, attempt)，在应用上下文中调用，
+        负责启动任务，并在任务结束时调用 complete / fail / cancel。
+        """
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, ref_id: str, payload: Optional[Dict] = None,
+                max_attempts: Optional[int] = None) -> str:
+        """写入队列并由当前进程直接领取，需在应用上下文中调用
+
+        Args:
+            kind: 任务类型
+            ref_id: 关联的 ScanJob / CollectionTask ID
+            payload: 重新执行任务所需的参数
+            max_attempts: 最大执行次数
+
+        Returns:
+            str: 队列项ID
+        """
+        now = datetime.utcnow()
+        item = TaskQueueItem(
+            kind=kind,
+            ref_id=ref_id,
+            payload=payload or {},
+            status='leased',
+            attempts=1,
+            max_attempts=max_attempts or self.max_attempts,
+            lease_owner=self.owner,
+            lease_expires_at=now + timedelta(seconds=self.visibility_timeout),
+            available_at=now
+        )
+        db.session.add(item)
+        db.session.commit()
+        item_id = item.id
+        self._track(item_id)
+        logger.debug(f"Enqueued {kind} task {ref_id} as queue item {item_id}")
+        return item_id
+
+    def complete(self, item_id: str):
+        """标记任务执行完成"""
+        self._untrack(item_id)
+        with self.app.app_context():
+            try:
+                TaskQueueItem.query.filter(
+                    TaskQueueItem.id == item_id,
+                    TaskQueueItem.status == 'leased',
+                    TaskQueueItem.lease_owner == self.owner
+                ).update({
+                    'status': 'done',
+                    'lease_owner': None,
+                    'lease_expires_at': None
+                }, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error completing queue item {item_id}: {str(e)}")
+
+    def fail(self, item_id: str, error: Optional[str] = None) -> bool:
+        """标记任务执行失败，未超过最大执行次数时按指数退避重新排队
+
+        Returns:
+            bool: 是否会重试
+        """
+        self._untrack(item_id)
+        with self.app.app_context():
+            try:
+                item = TaskQueueItem.query.get(item_id)
+                if not item or item.status != 'leased' or item.lease_owner != self.owner:
+                    return False
+                retry = item.attempts < item.max_attempts
+                item.last_error = error
+                item.lease_owner = None
+                item.lease_expires_at = None
+                if retry:
+                    delay = self._backoff(item.attempts)
+                    item.status = 'queued'
+                    item.available_at = datetime.utcnow() + timedelta(seconds=delay)
+                    logger.info(f"Queue item {item_id} ({item.kind} {item.ref_id}) failed, retrying in {delay}s")
+                else:
+                    item.status = 'failed'
+                    logger.warning(f"Queue item {item_id} ({item.kind} {item.ref_id}) failed after {item.attempts} attempts")
+                db.session.commit()
+                return retry
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error failing queue item {item_id}: {str(e)}")
+                return False
+
+    def cancel(self, ref_id: str):
+        """取消关联任务的所有未完成队列项，取消后不再重试"""
+        with self.app.app_context():
+            try:
+                items = TaskQueueItem.query.filter(
+                    TaskQueueItem.ref_id == ref_id,
+                    TaskQueueItem.status.in_(['queued', 'leased'])
+                ).all()
+                for item in items:
+                    self._untrack(item.id)
+                    item.status = 'cancelled'
+                    item.lease_owner = None
+                    item.lease_expires_at = None
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error cancelling queue items of {ref_id}: {str(e)}")
+
+    def _backoff(self, attempts: int) -> int:
+        return min(self.retry_backoff * (2 ** max(attempts - 1, 0)), self.retry_backoff_max)
+
+    def _track(self, item_id: str):
+        with self._inflight_lock:
+            self._inflight.add(item_id)
+
+    def _untrack(self, item_id: str):
+        with self._inflight_lock:
+            self._inflight.discard(item_id)
+
+    def _run(self):
+        # 续期间隔取可见性超时的 1/3，保证租约在续期失败一两次后仍然有效
+        interval = min(self.poll_interval, self.visibility_timeout / 3)
+        last_poll = 0
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self._heartbeat()
+                    now = datetime.utcnow().timestamp()
+                    if now - last_poll >= self.poll_interval:
+                        last_poll = now
+                        self._poll()
+            except Exception as e:
+                logger.error(f"Task queue loop error: {str(e)}")
+                try:
+                    with self.app.app_context():
+                        db.session.rollback()
+                except Exception:
+                    pass
+            self._stop.wait(interval)
+
+    def _heartbeat(self):
+        """续期当前进程持有的租约"""
+        with self._inflight_lock:
+            item_ids = list(self._inflight)
+        if not item_ids:
+            return
+        TaskQueueItem.query.filter(
+            TaskQueueItem.id.in_(item_ids),
+            TaskQueueItem.status == 'leased',
+            TaskQueueItem.lease_owner == self.owner
+        ).update({
+            'lease_expires_at': datetime.utcnow() + timedelta(seconds=self.visibility_timeout)
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def _poll(self):
+        """领取到期的重试任务和租约过期的任务"""
+        if not self._handlers:
+            return
+        now = datetime.utcnow()
+        candidates = TaskQueueItem.query.filter(
+            TaskQueueItem.kind.in_(list(self._handlers)),
+            or_(
+                and_(TaskQueueItem.status == 'queued', TaskQueueItem.available_at <= now),
+                and_(TaskQueueItem.status == 'leased', TaskQueueItem.lease_expires_at < now)
+            )
+        ).order_by(TaskQueueItem.available_at).limit(self.poll_batch).all()
+        # 提交后对象属性会过期，先取出需要的字段
+        candidates = [
+            (item.id, item.kind, item.ref_id, item.payload or {}, item.status, item.attempts, item.max_attempts)
+            for item in candidates
+        ]
+
+        for item_id, kind, ref_id, payload, status, attempts, max_attempts in candidates:
+            conditions = [
+                TaskQueueItem.id == item_id,
+                TaskQueueItem.status == status,
+                TaskQueueItem.attempts == attempts
+            ]
+            if attempts >= max_attempts:
+                # 租约过期且已用完执行次数，不再接管
+                TaskQueueItem.query.filter(*conditions).update({
+                    'status': 'failed',
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'last_error': 'Lease expired after last attempt'
+                }, synchronize_session=False)
+                db.session.commit()
+                logger.warning(f"Queue item {item_id} ({kind} {ref_id}) abandoned after {attempts} attempts")
+                continue
+
+            claimed = TaskQueueItem.query.filter(*conditions).update({
+                'status': 'leased',
+                'attempts': attempts + 1,
+                'lease_owner': self.owner,
+                'lease_expires_at': now + timedelta(seconds=self.visibility_timeout)
+            }, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                continue
+
+            self._track(item_id)
+            reason = 'retry' if status == 'queued' else 'lease expired'
+            logger.info(f"Claimed queue item {item_id} ({kind} {ref_id}, {reason}, attempt {attempts + 1})")
+            try:
+                self._handlers[kind](item_id, ref_id, payload, attempts + 1)
+            except Exception as e:
+                logger.error(f"Error resuming {kind} task {ref_id}: {str(e)}")
+                db.session.rollback()
+                self.fail(item_id, str(e))
+
+    def shutdown(self):
+        """停止领取线程，并释放当前进程持有的租约，使其他进程可以立即接管"""
+        self._stop.set()
+        with self._inflight_lock:
+            item_ids = list(self._inflight)
+            self._inflight.clear()
+        if not item_ids or not self.app:
+            return
+        try:
+            with self.app.app_context():
+                TaskQueueItem.query.filter(
+                    TaskQueueItem.id.in_(item_ids),
+                    TaskQueueItem.status == 'leased',
+                    TaskQueueItem.lease_owner == self.owner
+                ).update({
+                    'status': 'queued',
+                    'attempts': TaskQueueItem.attempts - 1,
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'available_at': datetime.utcnow()
+                }, synchronize_session=False)
+                db.session.commit()
+                logger.info(f"Released {len(item_ids)} queue leases on shutdown")
+        except Exception as e:
+            logger.error(f"Error releasing queue leases: {str(e)}")
+
+
+# 创建全局任务队列实例
+task_queue = DurableTaskQueue()
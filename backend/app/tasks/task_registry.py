@@ -0,0 +1,311 @@
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from typing import Callable, Dict, List, Optional
+from app.core.utils.logger import app_logger as logger
+
+KEY_PREFIX = 'ipams:tasks:'
+INDEX_KEY = 'ipams:tasks:index'
+CANCEL_CHANNEL = 'ipams:tasks:cancel'
+
+
+class TaskRegistry:
+    """基于 Redis 的分布式任务注册表
+
+    正在执行的扫描和采集任务登记在 Redis 中，记录所属进程（owner）、状态和进度，
+    所属进程定期发送心跳续期。任意进程都可以查询任务状态；取消请求发布到
+    取消频道，由任务所属进程执行本地取消。心跳超时的任务被视为孤儿任务，
+    由最先发现的进程交给注册的孤儿处理函数处理。
+    Redis 不可用时只维护本地记录，跨进程查询和取消不可用。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(TaskRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self.app = None
+                    self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                    self.heartbeat_interval = 10
+                    self.orphan_timeout = 60
+                    self._local = {}
+                    self._local_lock = threading.Lock()
+                    self._cancel_handlers = {}
+                    self._orphan_handlers = {}
+                    self._stop = threading.Event()
+                    self._threads = []
+                    self._initialized = True
+
+    def init_app(self, app):
+        """读取配置并启动心跳和取消频道监听线程"""
+        self.app = app
+        self.heartbeat_interval = max(app.config.get('TASK_REGISTRY_HEARTBEAT_INTERVAL', 10), 1)
+        self.orphan_timeout = max(app.config.get('TASK_REGISTRY_ORPHAN_TIMEOUT', 60), self.heartbeat_interval * 3)
+
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._heartbeat_loop, name='task_registry_heartbeat', daemon=True),
+            threading.Thread(target=self._listen_cancel, name='task_registry_cancel', daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.shutdown)
+        logger.info(f"Task registry started as {self.owner}")
+
+    def on_cancel(self, kind: str, handler: Callable[[str], None]):
+        """注册本地取消处理函数 handler(task_id)，收到其他进程的取消请求时调用"""
+        self._cancel_handlers[kind] = handler
+
+    def on_orphan(self, kind: str, handler: Callable[[str, Dict], None]):
+        """注册孤儿任务处理函数 handler(task_id, record)，在应用上下文中调用"""
+        self._orphan_handlers[kind] = handler
+
+    def _redis(self):
+        return self.app.extensions.get('redis') if self.app else None
+
+    @staticmethod
+    def _key(kind: str, task_id: str) -> str:
+        return f"{KEY_PREFIX}{kind}:{task_id}"
+
+    def register(self, kind: str, task_id: str, **fields):
+        """登记本进程开始执行的任务"""
+        now = time.time()
+        record = {
+            'kind': kind,
+            'task_id': task_id,
+            'owner': self.owner,
+            'status': 'pending',
+            'started_at': now,
+            'heartbeat_at': now
+        }
+        record.update(fields)
+        with self._local_lock:
+            self._local[(kind, task_id)] = record
+        self._write([record])
+
+    def update(self, kind: str, task_id: str, flush: bool = False, **fields):
+        """更新本地任务记录，默认在下一次心跳时同步到 Redis，flush=True 时立即同步"""
+        with self._local_lock:
+            record = self._local.get((kind, task_id))
+            if record is None:
+                return
+            record.update(fields)
+            record = dict(record)
+        if flush:
+            self._write([record])
+
+    def unregister(self, kind: str, task_id: str):
+        """任务结束后移除登记"""
+        with self._local_lock:
+            self._local.pop((kind, task_id), None)
+        redis_client = self._redis()
+        if not redis_client:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(self._key(kind, task_id))
+            pipe.zrem(INDEX_KEY, f"{kind}:{task_id}")
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to unregister {kind} task {task_id}: {str(e)}")
+
+    def is_local(self, kind: str, task_id: str) -> bool:
+        with self._local_lock:
+            return (kind, task_id) in self._local
+
+    def get(self, kind: str, task_id: str) -> Optional[Dict]:
+        """查询任务登记信息，优先本地记录
+
+        Returns:
+            Optional[Dict]: 登记信息，包含 alive 字段表示心跳是否在有效期内；未登记返回 None
+        """
+        with self._local_lock:
+            record = self._local.get((kind, task_id))
+        if record:
+            return dict(record, alive=True)
+        redis_client = self._redis()
+        if not redis_client:
+            return None
+        try:
+            data = redis_client.get(self._key(kind, task_id))
+        except Exception as e:
+            logger.warning(f"Failed to load {kind} task {task_id} from registry: {str(e)}")
+            return None
+        if not data:
+            return None
+        record = json.loads(data)
+        record['alive'] = time.time() - record.get('heartbeat_at', 0) < self.orphan_timeout
+        return record
+
+    def list_tasks(self, kind: Optional[str] = None) -> List[Dict]:
+        """列出所有进程登记的任务"""
+        redis_client = self._redis()
+        if not redis_client:
+            with self._local_lock:
+                records = [dict(r, alive=True) for r in self._local.values()]
+            return [r for r in records if not kind or r['kind'] == kind]
+        members = redis_client.zrange(INDEX_KEY, 0, -1)
+        if kind:
+            members = [m for m in members if m.startswith(f"{kind}:")]
+        if not members:
+            return []
+        keys = [KEY_PREFIX + member for member in members]
+        now = time.time()
+        records = []
+        for data in redis_client.mget(keys):
+            if not data:
+                continue
+            record = json.loads(data)
+            record['alive'] = now - record.get('heartbeat_at', 0) < self.orphan_timeout
+            records.append(record)
+        return records
+
+    def request_cancel(self, kind: str, task_id: str) -> bool:
+        """请求取消其他进程执行的任务，通过取消频道通知所属进程
+
+        本进程执行的任务由调用方直接取消，这里返回 False。
+
+        Returns:
+            bool: 任务由其他存活进程执行且请求已送达
+        """
+        if self.is_local(kind, task_id):
+            return False
+        record = self.get(kind, task_id)
+        if not record or not record.get('alive'):
+            return False
+        try:
+            receivers = self._redis().publish(CANCEL_CHANNEL, json.dumps({
+                'kind': kind,
+                'task_id': task_id,
+                'owner': record['owner'],
+                'from': self.owner
+            }))
+            logger.info(f"Cancel request for {kind} task {task_id} sent to {record['owner']}")
+            return receivers > 0
+        except Exception as e:
+            logger.error(f"Failed to publish cancel request for {kind} task {task_id}: {str(e)}")
+            return False
+
+    def _cancel_local(self, kind: str, task_id: str) -> bool:
+        handler = self._cancel_handlers.get(kind)
+        if not handler:
+            return False
+        try:
+            with self.app.app_context():
+                handler(task_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error cancelling {kind} task {task_id}: {str(e)}")
+            return False
+
+    def _write(self, records: List[Dict]):
+        redis_client = self._redis()
+        if not redis_client or not records:
+            return
+        # 记录保留到孤儿判定之后，便于查询到失联任务
+        ttl = int(self.orphan_timeout * 2)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for record in records:
+                pipe.set(self._key(record['kind'], record['task_id']), json.dumps(record, default=str), ex=ttl)
+                pipe.zadd(INDEX_KEY, {f"{record['kind']}:{record['task_id']}": record['heartbeat_at']})
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to write task registry: {str(e)}")
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            now = time.time()
+            with self._local_lock:
+                for record in self._local.values():
+                    record['heartbeat_at'] = now
+                records = [dict(r) for r in self._local.values()]
+            self._write(records)
+            try:
+                self._sweep_orphans(now)
+            except Exception as e:
+                logger.error(f"Error sweeping orphaned tasks: {str(e)}")
+
+    def _sweep_orphans(self, now: float):
+        """处理心跳超时的任务，ZREM 成功的进程负责处理，避免重复"""
+        redis_client = self._redis()
+        if not redis_client:
+            return
+        members = redis_client.zrangebyscore(INDEX_KEY, 0, now - self.orphan_timeout)
+        for member in members:
+            if not redis_client.zrem(INDEX_KEY, member):
+                continue
+            kind, task_id = member.split(':', 1)
+            data = redis_client.get(KEY_PREFIX + member)
+            record = json.loads(data) if data else {'kind': kind, 'task_id': task_id}
+            redis_client.delete(KEY_PREFIX + member)
+            logger.warning(
+                f"{kind} task {task_id} orphaned: owner {record.get('owner')} stopped heartbeating"
+            )
+            handler = self._orphan_handlers.get(kind)
+            if not handler:
+                continue
+            try:
+                with self.app.app_context():
+                    handler(task_id, record)
+            except Exception as e:
+                logger.error(f"Error handling orphaned {kind} task {task_id}: {str(e)}")
+
+    def _listen_cancel(self):
+        """监听取消频道，执行发给本进程的取消请求"""
+        while not self._stop.is_set():
+            redis_client = self._redis()
+            if not redis_client:
+                self._stop.wait(5)
+                continue
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CANCEL_CHANNEL)
+                while not self._stop.is_set():
+                    item = pubsub.get_message(timeout=1.0)
+                    if not item:
+                        continue
+                    message = json.loads(item['data'])
+                    if message.get('owner') != self.owner:
+                        continue
+                    logger.info(f"Received cancel request for {message['kind']} task {message['task_id']} from {message.get('from')}")
+                    self._cancel_local(message['kind'], message['task_id'])
+            except Exception as e:
+                logger.warning(f"Task registry cancel listener error, reconnecting: {str(e)}")
+                self._stop.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def shutdown(self):
+        """停止线程并移除本进程的登记，队列会把任务交给其他进程"""
+        self._stop.set()
+        with self._local_lock:
+            keys = list(self._local)
+        for kind, task_id in keys:
+            self.unregister(kind, task_id)
+
+
+# 创建全局任务注册表实例
+task_registry = TaskRegistry()
@@ -53,6 +53,31 @@ class TaskState:
                 'error': None
             })
 
+    def find_tasks(self, subnet_id: str, statuses=('pending', 'running')) -> list:
+        """查找指定子网上处于给定状态的任务
+
+        Returns:
+            list: (job_id, 任务记录副本) 列表
+        """
+        with self._lock:
+            return [
+                (job_id, dict(task)) for job_id, task in self._tasks.items()
+                if task.get('subnet_id') == subnet_id and task.get('status') in statuses
+            ]
+
+    def find_task_with_follower(self, follower_id: str):
+        """查找合并了指定派生任务、且仍在接受派生任务的主扫描
+
+        Returns:
+            (job_id, 主扫描的 executor)，找不到时为 (None, None)
+        """
+        with self._lock:
+            for job_id, task in self._tasks.items():
+                executor = task.get('executor')
+                if executor and follower_id in executor.followers and not executor.followers_closed:
+                    return job_id, executor
+        return None, None
+
     def remove_task(self, job_id: str):
         """移除任务记录"""
         with self._lock:
@@ -0,0 +1,51 @@
+import argparse
+from flask import Flask
+from app.core.config.settings import Config
+from app.models.models import db, User
+from app.services.scan.importer import create_import_job, import_nmap_xml
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+def import_nmap(xml_file, subnet_id, email, policy_id=None, chunk_size=None):
+    app = create_app()
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            print(f"User with email '{email}' not found.")
+            return
+        try:
+            job = create_import_job(subnet_id, user.id, policy_id, is_admin=user.is_admin)
+        except ValueError as e:
+            print(str(e))
+            return
+        print(f"Importing '{xml_file}' into scan job {job.id} ...")
+        stats = import_nmap_xml(job.id, xml_file, chunk_size=chunk_size)
+        print(
+            f"Imported {stats['hosts_total']} hosts: {stats['hosts_up']} up, {stats['hosts_down']} down, "
+            f"{stats['hosts_skipped']} skipped, {stats['results_saved']} with open ports."
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Command-line tool to import nmap XML output (-oX) as a scan job.",
+        epilog="Example: python import_nmap.py -f scan.xml -s <subnet_id> -e admin@example.com"
+    )
+    parser.add_argument("-f", "--file", required=True, help="Path to the nmap XML file.")
+    parser.add_argument("-s", "--subnet-id", required=True, help="The scan subnet the results belong to.")
+    parser.add_argument("-e", "--email", required=True, help="Email of the user owning the scan job.")
+    parser.add_argument("-p", "--policy-id", help="The scan policy to attach the job to.", default=None)
+    parser.add_argument("-c", "--chunk-size", type=int, help="Hosts committed per transaction.", default=None)
+
+    args = parser.parse_args()
+
+    import_nmap(
+        xml_file=args.file,
+        subnet_id=args.subnet_id,
+        email=args.email,
+        policy_id=args.policy_id,
+        chunk_size=args.chunk_size
+    )
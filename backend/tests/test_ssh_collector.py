@@ -0,0 +1,223 @@
+"""
+原生 SSH 采集器测试
+解析器使用构造的脚本输出；collect_many 连接本地启动的 asyncssh 服务端，
+服务端用本机 sh 执行收到的采集脚本
+"""
+import asyncio
+import socket
+import subprocess
+import threading
+
+import pytest
+
+from app.services.collection.ssh_collector import NativeSSHCollector, parse_collect_output
+
+SAMPLE_OUTPUT = """@@hostname
+web-01.example.com
+@@os_release
+NAME="Rocky Linux"
+VERSION_ID="9.3"
+ID="rocky"
+@@kernel
+5.14.0-362.el9.x86_64
+@@arch
+x86_64
+@@cpu_model
+ Intel(R) Xeon(R) Gold 6248 CPU @ 2.50GHz
+@@cpu_cores
+8
+@@meminfo
+MemTotal:       16303924 kB
+MemFree:         1048576 kB
+MemAvailable:    8151962 kB
+@@boot
+UEFI
+@@df
+Filesystem      Size  Used Avail Use% Mounted on
+/dev/sda2        50G   12G   39G  24% /
+tmpfs           7.8G     0  7.8G   0% /dev/shm
+/dev/sda1      1014M  250M  765M  25% /boot
+@@interfaces
+eth0|52:54:00:12:34:56|up|1000|1500
+eth1|52:54:00:ab:cd:ef|down|-1|9000
+@@ipv4
+2: eth0    inet 192.168.1.10/24 brd 192.168.1.255 scope global eth0\\       valid_lft forever preferred_lft forever
+3: eth1    inet 10.0.0.5/16 brd 10.0.255.255 scope global eth1\\       valid_lft forever preferred_lft forever
+@@ipv6
+2: eth0    inet6 fe80::5054:ff:fe12:3456/64 scope link \\       valid_lft forever preferred_lft forever
+@@routes
+default via 192.168.1.1 dev eth0 proto static metric 100
+192.168.1.0/24 dev eth0 proto kernel scope link src 192.168.1.10
+"""
+
+
+def test_parse_collect_output_system_fields():
+    info = parse_collect_output(SAMPLE_OUTPUT)
+
+    assert info['hostname'] == 'web-01'
+    assert info['os_name'] == 'Rocky'
+    assert info['os_version'] == '9.3'
+    assert info['kernel_version'] == '5.14.0-362.el9.x86_64'
+    assert info['cpu_model'] == 'Intel(R) Xeon(R) Gold 6248 CPU @ 2.50GHz'
+    assert info['cpu_cores'] == 8
+    assert info['os_bit'] == '64-bit'
+    assert info['boot_method'] == 'UEFI'
+
+
+def test_parse_collect_output_memory_in_mb():
+    info = parse_collect_output(SAMPLE_OUTPUT)
+
+    assert info['memory_total'] == 16303924 // 1024
+    # 优先使用 MemAvailable
+    assert info['memory_free_mb'] == 8151962 // 1024
+
+    without_available = SAMPLE_OUTPUT.replace('MemAvailable:    8151962 kB\n', '')
+    assert parse_collect_output(without_available)['memory_free_mb'] == 1048576 // 1024
+
+
+def test_parse_collect_output_disks_only_block_devices():
+    info = parse_collect_output(SAMPLE_OUTPUT)
+
+    assert info['disk_info'] == [
+        {'device': '/dev/sda2', 'size': '50G', 'used': '12G', 'avail': '39G',
+         'use_percent': '24%', 'mount': '/', 'fstype': ''},
+        {'device': '/dev/sda1', 'size': '1014M', 'used': '250M', 'avail': '765M',
+         'use_percent': '25%', 'mount': '/boot', 'fstype': ''}
+    ]
+
+
+def test_parse_collect_output_interfaces_and_gateway():
+    interfaces = {item['name']: item for item in parse_collect_output(SAMPLE_OUTPUT)['network_interfaces']}
+
+    assert interfaces['eth0'] == {
+        'name': 'eth0',
+        'mac_address': '52:54:00:12:34:56',
+        'state': 'up',
+        'speed': '1000',
+        'mtu': '1500',
+        'ipv4': '192.168.1.10/24',
+        'ipv6': 'fe80::5054:ff:fe12:3456/64',
+        'gateway': '192.168.1.1'
+    }
+    assert interfaces['eth1']['ipv4'] == '10.0.0.5/16'
+    assert interfaces['eth1']['ipv6'] == ''
+    assert interfaces['eth1']['gateway'] == ''
+    assert interfaces['eth1']['mtu'] == '9000'
+
+
+def test_parse_collect_output_distribution_fallback_and_arch():
+    output = SAMPLE_OUTPUT.replace('ID="rocky"', 'ID="someos"').replace('@@arch\nx86_64', '@@arch\ni686')
+    info = parse_collect_output(output)
+
+    # 未知发行版使用 os-release 的 NAME
+    assert info['os_name'] == 'Rocky Linux'
+    assert info['os_bit'] == '32-bit'
+
+
+def test_parse_collect_output_invalid():
+    assert parse_collect_output('') == {}
+    assert parse_collect_output('Permission denied\n') == {}
+
+
+USERNAME = 'collector'
+PASSWORD = 'secret'
+
+
+@pytest.fixture
+def ssh_server():
+    """在后台线程的事件循环中启动本地 asyncssh 服务端，返回端口"""
+    asyncssh = pytest.importorskip('asyncssh')
+
+    class Server(asyncssh.SSHServer):
+        def begin_auth(self, username):
+            return True
+
+        def password_auth_supported(self):
+            return True
+
+        def validate_password(self, username, password):
+            return username == USERNAME and password == PASSWORD
+
+    async def handle(process):
+        # 与真实主机一样，用 sh 执行从标准输入收到的脚本
+        script = await process.stdin.read()
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: subprocess.run(['sh', '-s'], input=script, capture_output=True, text=True)
+        )
+        process.stdout.write(result.stdout)
+        process.stderr.write(result.stderr)
+        process.exit(result.returncode)
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def start():
+        state['server'] = await asyncssh.listen(
+            '127.0.0.1', 0,
+            server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+            server_factory=Server,
+            process_factory=handle
+        )
+        state['port'] = state['server'].sockets[0].getsockname()[1]
+        started.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(start()), loop.run_forever()), daemon=True)
+    thread.start()
+    assert started.wait(10)
+    yield state['port']
+
+    def stop():
+        state['server'].close()
+        loop.stop()
+
+    loop.call_soon_threadsafe(stop)
+    thread.join(10)
+
+
+def _target(target_id, port, password=PASSWORD):
+    return {
+        'id': target_id,
+        'host_ip': '127.0.0.1',
+        'username': USERNAME,
+        'password': password,
+        'private_key': None,
+        'port': port
+    }
+
+
+def test_collect_many_against_local_server(ssh_server):
+    results = NativeSSHCollector().collect_many([_target('a', ssh_server), _target('b', ssh_server)], concurrency=2)
+
+    assert set(results) == {'a', 'b'}
+    for info in results.values():
+        assert info.get('success') is not False, info
+        assert info['hostname'] == socket.gethostname().split('.')[0]
+        assert info['cpu_cores'] > 0
+        assert info['memory_total'] > 0
+        assert info['os_bit']
+        assert isinstance(info['disk_info'], list)
+        assert isinstance(info['network_interfaces'], list)
+
+
+def test_collect_many_reports_auth_failure(ssh_server):
+    results = NativeSSHCollector().collect_many([
+        _target('good', ssh_server),
+        _target('bad', ssh_server, password='wrong')
+    ])
+
+    assert results['good'].get('success') is not False
+    assert results['bad']['success'] is False
+    assert 'SSH认证失败' in results['bad']['error']
+
+
+def test_collect_many_reports_unreachable_host():
+    collector = NativeSSHCollector()
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    # 端口已释放，连接被拒绝
+    results = collector.collect_many([_target('down', port)])
+
+    assert results['down']['success'] is False
+    assert '127.0.0.1' in results['down']['error']